@@ -0,0 +1,207 @@
+"""导出吞吐基准: 对本地模拟服务器 (mock_server.py) 运行 Exporter.run。
+
+每个卡片数规模使用独立的模拟服务器进程和导出进程，输出总耗时与正文阶段耗时、每秒卡片数、每秒字节数、
+API 请求延迟 p50/p99 (客户端计时，含重试) 以及导出进程的峰值内存。
+
+用法:
+    python benchmarks/bench_export.py --cards 100 1000 10000 50000
+    python benchmarks/bench_export.py --cards 1000 --latency 0.05 --error-rate 0.02 --json result.json
+    python benchmarks/bench_export.py --cards 1000 --baseline result.json   # 比上次慢超过 20% 时退出码为 1
+    python benchmarks/bench_export.py --cards 500 --packages 3 --shared-cards 200   # 多卡包并行导出与跨卡包去重
+    python benchmarks/bench_export.py --cards 1000 --rate-limit 10   # 与默认客户端对比固定限速的影响
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_server import add_arguments, percentile  # noqa: E402
+
+# 传给模拟服务器的参数
+SERVER_OPTIONS = ("latency", "jitter", "error_rate", "desc_bytes", "cover_bytes", "audio_bytes",
+                  "page_images", "image_bytes", "shared_cards", "packages")
+
+
+def peak_rss():
+    """当前进程的峰值常驻内存 (字节)，不支持的平台返回 None。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_export(base_url, workers, packages=1, rate_limit=None):
+    """在当前进程中登录模拟服务器并导出前 packages 个卡包 (多个时并行导出)，返回结果字典。
+
+    rate_limit 为 None 时使用默认客户端 (与 GUI/命令行相同的限速配置)，否则使用该每秒请求数的令牌桶。
+    """
+    os.environ["LLSPACE_API_BASE_URL"] = base_url
+    sys.path.insert(0, ROOT_DIR)
+    from src.api_client import LLSpaceClient
+    from src.throttle import TokenBucket
+    from src.exporter import Exporter, IncompleteExportError
+    from src.scheduler import ExportScheduler
+
+    latencies = []
+
+    class TimedClient(LLSpaceClient):
+        def _post(self, path, data=None, token=None):
+            start = time.perf_counter()
+            try:
+                return super()._post(path, data, token)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    rate_limiter = TokenBucket(rate=rate_limit) if rate_limit is not None else None
+    client = TimedClient(rate_limiter=rate_limiter)
+    success, msg = client.login("bench", "bench")
+    if not success:
+        raise RuntimeError(f"登录模拟服务器失败: {msg}")
+    selected = client.get_packages()[:packages]
+
+    urllib.request.urlopen(urllib.request.Request(f"{base_url}/__reset", data=b""))
+    latencies.clear()
+    start = time.perf_counter()
+    text_done = []
+
+    def on_progress(current, total, message, percent):
+        # 正文阶段 (Markdown/索引可用) 结束的时间
+        if total and current >= total and not text_done:
+            text_done.append(time.perf_counter() - start)
+
+    failed = 0
+    dedup = {"requests": 0, "bytes": 0}
+    if len(selected) == 1:
+        try:
+            _, count = Exporter(client, on_progress, max_workers=workers).run(selected[0], "out")
+        except IncompleteExportError as e:
+            count, failed = e.exported_count, len(e.failed_cards)
+    else:
+        scheduler = ExportScheduler(client, selected, max_workers=workers)
+        results = scheduler.run("out")
+        count = sum(n for _, _, n, _ in results)
+        failed = sum(len(getattr(error, "failed_cards", None) or ()) for _, _, _, error in results)
+        dedup = scheduler.registry.saved()
+        # 多卡包时没有单一的正文阶段，以总耗时计
+        text_done.clear()
+    elapsed = time.perf_counter() - start
+
+    with urllib.request.urlopen(f"{base_url}/__stats") as resp:
+        server = json.load(resp)
+    latencies.sort()
+    return {
+        "rate_limit": client.rate_limiter.rate,
+        "cards": count,
+        "failed_cards": failed,
+        "seconds": elapsed,
+        "text_seconds": text_done[0] if text_done else elapsed,
+        "cards_per_sec": count / elapsed,
+        "bytes_per_sec": server["bytes_sent"] / elapsed,
+        "api_p50": percentile(latencies, 50),
+        "api_p99": percentile(latencies, 99),
+        "requests": sum(server["requests"].values()),
+        "errors": server["errors"],
+        "dedup_requests": dedup["requests"],
+        "dedup_bytes": dedup["bytes"],
+        "peak_rss": peak_rss(),
+    }
+
+
+def bench_size(cards, args):
+    """启动模拟服务器与导出子进程，测量一个规模。"""
+    cmd = [sys.executable, os.path.join(BENCH_DIR, "mock_server.py"), "--port", "0", "--cards", str(cards)]
+    for name in SERVER_OPTIONS:
+        cmd += ["--" + name.replace("_", "-"), str(getattr(args, name))]
+    server = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    workdir = tempfile.mkdtemp(prefix="llspace-bench-")
+    try:
+        base_url = server.stdout.readline().strip()
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", base_url, "--workers", str(args.workers),
+             "--packages", str(args.packages)] + (["--rate-limit", str(args.rate_limit)] if args.rate_limit is not None else []),
+            cwd=workdir, stdout=subprocess.PIPE, text=True, check=True,
+        )
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        result["size"] = cards
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+        if args.keep:
+            print(f"导出结果保留在 {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline_path, tolerance):
+    """与基线比较每秒卡片数，返回退化的规模列表。"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["size"]: r for r in json.load(f)}
+    regressions = []
+    for r in results:
+        old = baseline.get(r["size"])
+        if old and r["cards_per_sec"] < old["cards_per_sec"] * (1 - tolerance):
+            regressions.append(r["size"])
+            print(f"退化: {r['size']} 张卡片 {old['cards_per_sec']:.1f} -> {r['cards_per_sec']:.1f} 张/秒")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="导出吞吐基准 (本地模拟服务器)")
+    ap.add_argument("--cards", type=int, nargs="+", default=[100, 1000], help="要测量的卡包卡片数，可多个")
+    ap.add_argument("--workers", type=int, default=8, help="Exporter 的 max_workers")
+    ap.add_argument("--packages", type=int, default=1, help="并行导出的卡包数")
+    ap.add_argument("--rate-limit", type=float, metavar="RPS",
+                    help="客户端每秒请求数上限 (0 为不限速)，默认使用与 GUI/命令行相同的默认客户端")
+    ap.add_argument("--json", help="把结果写入 JSON 文件")
+    ap.add_argument("--baseline", help="与之前 --json 保存的结果比较")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="允许的每秒卡片数下降比例")
+    ap.add_argument("--keep", action="store_true", help="保留导出结果目录")
+    ap.add_argument("--child", metavar="BASE_URL", help=argparse.SUPPRESS)
+    add_arguments(ap)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_export(args.child, args.workers, args.packages, args.rate_limit)))
+        return 0
+
+    sys.path.insert(0, ROOT_DIR)
+    from src.config import API_RATE_LIMIT
+    rate_limit = API_RATE_LIMIT if args.rate_limit is None else args.rate_limit
+    print(f"延迟 {args.latency}s ± {args.jitter}s，错误率 {args.error_rate}，并发 {args.workers}，"
+          f"限速 {rate_limit or '无'} 次/秒，CPU {os.cpu_count()}")
+    print(f"{'卡片数':>8} {'耗时(s)':>9} {'正文(s)':>9} {'张/秒':>9} {'MB/秒':>8} {'p50(ms)':>9} {'p99(ms)':>9} {'请求数':>8} "
+          f"{'错误':>6} {'峰值内存(MB)':>12}")
+    results = []
+    for cards in args.cards:
+        r = bench_size(cards, args)
+        results.append(r)
+        rss = f"{r['peak_rss'] / 1024 ** 2:.0f}" if r["peak_rss"] else "-"
+        print(f"{r['cards']:>8} {r['seconds']:>9.1f} {r['text_seconds']:>9.1f} {r['cards_per_sec']:>9.1f} {r['bytes_per_sec'] / 1024 ** 2:>8.2f} "
+              f"{r['api_p50'] * 1000:>9.1f} {r['api_p99'] * 1000:>9.1f} {r['requests']:>8} {r['errors']:>6} {rss:>12}",
+              flush=True)
+        if r["dedup_requests"]:
+            print(f"{'':>8} 跨卡包复用 {r['dedup_requests']} 次，省去 {r['dedup_bytes'] / 1024 ** 2:.2f} MB", flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
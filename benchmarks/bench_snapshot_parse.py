@@ -0,0 +1,81 @@
+"""快照 HTML 解析基准: 比较 html.parser / lxml 以及进程池的每秒页数。
+
+用法: python benchmarks/bench_snapshot_parse.py [--pages 200] [--images 60] [--processes 4]
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.snapshot import parse_snapshot, fill_snapshot  # noqa: E402
+
+
+def make_page(images, paragraphs=200):
+    """生成一个类似文章快照的页面: 若干段落、图片、样式和脚本。"""
+    parts = ['<html><head><meta charset="utf-8"><title>bench</title>']
+    parts += [f'<link rel="stylesheet" href="https://cdn.example.com/css/{i}.css">' for i in range(5)]
+    parts += [f'<script src="/static/js/{i}.js"></script>' for i in range(5)]
+    parts.append('</head><body><div class="article">')
+    for i in range(paragraphs):
+        parts.append(f'<p class="para" data-i="{i}">这是第 {i} 段正文，包含<b>加粗</b>和<a href="/l/{i}">链接</a>。</p>')
+        if i % max(1, paragraphs // images) == 0:
+            parts.append(f'<img src="https://img.example.com/{i % images}.jpg?w=640&amp;h=480" alt="{i}">')
+    parts.append('</div></body></html>')
+    return "".join(parts).encode("utf-8")
+
+
+def roundtrip(content, parser):
+    template, refs = parse_snapshot(content, "https://example.com/article/1", parser)
+    return len(fill_snapshot(template, refs, {url: "assets/x.jpg" for _, url, _, _ in refs}))
+
+
+def bench_inline(pages, parser):
+    start = time.perf_counter()
+    for content in pages:
+        roundtrip(content, parser)
+    return len(pages) / (time.perf_counter() - start)
+
+
+def bench_pool(pages, parser, processes):
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+        # 预热，排除进程启动时间
+        list(pool.map(roundtrip, pages[:processes], [parser] * processes))
+        start = time.perf_counter()
+        list(pool.map(roundtrip, pages, [parser] * len(pages)))
+        return len(pages) / (time.perf_counter() - start)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--images", type=int, default=60)
+    ap.add_argument("--processes", type=int, default=max(1, min(4, (os.cpu_count() or 2) - 1)))
+    args = ap.parse_args()
+
+    page = make_page(args.images)
+    pages = [page] * args.pages
+    print(f"页面大小 {len(page) / 1024:.0f} KB，{args.images} 张图片，共 {args.pages} 页，CPU {os.cpu_count()}")
+
+    parsers = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        parsers.append("lxml")
+    except ImportError:
+        print("未安装 lxml，跳过 lxml 测试 (pip install lxml)")
+
+    baseline = None
+    for parser in parsers:
+        rate = bench_inline(pages, parser)
+        baseline = baseline or rate
+        print(f"{parser:12s} 单线程        {rate:8.1f} 页/秒  ({rate / baseline:.2f}x)")
+        rate = bench_pool(pages, parser, args.processes)
+        print(f"{parser:12s} 进程池 x{args.processes:<4d}  {rate:8.1f} 页/秒  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
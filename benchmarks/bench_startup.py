@@ -0,0 +1,142 @@
+"""冷启动基准: 图形界面到首个窗口的时间、命令行到首行输出的时间，以及主要模块的导入耗时。
+
+每项运行多次取中位数，每次都是新进程。图形界面需要可用的显示环境，否则跳过该项。
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --json startup.json
+    python benchmarks/bench_startup.py --baseline startup.json        # 比上次慢超过 20% 时退出码为 1
+    python benchmarks/bench_startup.py --binary dist/llspace-exporter/llspace-exporter   # 测量打包后的程序
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# 统计导入耗时的模块: 图形界面入口、命令行入口和导出核心
+IMPORT_MODULES = ("main", "cli", "src.gui", "src.exporter")
+
+_IMPORTTIME = re.compile(r"import time:\s*\d+ \|\s*(\d+) \| (\S+)$")
+
+
+def import_time(module):
+    """新进程中导入 module 的累计耗时 (秒，来自 python -X importtime)。"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if m and m.group(2) == module:
+            return int(m.group(1)) / 1e6
+    return None
+
+
+def gui_first_window(command, workdir):
+    """启动图形界面，返回到首个窗口绘制完成的秒数；无法显示窗口时返回 None。"""
+    probe = os.path.join(workdir, "startup_probe")
+    if os.path.exists(probe):
+        os.remove(probe)
+    env = dict(os.environ, LLSPACE_STARTUP_PROBE=probe)
+    start = time.time()
+    proc = subprocess.run(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                          timeout=120)
+    if proc.returncode != 0 or not os.path.exists(probe):
+        return None
+    with open(probe, encoding="utf-8") as f:
+        return float(f.read()) - start
+
+
+def cli_first_output(workdir):
+    """运行 `cli.py packages --cached` (不访问网络)，返回到第一行输出的秒数。"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "cli.py"), "-C", workdir, "--session", "session.json",
+         "packages", "--cached"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    first = proc.stdout.readline()
+    elapsed = time.perf_counter() - start
+    proc.stdout.read()
+    proc.wait()
+    if proc.returncode != 0 or not first:
+        raise RuntimeError("命令行未正常输出")
+    return elapsed
+
+
+def write_session(workdir, packages=50):
+    """写入带缓存卡包列表的会话文件，供命令行离线列出卡包。"""
+    with open(os.path.join(workdir, "session.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "user": {"authentication_token": "bench", "name": "bench"},
+            "packages": [{"pg_id": i, "pg_name": f"卡包 {i}"} for i in range(packages)],
+        }, f, ensure_ascii=False)
+
+
+def median_of(runs, func, *args):
+    values = [func(*args) for _ in range(runs)]
+    if any(v is None for v in values):
+        return None
+    return statistics.median(values)
+
+
+def compare(results, baseline_path, tolerance):
+    """与基线比较各项耗时，返回变慢的项目列表。"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if value is not None and old and value > old * (1 + tolerance):
+            regressions.append(name)
+            print(f"退化: {name} {old * 1000:.0f} -> {value * 1000:.0f} ms")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="冷启动基准")
+    ap.add_argument("--runs", type=int, default=5, help="每项运行次数 (取中位数)")
+    ap.add_argument("--binary", help="测量打包后的程序 (build.py 的输出) 而不是 python main.py")
+    ap.add_argument("--json", help="把结果写入 JSON 文件")
+    ap.add_argument("--baseline", help="与之前 --json 保存的结果比较")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="允许的耗时增加比例")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="llspace-startup-")
+    try:
+        write_session(workdir)
+        results = {}
+        for module in IMPORT_MODULES:
+            results[f"import.{module}"] = median_of(args.runs, import_time, module)
+        gui_command = [os.path.abspath(args.binary)] if args.binary else [sys.executable, os.path.join(ROOT_DIR, "main.py")]
+        results["gui.first_window"] = median_of(args.runs, gui_first_window, gui_command, workdir)
+        results["cli.first_output"] = median_of(args.runs, cli_first_output, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'项目':<24} {'中位数(ms)':>10}")
+    for name, value in results.items():
+        shown = f"{value * 1000:.1f}" if value is not None else "-"
+        print(f"{name:<24} {shown:>10}")
+    if results["gui.first_window"] is None:
+        print("图形界面未能显示窗口 (无显示环境？)，已跳过", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""本地模拟 llspace 服务器，用于离线测量导出性能。
+
+实现 API_specs.md 中导出用到的接口 (登录、卡包列表、卡包目录、卡片详情)，
+以及卡片引用的封面、音频和网页快照 (含页内图片/样式)。所有数据按 id 确定性生成，
+不占用额外内存，可模拟数万张卡片。
+
+用法:
+    python benchmarks/mock_server.py --port 8765 --packages 2 --cards 1000 --latency 0.02 --error-rate 0.01
+    LLSPACE_API_BASE_URL=http://127.0.0.1:8765 python cli.py login -u bench -p bench
+
+附加接口: GET /__stats 返回请求计数、字节数与服务端耗时分位数；POST /__reset 清零统计。
+封面、音频和页内资源带 ETag，支持 Range/If-Range 断点续传。
+"""
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs, urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 卡片 id = 卡包 id * CARD_ID_STRIDE + 序号；所有卡包共有的卡片使用 SHARED_PG_ID
+CARD_ID_STRIDE = 1_000_000
+FIRST_PG_ID = 1000
+SHARED_PG_ID = FIRST_PG_ID - 1
+
+# 生成卡片时的类别分布: (card_cat, 权重)；1 一般卡片 (带网页)，60 声音卡，50 竖文卡
+CARD_CATS = ((1, 6), (60, 2), (50, 2))
+
+_FILLER = "平行世界的卡片内容用于基准测试。".encode("utf-8")
+
+
+def percentile(values, p):
+    """返回已排序列表的第 p 百分位 (最近秩)。"""
+    if not values:
+        return 0.0
+    k = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+class MockState:
+    """服务器配置与统计。"""
+
+    def __init__(self, args):
+        self.packages = args.packages
+        self.cards = args.cards
+        self.shared_cards = min(args.shared_cards, args.cards)
+        self.latency = args.latency
+        self.jitter = args.jitter
+        self.error_rate = args.error_rate
+        self.desc_bytes = args.desc_bytes
+        self.cover_bytes = args.cover_bytes
+        self.audio_bytes = args.audio_bytes
+        self.page_images = args.page_images
+        self.image_bytes = args.image_bytes
+        self.base_url = ""
+        self._lock = threading.Lock()
+        self._blobs = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}
+            self.errors = 0
+            self.bytes_sent = 0
+            self.durations = []
+
+    def record(self, kind, nbytes, duration, error=False):
+        if kind == "control":
+            return
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+            self.bytes_sent += nbytes
+            self.errors += error
+            self.durations.append(duration)
+
+    def stats(self):
+        with self._lock:
+            durations = sorted(self.durations)
+            return {
+                "requests": dict(self.requests),
+                "errors": self.errors,
+                "bytes_sent": self.bytes_sent,
+                "p50": percentile(durations, 50),
+                "p99": percentile(durations, 99),
+            }
+
+    def blob(self, key, size):
+        """返回长度为 size 的字节串，开头带 key 使不同资源内容互不相同 (资源库按内容去重)。"""
+        with self._lock:
+            filler = self._blobs.get(size)
+            if filler is None:
+                filler = self._blobs[size] = (_FILLER * (size // len(_FILLER) + 1))[:size]
+        head = key.encode("ascii")
+        return (head + filler)[:max(size, len(head))]
+
+    # --- 数据生成 ---
+
+    def pg_ids(self):
+        return [FIRST_PG_ID + i for i in range(self.packages)]
+
+    def package(self, pg_id):
+        return {
+            "pg_id": pg_id,
+            "pg_name": f"基准卡包 {pg_id}",
+            "c_num": self.cards,
+            "cover_url": f"{self.base_url}/assets/pg/{pg_id}.jpg",
+            "share": {"share_url": f"{self.base_url}/pages/pg/{pg_id}.html"},
+        }
+
+    def card_ids(self, pg_id):
+        base = pg_id * CARD_ID_STRIDE
+        own = range(base + self.cards - self.shared_cards - 1, base - 1, -1)
+        shared = range(SHARED_PG_ID * CARD_ID_STRIDE + self.shared_cards - 1, SHARED_PG_ID * CARD_ID_STRIDE - 1, -1)
+        return [*own, *shared]
+
+    def card_pg_ids(self, card_id):
+        """卡片所属的卡包 (共有卡片属于所有卡包)。"""
+        pg_id = card_id // CARD_ID_STRIDE
+        return self.pg_ids() if pg_id == SHARED_PG_ID else [pg_id]
+
+    @staticmethod
+    def card_cat(card_id):
+        rng = random.Random(card_id)
+        return rng.choices([c for c, _ in CARD_CATS], [w for _, w in CARD_CATS])[0]
+
+    @staticmethod
+    def created_int(card_id):
+        return 1_500_000_000 + card_id % CARD_ID_STRIDE * 3600
+
+    def directory_entry(self, card_id):
+        created = self.created_int(card_id)
+        return {
+            "id": card_id,
+            "card_cat": self.card_cat(card_id),
+            "owner": {"user_id": 1},
+            "data": {
+                "title": f"卡片 {card_id}",
+                "created_date": time.strftime("%Y.%m.%d", time.gmtime(created)),
+                "public_status": 1,
+                "created_int": created,
+            },
+        }
+
+    def card_detail(self, card_id):
+        entry = self.directory_entry(card_id)
+        cat = entry["card_cat"]
+        title, created = entry["data"]["title"], entry["data"]["created_int"]
+        text = self.blob(f"{card_id}:", self.desc_bytes).decode("utf-8", "ignore")
+        cover = f"{self.base_url}/assets/cover/{card_id}.jpg"
+        share = {"share_title": title, "share_url": f"{self.base_url}/pages/{card_id}.html"}
+        pg_id, *b_pgs = self.card_pg_ids(card_id)
+        b_pgs = [{"pg_id": p} for p in b_pgs]
+        if cat == 1:
+            return {
+                "id": card_id, "title": title, "url": share["share_url"], "short_des": text[:40],
+                "cover_url": cover, "created_date": entry["data"]["created_date"], "created_int": created,
+                "updated_int": created, "description": text, "card_cat": cat, "pg_id": pg_id, "b_pgs": b_pgs,
+            }
+        data = {"title": title, "created_date": entry["data"]["created_date"], "created_int": created}
+        if cat == 60:
+            data.update(cover_url=cover, sound_url=f"{self.base_url}/media/{card_id}.m4a", sound_duration=5902)
+        else:
+            data.update(content=text, short_des=text[:40], cover_url="")
+        return {"id": card_id, "card_cat": cat, "owner": {"user_id": 1}, "share": share, "data": data,
+                "owner_package": {"pg_id": pg_id}, "b_pgs": b_pgs}
+
+    def page(self, card_id):
+        parts = [
+            f'<html><head><meta charset="utf-8"><title>{card_id}</title>',
+            '<link rel="stylesheet" href="/static/page.css"></head><body><div class="article">',
+        ]
+        for i in range(self.page_images):
+            parts.append(f"<p>第 {i} 段</p>" + f'<img src="/assets/page/{card_id}/{i}.jpg">')
+        parts.append("</div></body></html>")
+        return "".join(parts).encode("utf-8")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type, kind, start, error=False, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status == 503:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+        self.state.record(kind, len(body) if self.command != "HEAD" else 0, time.monotonic() - start, error)
+
+    def _resource(self, body, content_type, kind, start):
+        """发送资源文件：带 ETag，Range 请求返回 206 (If-Range 与 ETag 不符时返回完整内容)。"""
+        etag = f'"{zlib.crc32(body):08x}"'
+        headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+        m = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if m and self.headers.get("If-Range", etag) == etag:
+            offset = int(m.group(1))
+            if offset >= len(body):
+                return self._send(416, b"", content_type, kind, start, error=True,
+                                  headers={"Content-Range": f"bytes */{len(body)}"})
+            headers["Content-Range"] = f"bytes {offset}-{len(body) - 1}/{len(body)}"
+            return self._send(206, body[offset:], content_type, kind, start, headers=headers)
+        self._send(200, body, content_type, kind, start, headers=headers)
+
+    def _json(self, obj, kind, start):
+        self._send(200, json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8",
+                   kind, start)
+
+    def _delay(self):
+        state = self.state
+        if state.latency or state.jitter:
+            time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+        if state.error_rate and random.random() < state.error_rate:
+            return True
+        return False
+
+    def do_POST(self):
+        start = time.monotonic()
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        path = urlparse(self.path).path
+        if path == "/__reset":
+            self.state.reset()
+            return self._json({"code": 0}, "control", start)
+
+        kind = path.rsplit("/", 1)[-1]
+        if self._delay():
+            return self._send(503, b"Service Unavailable", "text/plain", kind, start, error=True)
+        state = self.state
+        if path == "/api/1/users/sign_in":
+            user = {"authentication_token": "mock-token", "id": 1, "name": form.get("account", "bench")}
+            return self._json({"code": 0, "message": "", "user": user}, kind, start)
+        if path == "/api/1/pg/list":
+            return self._json({"code": 0, "pg": [state.package(i) for i in state.pg_ids()]}, kind, start)
+        if path == "/api/1/pg/directoryList":
+            pg_id = int(form.get("pg_id", 0))
+            if pg_id not in state.pg_ids():
+                return self._json({"code": 404, "message": "卡包不存在"}, kind, start)
+            cards = [state.directory_entry(cid) for cid in state.card_ids(pg_id)]
+            return self._json({"code": 0, "message": "", "cards": cards}, kind, start)
+        if path == "/api/1/cards/detail":
+            card_id = int(form.get("card_id", 0))
+            return self._json({"code": 0, "unread": 0, "card": state.card_detail(card_id)}, kind, start)
+        self._send(404, b"Not Found", "text/plain", kind, start)
+
+    def do_GET(self):
+        start = time.monotonic()
+        path = urlparse(self.path).path
+        state = self.state
+        if path == "/__stats":
+            return self._json(state.stats(), "control", start)
+
+        kind = path.split("/")[1] if path.count("/") > 1 else "other"
+        if self._delay():
+            return self._send(503, b"Service Unavailable", "text/plain", kind, start, error=True)
+        if path.startswith("/pages/") and path.endswith(".html"):
+            card_id = path[len("/pages/"):-len(".html")].rsplit("/", 1)[-1]
+            return self._send(200, state.page(card_id), "text/html; charset=utf-8", kind, start)
+        if path == "/static/page.css":
+            return self._resource(b".article{max-width:40em}", "text/css", kind, start)
+        if path.startswith("/assets/page/"):
+            return self._resource(state.blob(path, state.image_bytes), "image/jpeg", kind, start)
+        if path.startswith("/assets/"):
+            return self._resource(state.blob(path, state.cover_bytes), "image/jpeg", kind, start)
+        if path.startswith("/media/"):
+            return self._resource(state.blob(path, state.audio_bytes), "audio/mp4", kind, start)
+        self._send(404, b"Not Found", "text/plain", kind, start)
+
+    do_HEAD = do_GET
+
+
+def add_arguments(ap):
+    """添加延迟、错误率与数据大小参数 (bench_export.py 共用)。"""
+    ap.add_argument("--latency", type=float, default=0.02, help="每个请求的平均延迟 (秒)")
+    ap.add_argument("--jitter", type=float, default=0.01, help="延迟的随机波动 (秒)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 503 的概率")
+    ap.add_argument("--desc-bytes", type=int, default=2048, help="卡片正文大小")
+    ap.add_argument("--cover-bytes", type=int, default=64 * 1024, help="封面图片大小")
+    ap.add_argument("--audio-bytes", type=int, default=512 * 1024, help="声音卡音频大小")
+    ap.add_argument("--page-images", type=int, default=4, help="每个网页快照中的图片数")
+    ap.add_argument("--image-bytes", type=int, default=32 * 1024, help="网页图片大小")
+    ap.add_argument("--shared-cards", type=int, default=0, help="每个卡包中所有卡包共有的卡片数")
+
+
+def start_server(args, host="127.0.0.1", port=0):
+    """启动服务器 (后台线程)，返回 (server, base_url)。"""
+    state = MockState(args)
+    handler = type("MockHandler", (Handler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    state.base_url = f"http://{host}:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state.base_url
+
+
+def main():
+    ap = argparse.ArgumentParser(description="本地模拟 llspace 服务器")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765, help="监听端口，0 为随机端口")
+    ap.add_argument("--packages", type=int, default=1, help="卡包数")
+    ap.add_argument("--cards", type=int, default=100, help="每个卡包的卡片数")
+    add_arguments(ap)
+    args = ap.parse_args()
+    server, base_url = start_server(args, args.host, args.port)
+    # 第一行输出地址，便于脚本读取
+    print(base_url, flush=True)
+    print(f"{args.packages} 个卡包 x {args.cards} 张卡片 (共有 {args.shared_cards} 张)，延迟 {args.latency}s，错误率 {args.error_rate}",
+          file=sys.stderr, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,27 @@ import os
 import sys
 import subprocess
 import platform
+import argparse
 import shutil
 
-def build():
+# 构建配置:
+#   onefile: 单个可执行文件，便于分发，但每次启动都要把 Python 运行时、Tcl/Tk 等解压到临时目录
+#   fast:    onedir，程序与运行时放在同一目录，启动时无需解压；不使用 UPX 压缩，加载时也无需解压
+PROFILES = {
+    "onefile": ["--onefile"],
+    "fast": ["--onedir", "--noupx"],
+}
+
+
+def build(profile="onefile"):
     system = platform.system()
-    print(f"正在为 {system} 平台构建...")
+    print(f"正在为 {system} 平台构建 ({profile})...")
 
     # 基础命令
     args = [
         "pyinstaller",
         "--noconfirm",
-        "--onefile",
+        *PROFILES[profile],
         "--windowed",
         "--name", "llspace-exporter",
         "--clean",
@@ -74,8 +84,11 @@ def build():
             exe_path = os.path.join(dist_dir, "llspace-exporter.app")
         else:
             exe_path = os.path.join(dist_dir, "llspace-exporter")
-            
-        print(f"可执行文件位于: {dist_dir}")
+        if profile == "fast" and system != "Darwin":
+            # onedir: 可执行文件在同名目录中，分发时需要整个目录
+            exe_path = os.path.join(dist_dir, "llspace-exporter", os.path.basename(exe_path))
+
+        print(f"可执行文件位于: {exe_path}")
         print("="*30 + "\n")
         
     except subprocess.CalledProcessError as e:
@@ -83,6 +96,11 @@ def build():
         sys.exit(1)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="使用 PyInstaller 打包")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="onefile",
+                        help="onefile: 单文件 (默认)；fast: 目录形式，启动更快")
+    cli_args = parser.parse_args()
+
     # 确保在虚拟环境中运行或已安装 pyinstaller
     try:
         import PyInstaller
@@ -90,4 +108,4 @@ if __name__ == "__main__":
         print("错误: 未找到 PyInstaller。请先运行 'uv sync' 安装依赖。")
         sys.exit(1)
         
-    build()
+    build(cli_args.profile)
@@ -0,0 +1,290 @@
+"""llspace 导出工具命令行入口 (无需图形界面，适合脚本和定时任务)。
+
+所有输出均为 JSON Lines，每行一个事件，例如:
+    {"event": "progress", "pg_id": 1, "current": 3, "total": 10, "percent": 30.0, "message": "..."}
+
+用法示例:
+    python cli.py login -u 账号 -p 密码
+    python cli.py packages
+    python cli.py export --all -o /backup/llspace --incremental
+    python cli.py --session cache/a.json export --id 123 --name 我的卡包
+    python cli.py search 卡包名_1735647600/search.sqlite3 关键词
+"""
+import os
+import sys
+import json
+import signal
+import getpass
+import logging
+import argparse
+import threading
+
+from src.config import LOG_FILE, SESSION_FILE, SEARCH_DB_GLOBAL_PATH
+
+# 退出码
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+# 多个卡包并行导出时，事件行来自不同线程
+_emit_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    line = json.dumps(dict(event=event, **fields), ensure_ascii=False) + "\n"
+    with _emit_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def setup_logging(verbose=False):
+    handlers = [logging.FileHandler(LOG_FILE, encoding='utf-8')]
+    if verbose:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=handlers,
+    )
+
+
+def make_client(with_cache=True, rate_limit=None):
+    from src.api_client import LLSpaceClient
+    from src.throttle import TokenBucket
+    cache = None
+    if with_cache:
+        from src.card_cache import CardCache
+        try:
+            cache = CardCache()
+        except Exception as e:
+            logging.error(f"无法打开卡片缓存，将不使用缓存: {e}")
+    rate_limiter = TokenBucket(rate=rate_limit) if rate_limit is not None else None
+    return LLSpaceClient(cache=cache, rate_limiter=rate_limiter)
+
+
+def restore_login(client, session_path):
+    from src.session_cache import restore_client
+    session = restore_client(client, session_path)
+    if session is None:
+        emit("error", message="未登录，请先运行 login 子命令")
+    return session
+
+
+def cmd_login(args):
+    from src.session_cache import save_session
+    password = args.password or os.environ.get("LLSPACE_PASSWORD")
+    if not password:
+        if not sys.stdin.isatty():
+            emit("error", message="未提供密码 (使用 --password 或环境变量 LLSPACE_PASSWORD)")
+            return EXIT_USAGE
+        password = getpass.getpass("密码: ")
+
+    client = make_client(with_cache=False)
+    success, msg = client.login(args.username, password)
+    if not success:
+        emit("error", message=f"登录失败: {msg}")
+        return EXIT_FAILED
+
+    try:
+        packages = client.get_packages()
+    except Exception as e:
+        logging.error(f"获取卡包列表失败: {e}")
+        packages = []
+    save_session(client.user_info, packages, args.session)
+    emit("login", user=client.user_info.get("name"), packages=len(packages))
+    return EXIT_OK
+
+
+def cmd_logout(args):
+    from src.session_cache import clear_session
+    clear_session(args.session)
+    emit("logout")
+    return EXIT_OK
+
+
+def _fetch_packages(client, session, session_path, use_cached=False):
+    from src.session_cache import save_session
+    if use_cached:
+        return session.get("packages", [])
+    try:
+        packages = client.get_packages()
+    except Exception as e:
+        # 获取失败时退回缓存的卡包列表
+        emit("warning", message=f"获取卡包列表失败，使用缓存的列表: {e}")
+        return session.get("packages", [])
+    save_session(client.user_info, packages, session_path)
+    return packages
+
+
+def cmd_packages(args):
+    client = make_client(with_cache=False)
+    session = restore_login(client, args.session)
+    if session is None:
+        return EXIT_USAGE
+    for pkg in _fetch_packages(client, session, args.session, args.cached):
+        emit("package", pg_id=pkg.get("pg_id"), pg_name=pkg.get("pg_name"))
+    return EXIT_OK
+
+
+def _select_packages(packages, args):
+    """按 --all / --id / --name 选择卡包，返回 (选中的卡包, 找不到的 id 或名称)。"""
+    if args.all:
+        return packages, []
+    by_key = {}
+    for pkg in packages:
+        by_key[str(pkg.get("pg_id"))] = pkg
+        by_key.setdefault(pkg.get("pg_name"), pkg)
+
+    selected, missing = {}, []
+    for key in [str(i) for i in args.id or []] + (args.name or []):
+        pkg = by_key.get(key)
+        if pkg is None:
+            missing.append(key)
+        else:
+            selected.setdefault(pkg.get("pg_id"), pkg)
+    return list(selected.values()), missing
+
+
+def cmd_export(args):
+    if not (args.all or args.id or args.name):
+        emit("error", message="请用 --id、--name 或 --all 指定要导出的卡包")
+        return EXIT_USAGE
+
+    client = make_client(rate_limit=args.rate_limit)
+    session = restore_login(client, args.session)
+    if session is None:
+        return EXIT_USAGE
+
+    packages, missing = _select_packages(_fetch_packages(client, session, args.session, args.cached), args)
+    for key in missing:
+        emit("error", message=f"找不到卡包: {key}")
+    if not packages:
+        return EXIT_FAILED
+
+    from src.scheduler import ExportScheduler
+    output_root = os.path.abspath(args.output)
+    os.makedirs(output_root, exist_ok=True)
+    global_db = (args.global_search_db or SEARCH_DB_GLOBAL_PATH) if args.global_search_db is not None else None
+
+    def on_package_start(pkg):
+        emit("package_start", pg_id=pkg.get("pg_id"), pg_name=pkg.get("pg_name"))
+
+    def on_progress(pkg, done, total, message, percent):
+        emit("progress", pg_id=pkg.get("pg_id"), current=done, total=total, percent=round(percent, 1), message=message)
+
+    def on_media_progress(pkg, done, total, message, percent):
+        emit("media_progress", pg_id=pkg.get("pg_id"), current=done, total=total, percent=round(percent, 1),
+             message=message)
+
+    def on_package_done(pkg, output_dir, count, error):
+        failed_cards = getattr(error, "failed_cards", None)
+        if failed_cards:
+            # 部分卡片获取失败：结果已写出，导出日志保留供续传
+            emit("package_incomplete", pg_id=pkg.get("pg_id"), pg_name=pkg.get("pg_name"), output_dir=output_dir,
+                 cards=count, failed=[{"id": cid, "title": title, "error": reason} for cid, title, reason in failed_cards])
+        elif error is not None:
+            emit("package_failed", pg_id=pkg.get("pg_id"), pg_name=pkg.get("pg_name"), message=str(error))
+        elif output_dir is not None:
+            emit("package_done", pg_id=pkg.get("pg_id"), pg_name=pkg.get("pg_name"), output_dir=output_dir,
+                 cards=count, stopped=scheduler.stop_event.is_set())
+
+    scheduler = ExportScheduler(
+        client, packages,
+        on_progress=on_progress, on_package_start=on_package_start, on_package_done=on_package_done,
+        on_media_progress=on_media_progress, max_parallel=args.parallel, request_budget=args.budget,
+        max_workers=args.workers, global_search_db=global_db, archive_format=args.archive,
+        metrics_textfile_dir=args.metrics_textfile_dir,
+    )
+
+    # Ctrl+C / SIGTERM 时停止导出并保留日志，下次可续传
+    def on_signal(signum, frame):
+        emit("stopping", signal=signum)
+        scheduler.stop()
+
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, on_signal)
+
+    results = scheduler.run(output_root, incremental=args.incremental, resume=not args.no_resume)
+    failed = sum(1 for _, _, _, error in results if error is not None)
+    stopped = scheduler.stop_event.is_set()
+    dedup = scheduler.registry.saved() if scheduler.registry is not None else None
+    emit("done", packages=len(packages), failed=failed, stopped=stopped, dedup=dedup)
+    return EXIT_FAILED if failed or missing or stopped else EXIT_OK
+
+
+def cmd_search(args):
+    from src.search_db import search
+    for hit in search(args.db, args.query, args.limit, args.pg_id):
+        emit("hit", **hit)
+    return EXIT_OK
+
+
+def build_parser():
+    from src.config import (
+        EXPORT_WORKERS, PARALLEL_PACKAGES, GLOBAL_REQUEST_BUDGET, METRICS_TEXTFILE_DIR, API_RATE_LIMIT,
+    )
+    from src.archive import ARCHIVE_FORMATS
+    parser = argparse.ArgumentParser(prog="cli.py", description="llspace 导出工具 (命令行)")
+    parser.add_argument("-C", "--workdir", help="工作目录 (cache/ 与日志所在位置)，默认为当前目录")
+    parser.add_argument("--session", default=SESSION_FILE, help=f"会话缓存文件，多账号时可分别指定 (默认 {SESSION_FILE})")
+    parser.add_argument("-v", "--verbose", action="store_true", help="同时把日志输出到标准错误")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("login", help="登录并缓存会话")
+    p.add_argument("-u", "--username", required=True)
+    p.add_argument("-p", "--password", help="密码，也可通过环境变量 LLSPACE_PASSWORD 提供")
+    p.set_defaults(func=cmd_login)
+
+    p = sub.add_parser("logout", help="清除缓存的会话")
+    p.set_defaults(func=cmd_logout)
+
+    p = sub.add_parser("packages", help="列出卡包")
+    p.add_argument("--cached", action="store_true", help="使用缓存的卡包列表，不访问网络")
+    p.set_defaults(func=cmd_packages)
+
+    p = sub.add_parser("export", help="导出卡包")
+    p.add_argument("--id", type=int, action="append", help="按卡包 id 选择，可重复")
+    p.add_argument("--name", action="append", help="按卡包名称选择，可重复")
+    p.add_argument("--all", action="store_true", help="导出全部卡包")
+    p.add_argument("-o", "--output", default=".", help="导出目录，默认为工作目录")
+    p.add_argument("--incremental", action="store_true", help="增量导出")
+    p.add_argument("--no-resume", action="store_true", help="不继续上次中断的导出")
+    p.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="每个卡包的并发数")
+    p.add_argument("--parallel", type=int, default=PARALLEL_PACKAGES, help="同时导出的卡包数")
+    p.add_argument("--budget", type=int, default=GLOBAL_REQUEST_BUDGET, help="所有卡包合计的在途请求上限")
+    p.add_argument("--rate-limit", type=float, default=API_RATE_LIMIT, metavar="RPS",
+                   help="每秒请求数上限，0 表示不限速 (默认由自适应并发在服务端限流时自动降速)")
+    p.add_argument("--global-search-db", nargs="?", const="", default=None, metavar="PATH",
+                   help=f"同时写入跨卡包的全局检索库 (默认 {SEARCH_DB_GLOBAL_PATH})")
+    p.add_argument("--cached", action="store_true", help="使用缓存的卡包列表选择卡包")
+    p.add_argument("--archive", choices=ARCHIVE_FORMATS, help="输出为单个归档文件而不是文件夹 (不支持增量导出和续传)")
+    p.add_argument("--metrics-textfile-dir", default=METRICS_TEXTFILE_DIR, metavar="DIR",
+                   help="把每个卡包的导出指标写入 node_exporter 的 textfile 目录 (Prometheus 格式)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("search", help="查询全文检索库")
+    p.add_argument("db", help="search.sqlite3 路径")
+    p.add_argument("query")
+    p.add_argument("-n", "--limit", type=int, default=20)
+    p.add_argument("--pg-id", type=int)
+    p.set_defaults(func=cmd_search)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        os.chdir(args.workdir)
+    setup_logging(args.verbose)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    # 打包后快照解析子进程需要；未打包时 freeze_support 不做任何事，不必导入 multiprocessing
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 import tkinter as tk
 import logging
 from src.config import LOG_FILE
@@ -35,6 +36,12 @@ def fix_macos_tk():
         except Exception as e:
             print(f"警告: 设置 Tcl/Tk 路径失败: {e}")
 
+def write_startup_probe(root, path):
+    root.update_idletasks()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(repr(time.time()))
+    root.destroy()
+
 def main():
     os.chdir(user_downloads_dir())
     setup_logging()
@@ -42,7 +49,15 @@ def main():
     
     root = tk.Tk()
     app = App(root)
+    probe = os.environ.get("LLSPACE_STARTUP_PROBE")
+    if probe:
+        # 启动基准 (benchmarks/bench_startup.py): 首个窗口绘制完成后把时间写入文件并退出
+        root.after_idle(write_startup_probe, root, probe)
     root.mainloop()
 
 if __name__ == "__main__":
+    # 打包后快照解析子进程需要；未打包时 freeze_support 不做任何事，不必导入 multiprocessing
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()
     main()
@@ -1,94 +1,163 @@
-import requests
+import time
 import logging
 import json
-from .config import API_BASE_URL
+from .config import API_BASE_URL, API_TIMEOUT, API_MAX_RETRIES
 from .utils import generate_headers
+from .http_pool import get_session
+from .card_cache import DETAIL, DIRECTORY
+from .throttle import TokenBucket, AdaptiveLimiter, backoff_delay, request_slot
+from . import metrics
+
+
+class ApiError(Exception):
+    """API 正常返回但 code 不为 0 (参数错误、无权限、卡片不存在等)，重试无意义。"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{message} (code={code})")
+        self.code = code
+        self.message = message
+
+
+class TransportError(Exception):
+    """网络层错误 (超时、连接失败、HTTP 429/5xx、响应无法解析)，已按退避策略重试仍失败。"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        # 服务端通过 Retry-After 要求的等待秒数
+        self.retry_after = retry_after
+
 
 class LLSpaceClient:
-    def __init__(self):
+    def __init__(self, cache=None, rate_limiter=None, concurrency=None):
         self.token = None
         self.user_info = {}
+        # 可选的持久化缓存 (CardCache)，用于目录与卡片详情
+        self.cache = cache
+        # 所有 API 请求共享的令牌桶限速与 AIMD 自适应并发
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.concurrency = concurrency or AdaptiveLimiter()
+
+    def _post(self, path, data=None, token=None):
+        """发送 API 请求并返回 code 为 0 的结果。
+
+        传输错误按指数退避 (带抖动) 重试，仍失败时抛出 TransportError；
+        API 返回非 0 code 时抛出 ApiError。
+        """
+        # 指标按接口名记录，如 api.detail (含重试的总耗时)
+        with metrics.timed("api." + path.rsplit("/", 1)[-1]) as t:
+            result, t.bytes = self._request(path, data, token)
+            return result
+
+    def _request(self, path, data, token):
+        # requests 在首次请求时才导入 (见 http_pool)，启动时不需要
+        import requests
+        url = f"{API_BASE_URL}{path}"
+        last_error = None
+        for attempt in range(API_MAX_RETRIES + 1):
+            if attempt:
+                delay = backoff_delay(attempt - 1)
+                if last_error.retry_after:
+                    delay = max(delay, last_error.retry_after)
+                logging.warning(f"请求 {path} 失败 ({last_error})，{delay:.1f} 秒后第 {attempt} 次重试")
+                time.sleep(delay)
+
+            self.rate_limiter.acquire()
+            with request_slot(), self.concurrency.slot():
+                start = time.monotonic()
+                try:
+                    resp = get_session().post(url, headers=generate_headers(token), data=data, timeout=API_TIMEOUT)
+                except (requests.Timeout, requests.ConnectionError) as e:
+                    self.concurrency.on_overload(type(e).__name__)
+                    last_error = TransportError(str(e))
+                    continue
+                latency = time.monotonic() - start
+
+            if resp.status_code == 429 or resp.status_code >= 500:
+                self.concurrency.on_overload(f"HTTP {resp.status_code}")
+                last_error = TransportError(f"HTTP {resp.status_code}", resp.status_code, _retry_after(resp))
+                continue
+            if resp.status_code >= 400:
+                raise TransportError(f"HTTP {resp.status_code}", resp.status_code)
+
+            try:
+                result = resp.json()
+            except ValueError:
+                last_error = TransportError("响应不是有效的 JSON", resp.status_code)
+                continue
+
+            self.concurrency.on_success(latency)
+            if result.get("code") != 0:
+                raise ApiError(result.get("code"), result.get("message", "未知错误"))
+            return result, len(resp.content)
+
+        raise last_error
 
     def login(self, account, password):
-        url = f"{API_BASE_URL}/api/1/users/sign_in"
-        headers = generate_headers()
         data = {
             "account": account,
             "password": password
         }
         
         try:
-            resp = requests.post(url, headers=headers, data=data, timeout=10)
-            resp.raise_for_status()
-            result = resp.json()
-            
-            if result.get("code") == 0:
-                self.token = result["user"]["authentication_token"]
-                self.user_info = result["user"]
-                # print(f"登录响应数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
-                logging.info(f"用户 {account} 登录成功。")
-                return True, None
-            else:
-                return False, result.get("message", "未知错误")
+            result = self._post("/api/1/users/sign_in", data)
+        except ApiError as e:
+            return False, e.message
         except Exception as e:
             logging.error(f"登录错误: {e}")
             return False, str(e)
 
+        self.token = result["user"]["authentication_token"]
+        self.user_info = result["user"]
+        # print(f"登录响应数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
+        logging.info(f"用户 {account} 登录成功。")
+        return True, None
+
     def get_packages(self):
-        url = f"{API_BASE_URL}/api/1/pg/list"
-        headers = generate_headers(self.token)
-        
-        try:
-            resp = requests.post(url, headers=headers, timeout=10)
-            resp.raise_for_status()
-            result = resp.json()
-            
-            if result.get("code") == 0:
-                # print(f"卡片列表数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
-                return result.get("pg", [])
-            else:
-                logging.error(f"获取卡包列表错误: {result.get('message')}")
-                return []
-        except Exception as e:
-            logging.error(f"获取卡包列表异常: {e}")
-            return []
+        result = self._post("/api/1/pg/list", token=self.token)
+        # print(f"卡片列表数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
+        return result.get("pg", [])
 
-    def get_directory(self, pg_id):
-        url = f"{API_BASE_URL}/api/1/pg/directoryList"
-        headers = generate_headers(self.token)
-        data = {"pg_id": pg_id}
-        
-        try:
-            resp = requests.post(url, headers=headers, data=data, timeout=10)
-            resp.raise_for_status()
-            result = resp.json()
-            
-            if result.get("code") == 0:
-                # print(f"卡包列表数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
-                return result.get("cards", [])
-            else:
-                logging.error(f"获取目录错误: {result.get('message')}")
-                return []
-        except Exception as e:
-            logging.error(f"获取目录异常: {e}")
-            return []
+    def get_directory(self, pg_id, use_cache=True):
+        # 目录缓存只用于预览；导出时以 use_cache=False 请求最新目录 (结果仍会写入缓存)
+        # 目录与账号相关，缓存键包含用户 id
+        cache_key = f"{self.user_info.get('id', '')}:{pg_id}"
+        if use_cache and self.cache is not None:
+            cached = self.cache.get(DIRECTORY, cache_key)
+            if cached is not None:
+                return cached
 
-    def get_card_detail(self, card_id, pg_id):
-        url = f"{API_BASE_URL}/api/1/cards/detail"
-        headers = generate_headers(self.token)
-        data = {"card_id": card_id, "from_pg_id": pg_id}
-        
-        try:
-            resp = requests.post(url, headers=headers, data=data, timeout=10)
-            resp.raise_for_status()
-            result = resp.json()
-            
-            if result.get("code") == 0:
-                # print(f"卡片数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
-                return result.get("card", {})
-            else:
-                logging.error(f"获取卡片详情错误: {result.get('message')}")
-                return None
-        except Exception as e:
-            logging.error(f"获取卡片详情异常: {e}")
-            return None
+        result = self._post("/api/1/pg/directoryList", {"pg_id": pg_id}, token=self.token)
+        # print(f"卡包列表数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
+        cards = result.get("cards", [])
+        if self.cache is not None:
+            self.cache.put(DIRECTORY, cache_key, cards)
+        return cards
+
+    def get_card_detail(self, card_id, pg_id, created_int=None, updated_int=None, use_cache=True):
+        # 详情按卡片 id 缓存，同一卡片出现在多个卡包中时也只请求一次；
+        # created_int/updated_int (若已知) 用于校验缓存是否过期
+        if use_cache and self.cache is not None:
+            cached = self.cache.get(DETAIL, card_id, created_int, updated_int)
+            if cached is not None:
+                return cached
+
+        result = self._post("/api/1/cards/detail", {"card_id": card_id, "from_pg_id": pg_id}, token=self.token)
+        # print(f"卡片数据: {json.dumps(result, ensure_ascii=False, indent=2)}")
+        card = result.get("card") or {}
+        if self.cache is not None and card:
+            data = card.get("data", {})
+            self.cache.put(
+                DETAIL, card_id, card,
+                created_int=card.get("created_int") or data.get("created_int"),
+                updated_int=card.get("updated_int") or data.get("updated_int"),
+            )
+        return card
+
+
+def _retry_after(resp):
+    # Retry-After 只处理秒数形式
+    try:
+        return float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
@@ -0,0 +1,110 @@
+import os
+import shutil
+import logging
+import tarfile
+import zipfile
+import threading
+from .config import ARCHIVE_STORED_EXTS
+
+# 支持的归档格式 (扩展名)
+ARCHIVE_FORMATS = ("zip", "tar", "tar.gz", "tar.zst")
+
+
+def _zstd_writer(fileobj):
+    """返回写入 fileobj 的 zstd 压缩流；Python 3.14 自带 compression.zstd，否则需要 zstandard 包。"""
+    try:
+        from compression import zstd
+        return zstd.ZstdFile(fileobj, "w")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("tar.zst 格式需要安装 zstandard (uv pip install zstandard)")
+    return zstandard.ZstdCompressor().stream_writer(fileobj, closefd=False)
+
+
+class ArchiveWriter:
+    """把导出内容逐个写入单个归档文件 (zip / tar / tar.gz / tar.zst)。
+
+    写入 `.part` 临时文件，close 时原子替换。可被多个线程调用，条目按加入顺序串行写出；
+    同名条目只写入第一次。zip 中已压缩的媒体 (图片、音频等) 直接存储，HTML/CSS/JS 等文本压缩存储。
+    """
+
+    def __init__(self, path, fmt):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"不支持的归档格式: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self._lock = threading.Lock()
+        self._names = set()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._raw = open(path + ".part", "wb")
+        self._compressor = None
+        if fmt == "zip":
+            self._zip = zipfile.ZipFile(self._raw, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        else:
+            self._zip = None
+            if fmt == "tar.zst":
+                self._compressor = _zstd_writer(self._raw)
+                self._tar = tarfile.open(fileobj=self._compressor, mode="w|")
+            else:
+                self._tar = tarfile.open(fileobj=self._raw, mode="w|gz" if fmt == "tar.gz" else "w|")
+
+    def _compress_type(self, arcname):
+        ext = os.path.splitext(arcname)[1].lower()
+        return zipfile.ZIP_STORED if ext in ARCHIVE_STORED_EXTS else zipfile.ZIP_DEFLATED
+
+    def add_file(self, src_path, arcname):
+        """把磁盘上的文件加入归档 (流式复制，不整体读入内存)。"""
+        arcname = arcname.replace(os.sep, "/")
+        with self._lock:
+            if arcname in self._names:
+                return
+            self._names.add(arcname)
+            if self._zip is not None:
+                self._zip.write(src_path, arcname, compress_type=self._compress_type(arcname))
+            else:
+                self._tar.add(src_path, arcname, recursive=False)
+
+    def add_tree(self, root, prefix="", skip=()):
+        """把目录下尚未加入的文件全部加入归档。"""
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, root)
+                if rel in skip or name.endswith((".part", ".tmp")):
+                    continue
+                self.add_file(path, os.path.join(prefix, rel))
+
+    def _close_streams(self):
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+            if self._compressor is not None:
+                self._compressor.close()
+        self._raw.close()
+
+    def close(self):
+        with self._lock:
+            self._close_streams()
+        os.replace(self.path + ".part", self.path)
+
+    def abort(self):
+        """放弃写入并删除临时文件。"""
+        with self._lock:
+            try:
+                self._close_streams()
+            except Exception as e:
+                logging.error(f"关闭归档失败 {self.path}: {e}")
+        try:
+            os.remove(self.path + ".part")
+        except OSError:
+            pass
+
+
+def remove_staging(path):
+    shutil.rmtree(path, ignore_errors=True)
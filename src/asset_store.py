@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse
+from .config import (
+    ASSET_STORE_DIR, ASSET_STORE_MAX_BYTES, ASSET_STORE_SAVE_INTERVAL, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_PART_MAX_AGE,
+)
+from .utils import download_file, link_file
+
+
+def file_sha256(path: str) -> str:
+    """计算文件内容的 SHA-256。"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def url_ext(url: str, default: str = "") -> str:
+    """从 URL 路径中取扩展名。"""
+    ext = os.path.splitext(urlparse(url).path)[1]
+    # 过长或含奇怪字符的扩展名不可信
+    if not ext or len(ext) > 8 or not ext[1:].isalnum():
+        return default
+    return ext.lower()
+
+
+class AssetStore:
+    """跨卡片、跨导出共享的内容寻址资源库。
+
+    以 URL → 内容哈希 → 文件的两级索引保存下载过的资源，同一 URL 只下载一次，
+    内容相同的不同 URL 只保存一份。导出目录通过硬链接引用 (不支持时复制)，
+    超出容量上限时按最近使用时间淘汰。
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, root=ASSET_STORE_DIR, max_bytes=ASSET_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.index_path = os.path.join(root, "index.json")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 多个卡包并行导出时可能同时保存索引，共用同一个临时文件，需串行
+        self._save_lock = threading.Lock()
+        self._url_locks = {}
+        # 本进程启动后用过的对象不会被淘汰，避免删除正在链接的文件
+        self._session_start = time.time()
+        self._urls = {}
+        self._objects = {}
+        self._total_bytes = 0
+        self._last_save = time.time()
+        self._load()
+        self._clean_tmp()
+
+    @classmethod
+    def default(cls):
+        """进程内共享的默认资源库。"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding='utf-8') as f:
+                data = json.load(f)
+            self._urls = data.get("urls", {})
+            self._objects = data.get("objects", {})
+            self._total_bytes = sum(o.get("size", 0) for o in self._objects.values())
+        except Exception as e:
+            logging.error(f"读取资源库索引失败，将重新建立: {e}")
+            self._urls = {}
+            self._objects = {}
+            self._total_bytes = 0
+
+    def _clean_tmp(self):
+        # 临时目录中保留着中断的下载 (用于续传)，过旧的直接删除
+        cutoff = time.time() - DOWNLOAD_PART_MAX_AGE
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def save(self):
+        """原子地写回索引。"""
+        with self._lock:
+            data = {"urls": dict(self._urls), "objects": dict(self._objects)}
+            self._last_save = time.time()
+        tmp_path = self.index_path + ".tmp"
+        with self._save_lock:
+            try:
+                with open(tmp_path, "w", encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.index_path)
+            except Exception as e:
+                logging.error(f"保存资源库索引失败: {e}")
+
+    def _object_path(self, digest, ext):
+        return os.path.join(self.objects_dir, digest[:2], digest + ext)
+
+    def _lookup(self, url):
+        # 调用方需持有 self._lock
+        digest = self._urls.get(url)
+        if not digest:
+            return None
+        obj = self._objects.get(digest)
+        if not obj:
+            return None
+        path = self._object_path(digest, obj.get("ext", ""))
+        if not os.path.exists(path):
+            return None
+        obj["atime"] = time.time()
+        return path
+
+    def fetch(self, url, default_ext="", chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """返回 URL 对应资源在库中的路径，必要时下载。失败返回 None。"""
+        with self._lock:
+            path = self._lookup(url)
+            if path:
+                return path
+            # [锁, 使用者数]：最后一个使用者结束后才移除，等待中的线程和新到的线程始终共用同一把锁
+            entry = self._url_locks.get(url)
+            if entry is None:
+                entry = self._url_locks[url] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        try:
+            # 同一 URL 同时只有一个线程在下载
+            with entry[0]:
+                with self._lock:
+                    path = self._lookup(url)
+                    if path:
+                        return path
+                return self._download(url, default_ext, chunk_size)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._url_locks[url]
+
+    def _download(self, url, default_ext, chunk_size):
+        # 调用方需持有该 URL 的锁
+        ext = url_ext(url, default_ext)
+        # 临时文件名由 URL 决定，中断后再次下载同一 URL 时可以续传
+        tmp_path = os.path.join(self.tmp_dir, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + ext)
+        try:
+            if not download_file(url, tmp_path, chunk_size=chunk_size):
+                return None
+            digest = file_sha256(tmp_path)
+            size = os.path.getsize(tmp_path)
+
+            with self._lock:
+                existing = self._objects.get(digest)
+                if existing and os.path.exists(self._object_path(digest, existing.get("ext", ""))):
+                    # 内容已存在 (另一个 URL 指向同一文件)
+                    path = self._object_path(digest, existing.get("ext", ""))
+                else:
+                    path = self._object_path(digest, ext)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                    if not existing:
+                        self._total_bytes += size
+                    self._objects[digest] = {"ext": ext, "size": size, "atime": time.time()}
+                self._urls[url] = digest
+                self._objects[digest]["atime"] = time.time()
+                self._evict()
+                # 定期保存索引，进程中断后已下载的资源仍可复用
+                save_due = time.time() - self._last_save >= ASSET_STORE_SAVE_INTERVAL
+            if save_due:
+                self.save()
+            return path
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def digest(self, url):
+        """已入库 URL 的内容哈希。"""
+        with self._lock:
+            return self._urls.get(url)
+
+    def link(self, url, dest_path, default_ext="", chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """把 URL 对应的资源放到 dest_path (优先硬链接)。成功返回库内路径，失败返回 None。"""
+        src = self.fetch(url, default_ext, chunk_size)
+        if not src:
+            return None
+        try:
+            link_file(src, dest_path)
+            return src
+        except Exception as e:
+            logging.error(f"链接资源失败 {url} -> {dest_path}: {e}")
+            return None
+
+    def _evict(self):
+        # 调用方需持有 self._lock
+        if self.max_bytes is None or self._total_bytes <= self.max_bytes:
+            return
+        candidates = sorted(
+            (obj.get("atime", 0), digest) for digest, obj in self._objects.items()
+            if obj.get("atime", 0) < self._session_start
+        )
+        evicted = set()
+        for _, digest in candidates:
+            if self._total_bytes <= self.max_bytes:
+                break
+            obj = self._objects.pop(digest)
+            self._total_bytes -= obj.get("size", 0)
+            evicted.add(digest)
+            try:
+                os.remove(self._object_path(digest, obj.get("ext", "")))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.error(f"淘汰资源失败 {digest}: {e}")
+        if evicted:
+            self._urls = {u: d for u, d in self._urls.items() if d not in evicted}
+            logging.info(f"资源库超出容量，已淘汰 {len(evicted)} 个文件")
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from .config import CARD_CACHE_PATH, CARD_CACHE_TTL, DIRECTORY_CACHE_TTL, CARD_CACHE_MAX_BYTES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_int INTEGER NOT NULL DEFAULT 0,
+    updated_int INTEGER NOT NULL DEFAULT 0,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+"""
+
+# 缓存条目类型
+DETAIL = "detail"
+DIRECTORY = "directory"
+
+
+class CardCache:
+    """持久化的卡片详情 / 目录缓存 (SQLite)。
+
+    保存 `/api/1/cards/detail` 与 `/api/1/pg/directoryList` 的原始返回数据。
+    条目超过 TTL 或与调用方给出的 created_int/updated_int 不一致时视为失效；
+    总大小超出预算时按最近访问时间淘汰。
+    """
+
+    def __init__(self, path=CARD_CACHE_PATH, ttl=CARD_CACHE_TTL,
+                 directory_ttl=DIRECTORY_CACHE_TTL, max_bytes=CARD_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = {DETAIL: ttl, DIRECTORY: directory_ttl}
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, kind, key, created_int=None, updated_int=None):
+        """读取缓存，未命中或已失效时返回 None。"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_int, updated_int, fetched_at, size FROM entries WHERE kind = ? AND key = ?",
+                (kind, str(key))
+            ).fetchone()
+            if row is None:
+                return None
+            payload, cached_created, cached_updated, fetched_at, size = row
+
+            ttl = self.ttl.get(kind)
+            stale = (
+                (ttl is not None and now - fetched_at > ttl)
+                or (created_int and cached_created and created_int != cached_created)
+                or (updated_int and cached_updated and updated_int != cached_updated)
+            )
+            if stale:
+                self._conn.execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, str(key)))
+                self._conn.commit()
+                self._total_bytes -= size
+                return None
+
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE kind = ? AND key = ?", (now, kind, str(key))
+            )
+            self._conn.commit()
+        try:
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def put(self, kind, key, payload, created_int=0, updated_int=0):
+        """写入缓存条目，必要时淘汰旧条目。"""
+        data = json.dumps(payload, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM entries WHERE kind = ? AND key = ?", (kind, str(key))
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (kind, key, payload, created_int, updated_int, fetched_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, str(key), data, created_int or 0, updated_int or 0, now, now, size)
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # 调用方需持有 self._lock；淘汰到预算的 90%，避免频繁触发
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        rows = self._conn.execute("SELECT kind, key, size FROM entries ORDER BY accessed_at").fetchall()
+        for kind, key, size in rows:
+            if self._total_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key))
+            self._total_bytes -= size
+            removed += 1
+        if removed:
+            logging.info(f"卡片缓存超出容量，已淘汰 {removed} 条")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,6 +1,148 @@
+import os
+
 # --- 配置与常量 ---
-API_BASE_URL = "https://api.llspace.com"
+# 可用环境变量 LLSPACE_API_BASE_URL 指向其他服务器 (如 benchmarks/mock_server.py)
+API_BASE_URL = os.environ.get("LLSPACE_API_BASE_URL", "https://api.llspace.com")
 SECRET_KEY = "C6DAA093BF4C08B46F01FAE4F09B797A"
 CLIENT_VERSION = "1222"
 PLATFORM = "ard"
 LOG_FILE = "export.log"
+
+# --- 导出并发 ---
+# 同时进行的卡片处理数 (详情请求及其资源下载)
+EXPORT_WORKERS = 8
+
+# --- HTTP 连接池 ---
+# 缓存的主机连接池数量 (api / 图片 CDN / 快照页等)
+HTTP_POOL_CONNECTIONS = 8
+# 每个主机保持的最大连接数，导出时会随并发数自动扩大
+HTTP_POOL_MAXSIZE = EXPORT_WORKERS
+
+# --- 导出流水线 ---
+# 各阶段工作线程数。正文阶段: 详情请求 → 渲染；媒体阶段: 封面/音频下载 → 网页快照 → 渲染 (回填本地链接)
+STAGE_WORKERS = {
+    "detail": EXPORT_WORKERS,
+    "assets": EXPORT_WORKERS,
+    "snapshot": 4,
+    "render": 1,
+}
+# 阶段之间的队列长度上限 (背压)
+STAGE_QUEUE_SIZE = 32
+# 正文阶段进行期间，媒体阶段最多同时处理的卡片数 (正文阶段结束后按各阶段线程数全速进行)
+MEDIA_WORKERS_DURING_TEXT = 2
+# 媒体阶段进行期间，每隔多少秒用已下载的资源重写一次 Markdown 和索引 HTML
+MEDIA_PATCH_INTERVAL = 60
+
+# --- 资源库 ---
+# 跨导出共享的内容寻址资源库 (封面、音频、快照资源)
+ASSET_STORE_DIR = "cache/assets"
+# 资源库容量上限 (字节)，超出后按最近使用时间淘汰
+ASSET_STORE_MAX_BYTES = 2 * 1024 ** 3
+# 资源库索引的自动保存间隔 (秒)
+ASSET_STORE_SAVE_INTERVAL = 30
+# 快照资源在导出目录 web/ 下的共享子目录
+SNAPSHOT_ASSETS_DIR = "assets"
+# 下载单个快照页面资源 (图片/CSS/JS) 的并发数
+SNAPSHOT_RESOURCE_WORKERS = 8
+# 快照 HTML 解析器: "auto" (已安装 lxml 时使用 lxml)、"lxml" 或 "html.parser"
+SNAPSHOT_PARSER = "auto"
+# 快照解析进程数: 0 为自动 (CPU 核数 - 1，最多 4)，负数表示不使用子进程
+SNAPSHOT_PARSE_PROCESSES = 0
+
+# --- 增量导出 ---
+# 导出目录中记录卡片与资源的清单文件
+MANIFEST_FILE = "manifest.json"
+# 导出目录中保存全部卡片完整数据的文件 (JSON Lines)，清单按偏移量引用
+CARDS_FILE = "cards.jsonl"
+# 目录接口不返回 updated_int，增量导出时抽查最近创建的卡片数量
+INCREMENTAL_VERIFY_COUNT = 5
+# 导出进行中记录已完成卡片/资源的日志，中断后可据此续传
+JOURNAL_FILE = "journal.jsonl"
+
+# --- 卡片缓存 ---
+# 卡片详情与目录的持久化缓存 (SQLite)
+CARD_CACHE_PATH = "cache/cards.sqlite3"
+# 卡片详情缓存有效期 (秒)
+CARD_CACHE_TTL = 7 * 24 * 3600
+# 卡包目录缓存有效期 (秒)，目录变化较频繁，默认较短
+DIRECTORY_CACHE_TTL = 10 * 60
+# 缓存容量上限 (字节)，超出后按最近访问时间淘汰
+CARD_CACHE_MAX_BYTES = 256 * 1024 ** 2
+
+# --- 渲染 ---
+# 排序时内存中最多保留的卡片记录数，超出后分段写入临时文件再归并
+RENDER_SORT_CHUNK = 50000
+# 索引 HTML 每页卡片数
+INDEX_PAGE_SIZE = 100
+# 离线搜索索引每个分片的条目数
+SEARCH_SHARD_SIZE = 5000
+
+# --- 全文检索 ---
+# 每个导出目录中的全文检索库 (SQLite FTS5)
+SEARCH_DB_FILE = "search.sqlite3"
+# 可选的跨卡包全局检索库路径
+SEARCH_DB_GLOBAL_PATH = "cache/search.sqlite3"
+# 每个写入事务包含的卡片数
+SEARCH_DB_BATCH = 500
+# 数据库被其他连接锁定时的最长等待时间 (秒)，多个卡包并行写入同一全局检索库时需要
+SEARCH_DB_BUSY_TIMEOUT = 30
+
+# --- 会话 ---
+# 登录信息与卡包列表缓存 (GUI 与命令行共用)
+SESSION_FILE = "cache/session_data.json"
+
+# --- 多卡包并行导出 ---
+# 同时导出的卡包数
+PARALLEL_PACKAGES = 3
+# 所有卡包合计的在途网络请求上限
+GLOBAL_REQUEST_BUDGET = 16
+
+# --- API 限速与重试 ---
+# 单次请求超时 (秒)
+API_TIMEOUT = 10
+# 令牌桶: 平均每秒请求数及突发数 (0 表示不限速)
+# 默认不限速，由 AIMD 自适应并发在遇到 429/503 或延迟升高时自动降速；服务端要求更严格时再设置
+API_RATE_LIMIT = 0
+API_RATE_BURST = 20
+# 传输错误 (超时、连接失败、429、5xx) 的最大重试次数及指数退避参数 (秒)
+API_MAX_RETRIES = 4
+API_BACKOFF_BASE = 0.5
+API_BACKOFF_MAX = 30
+# AIMD 自适应并发: 初始/最小/最大并发数，延迟超过目标 (秒) 时减半
+API_CONCURRENCY_INITIAL = 4
+API_CONCURRENCY_MIN = 1
+API_CONCURRENCY_MAX = 16
+API_LATENCY_TARGET = 3.0
+
+# --- 文件下载 ---
+# 下载超时 (秒): (连接, 读取)
+DOWNLOAD_TIMEOUT = (10, 60)
+# 写入块大小: 封面/快照资源使用较小的块，音频等大文件使用较大的块
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MEDIA_CHUNK_SIZE = 1024 * 1024
+# 资源库中超过此时间 (秒) 未完成的临时下载文件会被清理
+DOWNLOAD_PART_MAX_AGE = 7 * 24 * 3600
+
+# --- 归档输出 ---
+# 归档模式下导出过程中的本地暂存目录
+ARCHIVE_STAGING_DIR = "cache/staging"
+# zip 中不再压缩 (直接存储) 的已压缩格式
+ARCHIVE_STORED_EXTS = frozenset((
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif",
+    ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".mp4", ".webm",
+    ".woff", ".woff2", ".zip", ".gz", ".zst",
+))
+
+# --- 导出指标 ---
+# 每次导出结束后写出的运行报告 (JSON)，位于导出目录中；归档输出时写在归档文件旁
+METRICS_REPORT_FILE = "export_report.json"
+# Prometheus textfile 目录 (node_exporter --collector.textfile.directory)，为 None 时不写出
+METRICS_TEXTFILE_DIR = None
+# 实时吞吐量与剩余时间按最近多少秒计算
+METRICS_RATE_WINDOW = 30
+
+# --- 界面 ---
+# 导出进度的界面刷新间隔 (毫秒)，与卡片完成速度无关
+GUI_PROGRESS_INTERVAL_MS = 100
+# 卡包列表筛选框停止输入多久后刷新列表 (毫秒)
+GUI_FILTER_DELAY_MS = 150
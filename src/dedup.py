@@ -0,0 +1,142 @@
+"""一次导出 (多个卡包) 内的跨卡包卡片去重。
+
+同一张卡片常出现在多个卡包中 (详情的 b_pgs 列出它还属于哪些卡包)。CardRegistry 按卡片 id
+登记正在进行和已完成的详情请求与网页快照：第一个遇到该卡片的卡包负责请求，其余卡包等待并沿用
+结果，详情直接复用，快照文件以硬链接放入各自的导出目录。
+"""
+import os
+import json
+import logging
+import threading
+from .utils import link_file
+
+
+def card_pg_ids(detail):
+    """卡片所属的全部卡包 id (字符串)：详情中的 pg_id、owner_package 与 b_pgs。"""
+    ids = set()
+    data = detail.get("data") or {}
+    for pg_id in (detail.get("pg_id"), data.get("pg_id"), (detail.get("owner_package") or {}).get("pg_id")):
+        if pg_id:
+            ids.add(str(pg_id))
+    for pg in detail.get("b_pgs") or ():
+        pg_id = (pg.get("pg_id") or pg.get("id")) if isinstance(pg, dict) else pg
+        if pg_id:
+            ids.add(str(pg_id))
+    return ids
+
+
+class _Shared:
+    """一项共享结果：生产者完成后设置 value 并唤醒等待者。"""
+
+    __slots__ = ("ready", "value", "taken", "pending")
+
+    def __init__(self, pg_id):
+        self.ready = threading.Event()
+        self.value = None
+        # 已取用的卡包 (含生产者)，以及完成后还会来取的卡包
+        self.taken = {pg_id}
+        self.pending = set()
+
+
+class CardRegistry:
+    """按卡片 id 在本次导出的各卡包间共享详情与网页快照。线程安全。
+
+    只有本次导出中还有其他卡包会用到的卡片 (依据 card_pg_ids) 才保留结果，
+    这些卡包都取用后即释放，内存占用与共享卡片数有关，与卡片总数无关。
+    """
+
+    def __init__(self, pg_ids):
+        self.pg_ids = {str(pg_id) for pg_id in pg_ids}
+        self._lock = threading.Lock()
+        self._details = {}
+        self._snapshots = {}
+        # 卡包 id -> [省去的请求数, 省去的字节数]
+        self._saved = {}
+
+    def detail(self, card_id, pg_id, fetch):
+        """返回卡片详情；其他卡包已请求 (或正在请求) 过时沿用其结果，否则调用 fetch()。"""
+        value, owner = self._share(self._details, card_id, pg_id, fetch, card_pg_ids)
+        if owner:
+            return value
+        if not value:
+            # 其他卡包请求失败，自行请求
+            return fetch()
+        self._count(pg_id, len(json.dumps(value, ensure_ascii=False).encode("utf-8")))
+        return value
+
+    def snapshot(self, card_id, pg_id, card_pgs, web_dir, produce):
+        """生成网页快照，返回页面引用的资源列表 (同 Exporter._process_web_snapshot)。
+
+        其他卡包已生成过该卡片的快照时，把页面和资源硬链接到 web_dir，不再请求和解析页面。
+        """
+        page = f"{card_id}.html"
+
+        def consumers(value):
+            # 快照失败 (页面未写出) 时不共享
+            return (card_pgs or ()) if os.path.exists(os.path.join(web_dir, page)) else ()
+
+        value, owner = self._share(self._snapshots, card_id, pg_id, lambda: (web_dir, produce()), consumers)
+        if owner:
+            return value[1]
+        if not value:
+            return produce()
+        src_dir, assets = value
+        try:
+            for rel in [page, *assets]:
+                link_file(os.path.join(src_dir, rel), os.path.join(web_dir, rel))
+            # 页面资源本来就由资源库去重，省去的只有页面本身的下载
+            nbytes = os.path.getsize(os.path.join(src_dir, page))
+        except OSError as e:
+            # 原卡包的文件已不在 (如归档暂存目录已删除)，自行生成
+            logging.info(f"无法复用卡片 {card_id} 的快照，重新生成: {e}")
+            return produce()
+        self._count(pg_id, nbytes)
+        return assets
+
+    def _share(self, table, card_id, pg_id, produce, consumers):
+        """单次生产、多方取用，返回 (结果, 本卡包是否为生产者)。
+
+        第一个到达的卡包调用 produce()，其余卡包等待其完成后得到同一结果 (生产失败时为 None)。
+        完成后只为 consumers(结果) 中尚未取用的本次导出卡包保留结果。
+        """
+        key, pg_id = str(card_id), str(pg_id)
+        with self._lock:
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = _Shared(pg_id)
+                owner = True
+            else:
+                owner = False
+                entry.taken.add(pg_id)
+                entry.pending.discard(pg_id)
+                if entry.ready.is_set() and not entry.pending:
+                    del table[key]
+
+        if not owner:
+            entry.ready.wait()
+            return entry.value, False
+
+        value = None
+        try:
+            value = produce()
+        finally:
+            with self._lock:
+                entry.value = value
+                if value:
+                    entry.pending = ({str(p) for p in consumers(value)} & self.pg_ids) - entry.taken
+                if not entry.pending:
+                    table.pop(key, None)
+            entry.ready.set()
+        return value, True
+
+    def _count(self, pg_id, nbytes):
+        with self._lock:
+            saved = self._saved.setdefault(str(pg_id), [0, 0])
+            saved[0] += 1
+            saved[1] += nbytes
+
+    def saved(self, pg_id=None):
+        """省去的请求数与字节数 {"requests", "bytes"}；pg_id 为 None 时为全部卡包合计。"""
+        with self._lock:
+            items = self._saved.values() if pg_id is None else [self._saved.get(str(pg_id), [0, 0])]
+            return {"requests": sum(s[0] for s in items), "bytes": sum(s[1] for s in items)}
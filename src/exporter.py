@@ -3,19 +3,104 @@ import time
 import threading
 import logging
 from datetime import datetime
-import requests
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-from .utils import safe_filename, download_file
-from .api_client import LLSpaceClient
+from concurrent.futures import ThreadPoolExecutor
+from .utils import safe_filename
+from .api_client import LLSpaceClient, ApiError, TransportError
+from .throttle import bind_request_slot, request_slot
+from .http_pool import get_session, configure_pool
+from .asset_store import AssetStore
+from .manifest import find_previous_export, load_manifest, ManifestWriter
+from .journal import ExportJournal, find_unfinished_export
+from .pipeline import Pipeline, Stage, PriorityGate
+from .search_db import SearchDbWriter
+from .snapshot import parse_snapshot_async, fill_snapshot
+from .archive import ArchiveWriter, remove_staging
+from .dedup import card_pg_ids
+from . import metrics
+from .metrics import ExportMetrics, write_json_report, write_prometheus_textfile
+from .renderer import (
+    CardRecord, CardReader, RecordSorter, MarkdownWriter, IndexHtmlWriter,
+    render_export, render_markdown_card, render_html_card,
+)
+from .config import (
+    EXPORT_WORKERS, STAGE_WORKERS, STAGE_QUEUE_SIZE, SNAPSHOT_ASSETS_DIR, SNAPSHOT_RESOURCE_WORKERS,
+    INCREMENTAL_VERIFY_COUNT, SEARCH_DB_FILE, DOWNLOAD_CHUNK_SIZE, MEDIA_CHUNK_SIZE, ARCHIVE_STAGING_DIR,
+    JOURNAL_FILE, METRICS_REPORT_FILE, METRICS_TEXTFILE_DIR, MEDIA_WORKERS_DURING_TEXT, MEDIA_PATCH_INTERVAL,
+)
+
+# 各阶段显示名称
+STAGE_LABELS = {
+    "detail": "详情",
+    "assets": "资源",
+    "snapshot": "快照",
+    "render": "渲染",
+    "patch": "回填",
+}
+
+
+class IncompleteExportError(Exception):
+    """导出已完成并写出结果，但部分卡片获取失败。导出日志被保留，续传时会重新获取这些卡片。"""
+
+    def __init__(self, base_dir, exported_count, failed_cards):
+        super().__init__(f"{len(failed_cards)} 张卡片获取失败，已导出 {exported_count} 张")
+        self.base_dir = base_dir
+        self.exported_count = exported_count
+        # [(卡片 id, 标题, 错误信息)]
+        self.failed_cards = failed_cards
+
 
 class Exporter:
-    def __init__(self, client: LLSpaceClient, update_callback):
+    def __init__(self, client: LLSpaceClient, update_callback, max_workers=EXPORT_WORKERS, stage_workers=None,
+                 asset_store=None, global_search_db=None, budget=None, archive_format=None,
+                 metrics_textfile_dir=METRICS_TEXTFILE_DIR, media_callback=None, registry=None):
         self.client = client
+        # update_callback 报告正文阶段的卡片进度；media_callback 报告媒体阶段 (封面、音频、快照) 的进度，
+        # 参数同为 (已完成, 已排队, 消息, 百分比)，排队数在正文阶段结束前还会增加
         self.update_callback = update_callback
+        self.media_callback = media_callback
+        self._asset_store = asset_store
+        # 除每个导出目录自带的检索库外，可额外写入一个跨卡包的全局检索库
+        self.global_search_db = global_search_db
+        # 多卡包并行导出时共享的请求预算 (RequestBudget)，为 None 时不限制
+        self.budget = budget
+        # 多卡包导出时跨卡包共享详情与快照的登记表 (CardRegistry)，为 None 时各卡包独立获取
+        self.registry = registry
+        # 归档输出格式 (zip / tar / tar.gz / tar.zst)，为 None 时输出为文件夹
+        self.archive_format = archive_format
+        # 每次导出的指标 (ExportMetrics)，结束时写出 JSON 报告，可选写入 Prometheus textfile 目录
+        self.metrics = None
+        self.metrics_textfile_dir = metrics_textfile_dir
+        self._journal = None
+        self._journaled_assets = {}
         self.stop_event = threading.Event()
+        self.failed_cards = []
+        self._failed_lock = threading.Lock()
+        self.max_workers = max(1, max_workers)
+        # 各阶段线程数，详情阶段跟随 max_workers
+        self.stage_workers = dict(STAGE_WORKERS, detail=self.max_workers)
+        if stage_workers:
+            self.stage_workers.update(stage_workers)
+        # 快照页面资源的下载线程池 (所有快照线程共用)，首次使用时创建
+        self._resource_pool = None
+        self._resource_pool_lock = threading.Lock()
+        # 连接池大小跟随所有网络阶段的并发数
+        configure_pool(
+            self.stage_workers["detail"] + self.stage_workers["assets"] + self.stage_workers["snapshot"]
+            + SNAPSHOT_RESOURCE_WORKERS
+        )
 
-    def run(self, package, output_root=None):
+    def run(self, package, output_root=None, incremental=False, resume=False):
+        self.metrics = ExportMetrics()
+        try:
+            with metrics.bind(self.metrics), bind_request_slot(self._budget_slot):
+                return self._run(package, output_root, incremental, resume)
+        finally:
+            # 包括导出失败时：把本卡包的份额让给其他卡包
+            if self.budget is not None:
+                self.budget.remove(self)
+
+    def _run(self, package, output_root, incremental, resume):
         pg_name = package.get("pg_name", "未知")
         pg_id = package.get("pg_id")
         safe_pg_name = safe_filename(pg_name)
@@ -23,8 +108,37 @@ class Exporter:
         
         if output_root is None:
             output_root = os.getcwd()
-            
-        base_dir = os.path.join(output_root, f"{safe_pg_name}_{timestamp}")
+        if self.archive_format and (incremental or resume):
+            # 归档是一次性写出的，无法在其中更新或续传
+            logging.info(f"{pg_name}: 归档输出不支持增量导出和续传，将完整导出")
+            incremental = resume = False
+
+        # 续传模式：沿用上次中断的导出目录，日志中已完成的卡片直接沿用
+        # 增量模式：沿用上次导出的目录和清单
+        base_dir, previous = None, None
+        journaled_assets = {}
+        if resume:
+            base_dir, loaded = find_unfinished_export(output_root, safe_pg_name, pg_id)
+            if loaded:
+                header, journal_cards, journaled_assets = loaded
+                incremental = incremental or header.get("incremental", False)
+                manifest = load_manifest(base_dir) if incremental else None
+                previous = dict(manifest.get("cards", {}) if manifest else {}, **journal_cards)
+                logging.info(f"继续导出 {pg_name}: 日志中已完成 {len(journal_cards)} 张")
+        if previous is None and incremental:
+            base_dir, manifest = find_previous_export(output_root, safe_pg_name, pg_id)
+            if manifest is not None:
+                previous = manifest.get("cards", {})
+        archive = None
+        if self.archive_format:
+            # 归档模式：工作目录放在本地暂存区 (资源为资源库的硬链接)，
+            # 每张卡片完成后即把其文件写入归档，结束后删除暂存目录
+            base_dir = os.path.join(ARCHIVE_STAGING_DIR, f"{safe_pg_name}_{timestamp}")
+            archive_path = os.path.join(output_root, f"{safe_pg_name}_{timestamp}.{self.archive_format}")
+            archive = ArchiveWriter(archive_path, self.archive_format)
+            archive_prefix = os.path.basename(base_dir)
+        elif previous is None:
+            base_dir = os.path.join(output_root, f"{safe_pg_name}_{timestamp}")
         
         os.makedirs(base_dir, exist_ok=True)
         images_dir = os.path.join(base_dir, "images")
@@ -34,193 +148,536 @@ class Exporter:
         web_dir = os.path.join(base_dir, "web")
         os.makedirs(web_dir, exist_ok=True)
 
-        # 获取目录
+        journal = ExportJournal(base_dir)
+        journal.open({"pg_id": pg_id, "pg_name": pg_name, "incremental": incremental})
+        self._journal = journal
+        self._journaled_assets = journaled_assets
+
+        # 获取目录：导出总是请求最新目录，缓存的目录可能缺少新卡片或仍包含已删除的卡片
         self.update_callback(0, 0, f"正在获取 {pg_name} 的目录...", 0)
-        cards_list = self.client.get_directory(pg_id)
-        total_cards = len(cards_list)
+        try:
+            cards_list = self.client.get_directory(pg_id, use_cache=False)
+        except Exception:
+            # 目录获取失败时不能继续 (否则增量导出会把所有卡片当作已删除)
+            journal.close()
+            raise
+
+        if previous is not None:
+            to_fetch, kept, to_media = self._plan_incremental(cards_list, previous, base_dir, pg_id)
+            logging.info(
+                f"增量导出 {pg_name}: 共 {len(cards_list)} 张, 需更新 {len(to_fetch)} 张, "
+                f"待补下载媒体 {len(to_media)} 张"
+            )
+        else:
+            to_fetch, kept, to_media = list(enumerate(cards_list)), {}, []
+        total_cards = len(to_fetch)
+        if self.budget is not None:
+            self.budget.set_remaining(self, total_cards)
         
-        exported_cards = []
+        # 目录序号 -> CardRecord，排序时以目录序号作为次要键，保证并发下输出稳定
+        results = {}
+        results_lock = threading.Lock()
+        progress_lock = threading.Lock()
+        completed = 0
+        media_queued = media_done = 0
+
+        def set_remaining():
+            if self.budget is not None:
+                self.budget.set_remaining(self, total_cards - completed + media_queued - media_done)
+
+        def finish(job):
+            nonlocal completed
+            with progress_lock:
+                completed += 1
+                done = completed
+                set_remaining()
+            card = job.get("card")
+            title = card["title"] if card else job["entry"].get("data", {}).get("title", "")
+            depths = self._format_depths(pipeline.depths())
+            rate = self.metrics.format_progress(done, total_cards)
+            self.update_callback(
+                done, total_cards, f"已处理: {title} | {rate} | 队列 {depths}", (done / total_cards) * 100
+            )
+
+        def finish_media(job):
+            nonlocal media_done
+            with progress_lock:
+                media_done += 1
+                done, queued = media_done, media_queued
+                set_remaining()
+            if self.media_callback is not None:
+                title = job["card"]["title"] if job.get("card") else ""
+                depths = self._format_depths(media_pipeline.depths())
+                self.media_callback(done, queued, f"媒体已处理: {title} | 队列 {depths}", (done / queued) * 100)
+
+        def record(card, idx):
+            # 完整卡片写入日志后，内存中只保留紧凑记录
+            offset, length = journal.record_card(card)
+            rec = CardRecord(card["created_int"], idx, journal.path, offset, length)
+            with results_lock:
+                results[idx] = rec
+            return rec
+
+        def sink(job):
+            nonlocal media_queued
+            card = job["card"]
+            rec = record(card, job["index"])
+            if card["media_pending"]:
+                # 媒体任务只带紧凑记录，到媒体阶段再从日志读回完整卡片，积压再多也不占内存
+                with progress_lock:
+                    media_queued += 1
+                media_job = {"index": job["index"], "record": rec}
+                if not media_pipeline.put(media_job):
+                    finish_media(media_job)
+            finish(job)
+
+        def media_sink(job):
+            card = job["card"]
+            record(card, job["index"])
+            if archive is not None:
+                self._archive_card(archive, archive_prefix, base_dir, card)
+            finish_media(job)
+
+        # 正文阶段: 详情 → 渲染 (媒体链接暂为远程地址)，优先进行，尽早写出 Markdown 和索引
+        # 媒体阶段: 封面/音频 → 网页快照 → 重新渲染，正文阶段进行期间只占少量名额
+        workers = self.stage_workers
+        gate = PriorityGate(MEDIA_WORKERS_DURING_TEXT)
+        media_pipeline = Pipeline([
+            Stage("assets", self._bound(self._gated(gate, lambda job: self._download_media(self._load_card(job), base_dir))), workers["assets"], None),
+            Stage("snapshot", self._bound(self._gated(gate, lambda job: self._snapshot_card(job, web_dir, pg_id))), workers["snapshot"], STAGE_QUEUE_SIZE),
+            Stage("patch", self._bound(self._patch_card), workers["render"], STAGE_QUEUE_SIZE),
+        ], media_sink, on_discard=finish_media, stop_event=self.stop_event)
+        pipeline = Pipeline([
+            Stage("detail", self._bound(lambda job: self._fetch_detail(job, pg_id)), workers["detail"], STAGE_QUEUE_SIZE),
+            Stage("render", self._bound(self._render_card), workers["render"], STAGE_QUEUE_SIZE),
+        ], sink, on_discard=finish, stop_event=self.stop_event)
+
+        md_path = os.path.join(base_dir, f"{safe_pg_name}.md")
+
+        def write_outputs(final):
+            # 合并新取得的卡片与沿用的旧卡片 (更新失败时保留旧版本)
+            with results_lock:
+                current = dict(results)
+            sorter = RecordSorter()
+            for idx, card_entry in enumerate(cards_list):
+                rec = current.get(idx)
+                if rec is None:
+                    old = kept.get(str(card_entry.get("id")))
+                    if old:
+                        rec = CardRecord(old["created_int"], idx, old["_src"], old["offset"], old["length"])
+                if rec is not None:
+                    sorter.add(rec)
+            current = None
+
+            # 按创建日期排序后逐张流式写出 Markdown 和索引 HTML；
+            # 清单 (供下次增量导出使用) 和检索库只在媒体阶段结束后写出
+            writers = [
+                MarkdownWriter(md_path, pg_name),
+                IndexHtmlWriter(base_dir, pg_name, sorter.count),
+            ]
+            if final:
+                # 归档模式下暂存目录会被删除，检索库中记录归档文件的位置
+                export_dir = archive.path if archive else base_dir
+                writers += [
+                    ManifestWriter(base_dir, package),
+                    SearchDbWriter(os.path.join(base_dir, SEARCH_DB_FILE), package, export_dir),
+                ]
+                if self.global_search_db:
+                    writers.append(SearchDbWriter(self.global_search_db, package, export_dir))
+            try:
+                with metrics.timed("render.write"):
+                    return render_export(sorter, writers)
+            finally:
+                sorter.close()
+
+        media_pipeline.start()
+        # 上次媒体未下载完的卡片直接从记录进入媒体阶段，无需重新获取详情
+        for idx, old in to_media:
+            with progress_lock:
+                media_queued += 1
+                set_remaining()
+            media_job = {"index": idx, "record": CardRecord(old["created_int"], idx, old["_src"], old["offset"], old["length"])}
+            if not media_pipeline.put(media_job):
+                finish_media(media_job)
+        pipeline.start()
+        for idx, card_entry in to_fetch:
+            if not pipeline.put({"index": idx, "entry": card_entry}):
+                break
+        pipeline.close()
+
+        # 正文阶段结束：媒体阶段不再限流；先写出正文，之后定期用已下载的资源回填
+        gate.open()
+        if media_queued > media_done and not self.stop_event.is_set() and archive is None:
+            self.update_callback(total_cards, total_cards, f"正文已导出，正在下载 {media_queued - media_done} 张卡片的媒体资源", 100)
+            write_outputs(final=False)
+        media_finished = threading.Event()
+        closer = threading.Thread(target=lambda: (media_pipeline.close(), media_finished.set()), daemon=True)
+        closer.start()
+        while not media_finished.wait(MEDIA_PATCH_INTERVAL):
+            if archive is None and not self.stop_event.is_set():
+                write_outputs(final=False)
+        closer.join()
+
+        if self._resource_pool is not None:
+            self._resource_pool.shutdown()
+            self._resource_pool = None
+        self.asset_store.save()
+
+        exported_count = write_outputs(final=True)
+        results = kept = None
+
+        # 正常结束后删除日志；被中止或有卡片失败时保留，供下次续传
+        if self.stop_event.is_set() or self.failed_cards:
+            journal.close()
+        else:
+            journal.discard()
+        if archive is not None:
+            # 补上 Markdown、索引、清单等最后生成的文件；中止时放弃归档
+            try:
+                if self.stop_event.is_set():
+                    archive.abort()
+                else:
+                    archive.add_tree(base_dir, archive_prefix, skip={JOURNAL_FILE})
+                    archive.close()
+            except Exception:
+                archive.abort()
+                raise
+            finally:
+                remove_staging(base_dir)
+            base_dir = archive.path
+
+        self._write_report(package, base_dir, archive is not None, total_cards, exported_count)
+        if self.failed_cards and not self.stop_event.is_set():
+            logging.error(f"导出 {pg_name} 时有 {len(self.failed_cards)} 张卡片获取失败，可稍后续传补齐")
+            raise IncompleteExportError(base_dir, exported_count, list(self.failed_cards))
         
-        for idx, card_entry in enumerate(cards_list):
+        return base_dir, exported_count
+
+    def _archive_card(self, archive, prefix, base_dir, card):
+        rel_paths = [card.get(key) for key in ("local_cover", "local_sound", "local_web")]
+        rel_paths += [f"web/{rel}" for rel in card.get("_web_assets", ())]
+        for rel in rel_paths:
+            path = os.path.join(base_dir, rel) if rel else None
+            if path and os.path.exists(path):
+                archive.add_file(path, os.path.join(prefix, rel))
+
+    def _write_report(self, package, base_dir, is_archive, total_cards, exported_count):
+        report = self.metrics.report(
+            pg_id=package.get("pg_id"),
+            pg_name=package.get("pg_name"),
+            output=base_dir,
+            stopped=self.stop_event.is_set(),
+            cards={"to_fetch": total_cards, "exported": exported_count, "failed": len(self.failed_cards)},
+        )
+        if self.registry is not None:
+            # 沿用其他卡包的详情与快照而省去的请求数和字节数
+            report["dedup"] = self.registry.saved(package.get("pg_id"))
+        # 归档输出时报告写在归档文件旁
+        path = f"{base_dir}.report.json" if is_archive else os.path.join(base_dir, METRICS_REPORT_FILE)
+        write_json_report(path, report)
+        if self.metrics_textfile_dir:
+            write_prometheus_textfile(self.metrics_textfile_dir, report)
+
+    def _bound(self, func):
+        """在工作线程中执行时把指标记录到本次导出，网络请求占用本次导出的请求预算。"""
+        def run(arg):
+            with metrics.bind(self.metrics), bind_request_slot(self._budget_slot):
+                return func(arg)
+        return run
+
+    def _gated(self, gate, func):
+        """低优先级阶段函数：执行期间占用闸门 (PriorityGate) 的一个名额。"""
+        def run(job):
+            with gate.slot():
+                return func(job)
+        return run
+
+    @property
+    def _budget_slot(self):
+        """每次 HTTP 请求占用共享请求预算中的一个名额 (见 throttle.request_slot)；
+        解析快照、等待其他卡包的结果等不占用名额。未设置预算时为 None。"""
+        if self.budget is None:
+            return None
+        return lambda: self.budget.slot(self)
+
+    def _plan_incremental(self, cards_list, previous, base_dir, pg_id):
+        """对比目录与上次的卡片记录，返回 (需要重新获取的 [(序号, 目录项)], 上次的 {id: 卡片},
+        只需补下载媒体的 [(序号, 卡片)])。
+
+        上次导出过的卡片都会作为后备保留：重新获取失败或导出被中止时沿用旧版本，获取成功则覆盖。
+        目录未变且文件齐全、只是媒体尚未下载或上次下载失败的卡片不重新获取，直接从上次的记录进入媒体阶段。
+        """
+        listed_ids = {str(entry.get("id")) for entry in cards_list}
+
+        # 已删除的卡片：移除其本地文件
+        for card_id, card in previous.items():
+            if card_id not in listed_ids:
+                self._remove_card_files(base_dir, card)
+
+        to_fetch = []
+        kept = {}
+        unchanged = []
+        for idx, entry in enumerate(cards_list):
+            card_id = str(entry.get("id"))
+            old = previous.get(card_id)
+            data = entry.get("data", {})
+            if old is not None:
+                kept[card_id] = old
+            if (
+                old is None
+                or old.get("created_int") != data.get("created_int", old.get("created_int"))
+                or old.get("title") != data.get("title", old.get("title"))
+                or not self._card_files_present(base_dir, old)
+            ):
+                to_fetch.append((idx, entry))
+            else:
+                unchanged.append((idx, entry))
+
+        # 目录不提供 updated_int：抽查最近创建的若干张，编辑过的重新导出
+        unchanged.sort(key=lambda item: item[1].get("data", {}).get("created_int", 0), reverse=True)
+        for idx, entry in unchanged[:INCREMENTAL_VERIFY_COUNT]:
             if self.stop_event.is_set():
                 break
-                
-            card_id = card_entry.get("id")
-            # 优先使用目录列表中的标题，稍后用详情更新
-            title = card_entry.get("data", {}).get("title", f"卡片 {card_id}")
-            
-            self.update_callback(idx + 1, total_cards, f"正在处理: {title}", (idx / total_cards) * 100)
-            
-            detail = self.client.get_card_detail(card_id, pg_id)
-            if not detail:
-                logging.warning(f"由于缺少详情，跳过卡片 {card_id}。")
+            try:
+                detail = self.client.get_card_detail(entry.get("id"), pg_id, use_cache=False)
+            except (ApiError, TransportError) as e:
+                logging.warning(f"抽查卡片 {entry.get('id')} 失败，沿用上次的结果: {e}")
                 continue
-                
-            # 提取数据 (适配不同卡片类型)
-            card_data_obj = detail.get("data", {})
-            card_share_obj = detail.get("share", {})
-            
-            card_title = detail.get("title") or card_data_obj.get("title") or title
-            created_date = detail.get("created_date") or card_data_obj.get("created_date") or ""
-            created_int = detail.get("created_int") or card_data_obj.get("created_int") or 0
-            description = detail.get("description") or card_data_obj.get("content") or card_data_obj.get("short_des") or ""
-            cover_url = detail.get("cover_url") or card_data_obj.get("cover_url") or ""
-            web_url = detail.get("url") or card_share_obj.get("share_url") or ""
-            sound_url = card_data_obj.get("sound_url") or ""
-
-            card_data = {
-                "title": card_title,
-                "created_date": created_date,
-                "created_int": created_int,
-                "description": description,
-                "cover_url": cover_url,
-                "url": web_url,
-                "sound_url": sound_url,
-                "id": card_id
-            }
-            
-            # 下载封面
-            if card_data["cover_url"]:
-                ext = os.path.splitext(urlparse(card_data["cover_url"]).path)[1] or ".jpg"
-                cover_filename = f"cover_{card_id}{ext}"
-                cover_path = os.path.join(images_dir, cover_filename)
-                download_file(card_data["cover_url"], cover_path)
-                card_data["local_cover"] = f"images/{cover_filename}"
-            else:
-                card_data["local_cover"] = None
-
-            # 下载音频
-            if card_data["sound_url"]:
-                ext = os.path.splitext(urlparse(card_data["sound_url"]).path)[1] or ".m4a"
-                sound_filename = f"audio_{card_id}{ext}"
-                sound_path = os.path.join(media_dir, sound_filename)
-                download_file(card_data["sound_url"], sound_path)
-                card_data["local_sound"] = f"media/{sound_filename}"
-            else:
-                card_data["local_sound"] = None
+            updated_int = detail.get("updated_int") or detail.get("data", {}).get("updated_int") or 0
+            if updated_int != kept[str(entry.get("id"))].get("updated_int", 0):
+                to_fetch.append((idx, entry))
 
-            # 处理网页快照
-            if card_data["url"]:
-                self._process_web_snapshot(card_data["url"], web_dir, card_id)
-                card_data["local_web"] = f"web/{card_id}.html"
-            else:
-                card_data["local_web"] = None
+        to_fetch.sort(key=lambda item: item[0])
+        refetched = {idx for idx, _ in to_fetch}
+        to_media = [
+            (idx, kept[str(entry.get("id"))]) for idx, entry in unchanged
+            if idx not in refetched and self._media_incomplete(kept[str(entry.get("id"))])
+        ]
+        to_media.sort(key=lambda item: item[0])
+        return to_fetch, kept, to_media
 
-            exported_cards.append(card_data)
-            
-        # 按创建日期排序 (格式为 YYYY.MM.DD)
-        exported_cards.sort(key=lambda x: x["created_int"], reverse=True)
-        
-        # 生成 Markdown
-        md_path = os.path.join(base_dir, f"{safe_pg_name}.md")
-        self._generate_markdown(exported_cards, md_path, pg_name)
-        
-        # 生成索引 HTML
-        self._generate_index_html(exported_cards, base_dir, pg_name)
-        
-        return base_dir, len(exported_cards)
+    @staticmethod
+    def _media_incomplete(card):
+        """媒体尚未下载，或有远程地址却没有本地文件 (上次下载失败)。"""
+        if card.get("media_pending"):
+            return True
+        return any(card.get(url_key) and not card.get(local_key) for url_key, local_key in (
+            ("cover_url", "local_cover"), ("sound_url", "local_sound"), ("url", "local_web"),
+        ))
+
+    def _card_files_present(self, base_dir, card):
+        for key in ("local_cover", "local_sound", "local_web"):
+            rel = card.get(key)
+            if rel and not os.path.exists(os.path.join(base_dir, rel)):
+                return False
+        return True
+
+    def _remove_card_files(self, base_dir, card):
+        for key in ("local_cover", "local_sound", "local_web"):
+            rel = card.get(key)
+            if not rel:
+                continue
+            try:
+                os.remove(os.path.join(base_dir, rel))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.error(f"删除已移除卡片的文件失败 {rel}: {e}")
+
+    @property
+    def resource_pool(self):
+        with self._resource_pool_lock:
+            if self._resource_pool is None:
+                self._resource_pool = ThreadPoolExecutor(
+                    max_workers=SNAPSHOT_RESOURCE_WORKERS, thread_name_prefix="snapshot-res"
+                )
+            return self._resource_pool
+
+    @property
+    def asset_store(self):
+        if self._asset_store is None:
+            self._asset_store = AssetStore.default()
+        return self._asset_store
+
+    def _format_depths(self, depths):
+        return " · ".join(f"{STAGE_LABELS.get(name, name)} {n}" for name, n in depths.items())
+
+    def _record_failure(self, card_id, title, reason):
+        logging.error(f"获取卡片 {card_id} ({title}) 失败: {reason}")
+        with self._failed_lock:
+            self.failed_cards.append((card_id, title, reason))
+
+    def _fetch_detail(self, job, pg_id):
+        card_entry = job["entry"]
+        card_id = card_entry.get("id")
+        # 优先使用目录列表中的标题，稍后用详情更新
+        title = card_entry.get("data", {}).get("title", f"卡片 {card_id}")
+
+        def fetch():
+            return self.client.get_card_detail(card_id, pg_id, created_int=card_entry.get("data", {}).get("created_int"))
+
+        try:
+            detail = self.registry.detail(card_id, pg_id, fetch) if self.registry is not None else fetch()
+        except (ApiError, TransportError) as e:
+            self._record_failure(card_id, title, str(e))
+            return None
+        if not detail:
+            self._record_failure(card_id, title, "详情为空")
+            return None
+
+        # 提取数据 (适配不同卡片类型)
+        card_data_obj = detail.get("data", {})
+        card_share_obj = detail.get("share", {})
+
+        card_title = detail.get("title") or card_data_obj.get("title") or title
+        created_date = detail.get("created_date") or card_data_obj.get("created_date") or ""
+        created_int = detail.get("created_int") or card_data_obj.get("created_int") or 0
+        description = detail.get("description") or card_data_obj.get("content") or card_data_obj.get("short_des") or ""
+        cover_url = detail.get("cover_url") or card_data_obj.get("cover_url") or ""
+        web_url = detail.get("url") or card_share_obj.get("share_url") or ""
+        sound_url = card_data_obj.get("sound_url") or ""
+
+        job["card"] = {
+            "title": card_title,
+            "created_date": created_date,
+            "created_int": created_int,
+            "description": description,
+            "cover_url": cover_url,
+            "url": web_url,
+            "sound_url": sound_url,
+            "updated_int": detail.get("updated_int") or card_data_obj.get("updated_int") or 0,
+            "card_cat": detail.get("card_cat") or card_entry.get("card_cat"),
+            "id": card_id,
+            # 卡片所属的全部卡包，用于多卡包导出时共享快照
+            "pg_ids": sorted(card_pg_ids(detail) | {str(pg_id)}),
+            # 媒体链接在媒体阶段完成后回填
+            "local_cover": None,
+            "local_sound": None,
+            "local_web": None,
+            "media_pending": bool(cover_url or sound_url or web_url),
+        }
+        return job
+
+    def _load_card(self, job):
+        # 媒体任务只带日志中的位置，从日志读回正文阶段写入的完整卡片
+        reader = CardReader()
+        try:
+            job["card"] = reader.read(job["record"])
+        finally:
+            reader.close()
+        return job
+
+    def _download_media(self, job, base_dir):
+        card_data = job["card"]
+        card_id = card_data["id"]
+
+        # 下载封面 (经资源库去重，导出目录中为硬链接)
+        card_data["local_cover"] = None
+        if card_data["cover_url"]:
+            ext = os.path.splitext(urlparse(card_data["cover_url"]).path)[1] or ".jpg"
+            rel_path = f"images/cover_{card_id}{ext}"
+            if self._link_asset(card_id, card_data["cover_url"], base_dir, rel_path, ".jpg"):
+                card_data["local_cover"] = rel_path
+
+        # 下载音频
+        card_data["local_sound"] = None
+        if card_data["sound_url"]:
+            ext = os.path.splitext(urlparse(card_data["sound_url"]).path)[1] or ".m4a"
+            rel_path = f"media/audio_{card_id}{ext}"
+            if self._link_asset(card_id, card_data["sound_url"], base_dir, rel_path, ".m4a", MEDIA_CHUNK_SIZE):
+                card_data["local_sound"] = rel_path
+
+        return job
+
+    def _link_asset(self, card_id, url, base_dir, rel_path, default_ext, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        dest_path = os.path.join(base_dir, rel_path)
+        # 续传时，日志中已完成且文件仍在的资源直接跳过
+        if self._journaled_assets.get((str(card_id), url)) == rel_path and os.path.exists(dest_path):
+            return True
+        if not self.asset_store.link(url, dest_path, default_ext, chunk_size):
+            return False
+        if self._journal:
+            self._journal.record_asset(card_id, url, rel_path)
+        return True
+
+    def _snapshot_card(self, job, web_dir, pg_id):
+        card_data = job["card"]
+
+        # 处理网页快照 (其他卡包已生成过的直接硬链接)
+        if card_data["url"]:
+            def produce():
+                return self._process_web_snapshot(card_data["url"], web_dir, card_data["id"])
+
+            with metrics.timed("snapshot"):
+                if self.registry is not None:
+                    card_data["_web_assets"] = self.registry.snapshot(
+                        card_data["id"], pg_id, card_data.get("pg_ids"), web_dir, produce)
+                else:
+                    card_data["_web_assets"] = produce()
+            card_data["local_web"] = f"web/{card_data['id']}.html"
+        else:
+            card_data["local_web"] = None
+
+        return job
+
+    def _patch_card(self, job):
+        # 媒体已处理完 (下载失败的不再显示链接)，按本地路径重新渲染
+        job["card"]["media_pending"] = False
+        return self._render_card(job)
+
+    def _render_card(self, job):
+        # 预先渲染单张卡片的 Markdown/HTML 片段，最终只需按顺序拼接
+        card_data = job["card"]
+        with metrics.timed("render"):
+            card_data["_md"] = render_markdown_card(card_data)
+            card_data["_html"] = render_html_card(card_data)
+        return job
 
     def _process_web_snapshot(self, url, web_dir, card_id):
         try:
-            resp = requests.get(url, timeout=15)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.content, 'html.parser')
-            
-            # 该页面的资源目录
-            res_subdir_name = f"{card_id}_files"
-            res_dir = os.path.join(web_dir, res_subdir_name)
+            with metrics.timed("snapshot.page") as t:
+                with request_slot():
+                    resp = get_session().get(url, timeout=15)
+                resp.raise_for_status()
+                t.bytes = len(resp.content)
+            # 解析与重写在子进程中进行，只传回模板和资源列表
+            with metrics.timed("snapshot.parse"):
+                template, refs = parse_snapshot_async(resp.content, resp.url)
+
+            # 快照资源统一放在 web/assets/，按内容哈希命名，各页面共享且不会重名覆盖
+            res_dir = os.path.join(web_dir, SNAPSHOT_ASSETS_DIR)
             os.makedirs(res_dir, exist_ok=True)
-            
-            # 重写图片链接
-            for img in soup.find_all('img'):
-                src = img.get('src')
-                if src:
-                    if src.startswith('//'): src = 'https:' + src
-                    if src.startswith('http'):
-                        filename = safe_filename(os.path.basename(urlparse(src).path)) or "image.jpg"
-                        # 避免文件名过长
-                        if len(filename) > 50: filename = filename[-50:]
-                        local_path = os.path.join(res_dir, filename)
-                        download_file(src, local_path)
-                        img['src'] = f"{res_subdir_name}/{filename}"
-            
-            # 重写 CSS 链接
-            for link in soup.find_all('link', rel='stylesheet'):
-                href = link.get('href')
-                if href:
-                    if href.startswith('//'): href = 'https:' + href
-                    if href.startswith('http'):
-                        filename = safe_filename(os.path.basename(urlparse(href).path)) or "style.css"
-                        local_path = os.path.join(res_dir, filename)
-                        download_file(href, local_path)
-                        link['href'] = f"{res_subdir_name}/{filename}"
-                        
-            # 重写 JS 链接
-            for script in soup.find_all('script'):
-                src = script.get('src')
-                if src:
-                    if src.startswith('//'): src = 'https:' + src
-                    if src.startswith('http'):
-                        filename = safe_filename(os.path.basename(urlparse(src).path)) or "script.js"
-                        local_path = os.path.join(res_dir, filename)
-                        download_file(src, local_path)
-                        script['src'] = f"{res_subdir_name}/{filename}"
-
-            with open(os.path.join(web_dir, f"{card_id}.html"), 'w', encoding='utf-8') as f:
-                f.write(str(soup))
+
+            # 按绝对 URL 去重后并发下载，全部完成后再统一填入本地路径
+            exts = {}
+            for _, abs_url, default_ext, _ in refs:
+                exts.setdefault(abs_url, default_ext)
+            urls = list(exts)
+            locals_ = self.resource_pool.map(
+                self._bound(lambda u: self._link_snapshot_resource(u, res_dir, exts[u])), urls
+            )
+            local_paths = {
+                abs_url: f"{SNAPSHOT_ASSETS_DIR}/{local}" for abs_url, local in zip(urls, locals_) if local
+            }
+
+            # 先写临时文件再替换，中断时不会留下半个页面
+            html_path = os.path.join(web_dir, f"{card_id}.html")
+            with open(html_path + ".part", 'wb') as f:
+                f.write(fill_snapshot(template, refs, local_paths))
+            os.replace(html_path + ".part", html_path)
+            # 返回页面引用的资源 (相对 web/ 的路径)
+            return sorted(set(local_paths.values()))
                 
         except Exception as e:
             logging.error(f"快照失败 {url}: {e}")
+            return []
 
-    def _generate_markdown(self, cards, path, pg_name):
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(f"# {pg_name}\n\n")
-            for card in cards:
-                f.write(f"## {card['title']}\n\n")
-                f.write(f"**日期:** {card['created_date']}\n\n")
-                if card['local_cover']:
-                    f.write(f"![封面]({card['local_cover']})\n\n")
-                
-                if card['local_sound']:
-                    f.write(f"<audio controls src=\"{card['local_sound']}\"></audio>\n\n")
-                    
-                f.write(f"{card['description']}\n\n")
-                
-                if card['local_web']:
-                    f.write(f"[查看快照]({card['local_web']})\n\n")
-                f.write("---\n\n")
-
-    def _generate_index_html(self, cards, base_dir, pg_name):
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <meta charset="utf-8"/>
-        <head><title>{pg_name} 索引</title>
-        <style>
-            body {{ font-family: sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }}
-            .card {{ border: 1px solid #ddd; padding: 15px; margin-bottom: 15px; border-radius: 5px; }}
-            .card img {{ max-width: 200px; display: block; margin-bottom: 10px; }}
-            .meta {{ color: #666; font-size: 0.9em; }}
-            audio {{ display: block; margin-bottom: 10px; width: 100%; }}
-        </style>
-        </head>
-        <body>
-        <h1>{pg_name}</h1>
-        """
-        for card in cards:
-            html += f'<div class="card">'
-            html += f'<h3>{card["title"]}</h3>'
-            html += f'<div class="meta">{card["created_date"]}</div>'
-            if card['local_cover']:
-                html += f'<img src="{card["local_cover"]}">'
-            if card['local_sound']:
-                html += f'<audio controls src="{card["local_sound"]}"></audio>'
-            html += f'<p>{card["description"].replace(chr(10), "<br>")}</p>'
-            if card['local_web']:
-                html += f'<a href="{card["local_web"]}" target="_blank">查看快照</a>'
-            html += '</div>'
-            
-        html += "</body></html>"
-        
-        with open(os.path.join(base_dir, "index.html"), 'w', encoding='utf-8') as f:
-            f.write(html)
+    def _link_snapshot_resource(self, url, res_dir, default_ext):
+        store_path = self.asset_store.fetch(url, default_ext)
+        if not store_path:
+            return None
+        digest = self.asset_store.digest(url)
+        filename = digest[:16] + os.path.splitext(store_path)[1]
+        if not self.asset_store.link(url, os.path.join(res_dir, filename), default_ext):
+            return None
+        return filename
@@ -2,19 +2,60 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
 import os
-import json
 import logging
-from .api_client import LLSpaceClient
-from .exporter import Exporter
+from .api_client import LLSpaceClient, ApiError, TransportError
+from .card_cache import CardCache
+from .config import LOG_FILE, GUI_PROGRESS_INTERVAL_MS, GUI_FILTER_DELAY_MS
+from .metrics import format_eta
+from .progress import ExportProgress
+from .archive import ARCHIVE_FORMATS
+from .session_cache import restore_client, save_session, clear_session
+
+# 输出格式下拉框中表示“输出为文件夹”的选项
+FOLDER_FORMAT = "文件夹"
+
+# 卡包列表的列: 列名 -> (标题, 宽度, 对齐)；勾选框在树列 (#0) 中，由行的标签决定
+PACKAGE_COLUMNS = {
+    "name": ("卡包", 200, tk.W),
+    "cards": ("卡片数", 60, tk.E),
+    "members": ("成员数", 60, tk.E),
+}
+# 可排序的数量列对应的卡包字段
+PACKAGE_SORT_FIELDS = {"cards": "c_num", "members": "member_count"}
+# 行标签：勾选状态以标签的图片显示，批量勾选只需两次 tag 调用
+CHECKED = "checked"
+UNCHECKED = "unchecked"
+
+
+def _checkbox_image(checked, size=13):
+    """绘制勾选框图片 (灰色边框、白底，勾选时带对勾)。"""
+    img = tk.PhotoImage(width=size, height=size)
+    img.put("#808080", to=(0, 0, size, size))
+    img.put("#ffffff", to=(1, 1, size - 1, size - 1))
+    if checked:
+        for x, y in ((3, 6), (4, 7), (5, 8), (6, 7), (7, 6), (8, 5), (9, 4)):
+            img.put("#202020", to=(x, y, x + 1, y + 2))
+    return img
 
 class App:
     def __init__(self, root):
         self.root = root
         self.root.title("llspace 导出工具")
         
-        self.client = LLSpaceClient()
+        self.client = LLSpaceClient(cache=self._open_card_cache())
         self.packages = []
-        self.package_vars = {}
+        # 勾选的卡包 id；列表只保存在 Treeview 中，不为每个卡包创建 Tk 变量
+        self.selected_ids = set()
+        # 当前筛选条件下显示的卡包 (已排序)
+        self.visible_packages = []
+        # 已插入 Treeview 的全部行 (含被筛选掉而移出的行)
+        self._tree_iids = []
+        self._filter_text = ""
+        self._filter_job = None
+        self.sort_key = None
+        self.sort_reverse = False
+        # 登录/退出时递增，用于丢弃过期的后台请求结果
+        self._session_gen = 0
         
         self.setup_ui()
         self.check_auto_login()
@@ -34,7 +75,8 @@ class App:
         self.password_var = tk.StringVar()
         ttk.Entry(self.login_frame, textvariable=self.password_var, show="*").pack(pady=5)
         
-        ttk.Button(self.login_frame, text="登录", command=self.do_login).pack(pady=20)
+        self.login_button = ttk.Button(self.login_frame, text="登录", command=self.do_login)
+        self.login_button.pack(pady=20)
         
         self.login_frame.pack(fill=tk.BOTH, expand=True)
         
@@ -49,18 +91,43 @@ class App:
         self.user_info_label.pack(side=tk.LEFT)
         
         ttk.Button(top_frame, text="退出登录", command=self.do_logout).pack(side=tk.RIGHT)
+        ttk.Button(top_frame, text="刷新列表", command=self.refresh_packages).pack(side=tk.RIGHT, padx=5)
         
         ttk.Label(self.main_frame, text="选择要导出的卡包:").pack(anchor=tk.W)
+        # 卡包列表的刷新状态 (后台刷新中 / 使用缓存的列表)
+        self.list_status_label = ttk.Label(self.main_frame, text="")
+        self.list_status_label.pack(anchor=tk.W)
         
-        # 全选复选框
+        # 筛选框与全选复选框 (全选作用于当前筛选出的卡包)
         self.select_all_var = tk.BooleanVar()
         select_all_frame = ttk.Frame(self.main_frame)
         select_all_frame.pack(fill=tk.X, pady=5)
         ttk.Checkbutton(select_all_frame, text="全选", variable=self.select_all_var, command=self.toggle_select_all).pack(side=tk.LEFT)
-        
-        # 卡包列表容器
-        self.list_container = ttk.Frame(self.main_frame)
-        self.list_container.pack(fill=tk.BOTH, expand=True, pady=5)
+        ttk.Label(select_all_frame, text="筛选:").pack(side=tk.LEFT, padx=(10, 0))
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.schedule_filter())
+        ttk.Entry(select_all_frame, textvariable=self.filter_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        # 卡包列表：Treeview 只绘制可见的行，数千个卡包也不会创建大量控件
+        list_container = ttk.Frame(self.main_frame)
+        list_container.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.package_tree = ttk.Treeview(list_container, columns=tuple(PACKAGE_COLUMNS), show="tree headings", selectmode="extended")
+        self.package_tree.column("#0", width=30, stretch=False, anchor=tk.CENTER)
+        self._checkbox_images = {CHECKED: _checkbox_image(True), UNCHECKED: _checkbox_image(False)}
+        for tag, image in self._checkbox_images.items():
+            self.package_tree.tag_configure(tag, image=image)
+        for column, (title, width, anchor) in PACKAGE_COLUMNS.items():
+            self.package_tree.heading(column, text=title, command=lambda c=column: self.sort_packages(c))
+            self.package_tree.column(column, width=width, anchor=anchor, stretch=column == "name")
+        scrollbar = ttk.Scrollbar(list_container, orient="vertical", command=self.package_tree.yview)
+        self.package_tree.configure(yscrollcommand=scrollbar.set)
+        self.package_tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        # 单击勾选框或按空格切换勾选
+        self.package_tree.bind("<Button-1>", self.on_tree_click)
+        self.package_tree.bind("<space>", lambda e: self.toggle_packages(self.package_tree.selection()))
+        self.selection_label = ttk.Label(self.main_frame, text="")
+        self.selection_label.pack(anchor=tk.W)
         
         # 导出路径选择
         path_frame = ttk.Frame(self.main_frame)
@@ -70,6 +137,20 @@ class App:
         ttk.Entry(path_frame, textvariable=self.path_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         ttk.Button(path_frame, text="选择...", command=self.select_path).pack(side=tk.LEFT)
 
+        # 增量导出选项
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.main_frame, text="增量导出 (更新上次的导出目录，只下载变化的卡片)", variable=self.incremental_var).pack(anchor=tk.W)
+        self.resume_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.main_frame, text="继续上次中断的导出", variable=self.resume_var).pack(anchor=tk.W)
+
+        # 输出格式：文件夹或单个归档文件
+        format_frame = ttk.Frame(self.main_frame)
+        format_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(format_frame, text="输出格式:").pack(side=tk.LEFT)
+        self.format_var = tk.StringVar(value=FOLDER_FORMAT)
+        ttk.Combobox(format_frame, textvariable=self.format_var, state="readonly", width=10,
+                     values=(FOLDER_FORMAT,) + ARCHIVE_FORMATS).pack(side=tk.LEFT, padx=5)
+
         # 导出按钮
         ttk.Button(self.main_frame, text="导出选中项", command=self.start_export).pack(pady=10)
         
@@ -85,33 +166,52 @@ class App:
         self.pkg_status_label.pack(pady=(0, 10))
 
         # 当前任务 (卡片)
-        ttk.Label(self.progress_frame, text="当前任务 (卡片):").pack(anchor=tk.W)
+        ttk.Label(self.progress_frame, text="进行中的卡包 (正文，卡片合计):").pack(anchor=tk.W)
         self.card_progress_var = tk.DoubleVar()
         self.card_progress_bar = ttk.Progressbar(self.progress_frame, variable=self.card_progress_var, maximum=100)
         self.card_progress_bar.pack(fill=tk.X, pady=5)
         self.card_status_label = ttk.Label(self.progress_frame, text="准备中...")
         self.card_status_label.pack(pady=5)
-        
-    def check_auto_login(self):
-        session_file = "cache/session_data.json"
-        if os.path.exists(session_file):
+
+        # 媒体阶段 (封面、音频、快照) 在正文之后进行
+        ttk.Label(self.progress_frame, text="媒体资源 (封面、音频、快照):").pack(anchor=tk.W)
+        self.media_progress_var = tk.DoubleVar()
+        self.media_progress_bar = ttk.Progressbar(self.progress_frame, variable=self.media_progress_var, maximum=100)
+        self.media_progress_bar.pack(fill=tk.X, pady=5)
+        self.media_status_label = ttk.Label(self.progress_frame, text="")
+        self.media_status_label.pack(pady=5)
+
+        # 各进行中卡包的进度 (每行一个卡包)
+        self.running_label = ttk.Label(self.progress_frame, text="", justify=tk.LEFT, wraplength=580)
+        self.running_label.pack(anchor=tk.W, pady=5)
+        
+    def _open_card_cache(self):
+        try:
+            return CardCache()
+        except Exception as e:
+            logging.error(f"无法打开卡片缓存，将不使用缓存: {e}")
+            return None
+
+    def run_in_background(self, func, callback):
+        """在后台线程执行 func，完成后在界面线程调用 callback(结果, 异常)。"""
+        def worker():
             try:
-                with open(session_file, "r", encoding='utf-8') as f:
-                    data = json.load(f)
-                    user_info = data.get("user", {})
-                    token = user_info.get("authentication_token")
-                    
-                    if token:
-                        self.client.token = token
-                        self.client.user_info = user_info
-                        # 尝试获取卡包以验证 token
-                        packages = self.client.get_packages()
-                        if packages:
-                            self.packages = packages
-                            self.show_main_view(refresh_packages=False)
-                            return
+                result, error = func(), None
             except Exception as e:
-                logging.error(f"Auto login failed: {e}")
+                result, error = None, e
+            self.root.after(0, callback, result, error)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def check_auto_login(self):
+        # 只读取本地缓存：先显示缓存的卡包列表，token 是否有效由后台刷新验证
+        try:
+            session = restore_client(self.client)
+        except Exception as e:
+            logging.error(f"Auto login failed: {e}")
+            return
+        if session:
+            self.packages = session.get("packages", [])
+            self.show_main_view()
                 
     def do_login(self):
         username = self.username_var.get()
@@ -120,34 +220,51 @@ class App:
         if not username or not password:
             messagebox.showerror("错误", "请输入用户名和密码")
             return
-            
-        success, msg = self.client.login(username, password)
-        if success:
-            self.show_main_view()
-        else:
-            messagebox.showerror("登录失败", msg)
+
+        self.login_button.config(state=tk.DISABLED, text="登录中...")
+        self._session_gen += 1
+        gen = self._session_gen
+
+        def done(result, error):
+            self.login_button.config(state=tk.NORMAL, text="登录")
+            if gen != self._session_gen:
+                return
+            success, msg = result if error is None else (False, str(error))
+            if success:
+                self.packages = []
+                # 先保存登录信息 (同命令行 login)，首次获取卡包列表失败时下次启动仍可自动登录
+                save_session(self.client.user_info, self.packages)
+                self.show_main_view()
+            else:
+                messagebox.showerror("登录失败", msg)
+
+        self.run_in_background(lambda: self.client.login(username, password), done)
             
     def do_logout(self):
         if messagebox.askyesno("确认", "确定要退出登录吗？"):
-            # 清除会话文件
-            session_file = "cache/session_data.json"
-            if os.path.exists(session_file):
-                try:
-                    os.remove(session_file)
-                except Exception as e:
-                    logging.error(f"Failed to remove session file: {e}")
-            
-            # 清除客户端状态
-            self.client.token = None
-            self.client.user_info = {}
-            self.packages = []
-            
-            # 切换回登录界面
-            self.main_frame.pack_forget()
-            self.login_frame.pack(fill=tk.BOTH, expand=True)
+            self.reset_session()
             self.username_var.set("")
             self.password_var.set("")
-            self.root.geometry("")
+
+    def reset_session(self):
+        # 清除会话文件
+        try:
+            clear_session()
+        except Exception as e:
+            logging.error(f"Failed to remove session file: {e}")
+        
+        # 清除客户端状态，尚未返回的后台请求结果将被丢弃
+        self._session_gen += 1
+        self.client.token = None
+        self.client.user_info = {}
+        self.packages = []
+        self.selected_ids = set()
+        self.list_status_label.config(text="")
+        
+        # 切换回登录界面
+        self.main_frame.pack_forget()
+        self.login_frame.pack(fill=tk.BOTH, expand=True)
+        self.root.geometry("")
             
     def show_main_view(self, refresh_packages=True):
         self.login_frame.pack_forget()
@@ -157,79 +274,151 @@ class App:
         user_name = self.client.user_info.get("name", "用户")
         self.user_info_label.config(text=f"欢迎, {user_name}")
         
-        if refresh_packages:
-            # 获取卡包
-            self.packages = self.client.get_packages()
-        
-        # 缓存会话数据
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/session_data.json", "w", encoding='utf-8') as f:
-            json.dump({
-                "user": self.client.user_info,
-                "packages": self.packages
-            }, f, ensure_ascii=False, indent=2)
-            
         self.create_package_list()
+        if refresh_packages:
+            self.refresh_packages()
+
+    def refresh_packages(self):
+        """在后台获取卡包列表 (同时验证 token)，返回后只在列表有变化时更新界面。"""
+        self.list_status_label.config(text="正在刷新卡包列表...")
+        gen = self._session_gen
+
+        def done(packages, error):
+            if gen != self._session_gen:
+                return
+            if isinstance(error, ApiError):
+                # pg/list 只需要 token：带 token 请求仍返回非 0 code 说明登录已失效，回到登录界面
+                logging.error(f"获取卡包列表失败，需要重新登录: {error}")
+                self.reset_session()
+                messagebox.showerror("错误", f"登录已失效，请重新登录: {error}")
+                return
+            if error is not None:
+                logging.error(f"获取卡包列表失败: {error}")
+                if self.packages:
+                    # 网络故障等：保留缓存的列表和会话
+                    reason = "无法连接服务器" if isinstance(error, TransportError) else "刷新失败"
+                    self.list_status_label.config(text=f"{reason}，显示的是缓存的卡包列表")
+                else:
+                    self.list_status_label.config(text=f"获取卡包列表失败: {error}")
+                return
+
+            self.list_status_label.config(text="")
+            if packages != self.packages:
+                self.packages = packages
+                self.create_package_list()
+            # 缓存会话数据
+            save_session(self.client.user_info, self.packages)
+
+        self.run_in_background(self.client.get_packages, done)
         
     def create_package_list(self):
-        # 清除旧内容
-        for widget in self.list_container.winfo_children():
-            widget.destroy()
-            
-        # Canvas and Scrollbar
-        canvas = tk.Canvas(self.list_container)
-        scrollbar = ttk.Scrollbar(self.list_container, orient="vertical", command=canvas.yview)
-        self.scrollable_frame = ttk.Frame(canvas)
-        
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        
-        canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        
-        # 绑定鼠标滚轮
-        def _on_mousewheel(event):
-            canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-        canvas.bind_all("<MouseWheel>", _on_mousewheel)
-        
-        self.package_vars = {}
-        
-        # 重置全选复选框
-        self.select_all_var.set(False)
-        
+        # 刷新列表时保留仍存在的卡包的勾选状态
+        self.selected_ids &= {pkg.get("pg_id") for pkg in self.packages}
+        # 每个卡包只插入一次行，筛选和排序只调整显示哪些行及其顺序
+        tree = self.package_tree
+        # 被筛选掉的行已移出 (不是根节点的子项)，需按 id 全部删除
+        tree.delete(*self._tree_iids)
+        self._tree_iids = [str(pkg.get("pg_id")) for pkg in self.packages]
         for pkg in self.packages:
             pg_id = pkg.get("pg_id")
-            pg_name = pkg.get("pg_name", "未命名卡包")
-            
-            item_frame = ttk.Frame(self.scrollable_frame)
-            item_frame.pack(fill="x", pady=5, padx=5)
-            
-            # Checkbox
-            var = tk.BooleanVar()
-            self.package_vars[pg_id] = var
-            chk = ttk.Checkbutton(item_frame, variable=var)
-            chk.pack(side="left")
-            
-            # Name Label
-            ttk.Label(item_frame, text=pg_name, font=("Arial", 12)).pack(side="left", padx=5)
+            tree.insert("", tk.END, iid=str(pg_id), tags=(CHECKED if pg_id in self.selected_ids else UNCHECKED,),
+                        values=(pkg.get("pg_name", "未命名卡包"), pkg.get("c_num", ""), pkg.get("member_count", "")))
+        self.apply_filter(force=True)
+
+    def schedule_filter(self):
+        # 输入停顿后再筛选，连续输入时不会反复筛选
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(GUI_FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self, force=False):
+        self._filter_job = None
+        text = self.filter_var.get().strip().lower()
+        if not force and text == self._filter_text:
+            return
+        # 追加输入时在上次的结果中继续筛选，否则从全部卡包筛选
+        incremental = not force and text.startswith(self._filter_text)
+        source = self.visible_packages if incremental else self.packages
+        self._filter_text = text
+        visible = [pkg for pkg in source if text in str(pkg.get("pg_name", "")).lower()] if text else list(source)
+        # 在已排序的结果中筛选时顺序不变，无需重新排序
+        self.visible_packages = visible if incremental else self._sorted(visible)
+        self.render_package_tree()
+
+    def _sorted(self, packages):
+        if self.sort_key is None:
+            return packages
+        if self.sort_key == "name":
+            key = lambda pkg: str(pkg.get("pg_name", ""))
+        else:
+            field = PACKAGE_SORT_FIELDS[self.sort_key]
+            key = lambda pkg: pkg.get(field) or 0
+        return sorted(packages, key=key, reverse=self.sort_reverse)
+
+    def sort_packages(self, column):
+        # 再次点击同一列时反向排序；数量列默认从多到少
+        if self.sort_key == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_key, self.sort_reverse = column, column != "name"
+        self.visible_packages = self._sorted(self.visible_packages)
+        self.render_package_tree()
+
+    def render_package_tree(self):
+        # 一次调用替换显示的行及其顺序，未显示的行被移出 (detach) 而不是删除
+        self.package_tree.set_children("", *(str(pkg.get("pg_id")) for pkg in self.visible_packages))
+        self.update_selection_label()
+
+    def _mark_checked(self, iids, checked):
+        """批量更新勾选框：每种状态一次 tag 调用，与行数无关。"""
+        tree = self.package_tree
+        add, remove = (CHECKED, UNCHECKED) if checked else (UNCHECKED, CHECKED)
+        tree.tk.call(tree, "tag", "remove", remove, list(iids))
+        tree.tk.call(tree, "tag", "add", add, list(iids))
+
+    def update_selection_label(self):
+        visible_ids = {pkg.get("pg_id") for pkg in self.visible_packages}
+        self.select_all_var.set(bool(visible_ids) and visible_ids <= self.selected_ids)
+        self.selection_label.config(
+            text=f"已选 {len(self.selected_ids)} 个，显示 {len(self.visible_packages)}/{len(self.packages)} 个")
+
+    def on_tree_click(self, event):
+        tree = self.package_tree
+        if tree.identify_region(event.x, event.y) == "tree" and tree.identify_column(event.x) == "#0":
+            row = tree.identify_row(event.y)
+            if row:
+                self.toggle_packages([row])
+                return "break"
+
+    def toggle_packages(self, iids):
+        ids = {str(pkg.get("pg_id")): pkg.get("pg_id") for pkg in self.visible_packages}
+        ids = [ids[iid] for iid in iids if iid in ids]
+        # 其中有未勾选的则全部勾选，否则全部取消
+        check = any(pg_id not in self.selected_ids for pg_id in ids)
+        if check:
+            self.selected_ids.update(ids)
+        else:
+            self.selected_ids.difference_update(ids)
+        self._mark_checked([str(pg_id) for pg_id in ids], check)
+        self.update_selection_label()
 
     def toggle_select_all(self):
         select_all = self.select_all_var.get()
-        for var in self.package_vars.values():
-            var.set(select_all)
-    
+        ids = {pkg.get("pg_id") for pkg in self.visible_packages}
+        if select_all:
+            self.selected_ids |= ids
+        else:
+            self.selected_ids -= ids
+        self._mark_checked([str(pg_id) for pg_id in ids], select_all)
+        self.update_selection_label()
+
     def select_path(self):
         path = filedialog.askdirectory()
         if path:
             self.path_var.set(path)
 
     def start_export(self):
-        selected_packages = [p for p in self.packages if self.package_vars[p['pg_id']].get()]
+        selected_packages = [p for p in self.packages if p.get('pg_id') in self.selected_ids]
         
         if not selected_packages:
             messagebox.showwarning("提示", "请至少选择一个卡包")
@@ -242,48 +431,76 @@ class App:
 
         self.main_frame.pack_forget()
         self.progress_frame.pack(fill=tk.BOTH, expand=True)
-        self.root.geometry("600x200")
-        
-        threading.Thread(target=self.run_export_task, args=(selected_packages, export_path), daemon=True).start()
+        self.root.geometry("600x380")
+        
+        incremental = self.incremental_var.get()
+        resume = self.resume_var.get()
+        archive_format = None if self.format_var.get() == FOLDER_FORMAT else self.format_var.get()
+        # 工作线程只更新 progress，界面按固定间隔轮询，不随卡片完成速度增加刷新次数
+        progress = ExportProgress(selected_packages)
+        threading.Thread(target=self.run_export_task, args=(progress, selected_packages, export_path, incremental, resume, archive_format), daemon=True).start()
+        self.poll_progress(progress)
 
-    def run_export_task(self, packages, export_path):
-        total_pkgs = len(packages)
-        success_count = 0
-        
-        for i, pkg in enumerate(packages):
-            pg_name = pkg.get("pg_name")
-            
-            # Update package progress
-            pkg_percent = (i / total_pkgs) * 100
-            self.root.after(0, lambda p=pkg_percent, n=pg_name, i=i: self.update_pkg_progress(p, f"正在导出 ({i+1}/{total_pkgs}): {n}"))
-            
-            exporter = Exporter(self.client, self.update_progress)
-            try:
-                output_dir, count = exporter.run(pkg, export_path)
-                logging.info(f"Exported {pg_name} to {output_dir}")
-                success_count += 1
-            except Exception as e:
-                logging.error(f"Export failed for {pg_name}: {e}")
-        
-        # Final 100% for package progress
-        self.root.after(0, lambda: self.update_pkg_progress(100, "所有任务完成"))
-        self.root.after(0, lambda: self.export_finished(success_count, total_pkgs))
+    def run_export_task(self, progress, packages, export_path, incremental=False, resume=False, archive_format=None):
+        # 导出相关模块在首次导出时才导入，加快启动
+        from .scheduler import ExportScheduler
+        from .exporter import IncompleteExportError
+        scheduler = ExportScheduler(
+            self.client, packages,
+            on_progress=lambda pkg, current, total, message, percent: progress.update(pkg, current, total, message),
+            on_media_progress=lambda pkg, current, total, message, percent: progress.update_media(pkg, current, total, message),
+            on_package_start=progress.start,
+            on_package_done=lambda pkg, output_dir, count, error: progress.done(pkg, error),
+            archive_format=archive_format,
+        )
+        try:
+            results = scheduler.run(export_path, incremental=incremental, resume=resume)
+        except Exception as e:
+            logging.error(f"导出失败: {e}")
+            results = []
+        success_count = sum(1 for _, output_dir, _, error in results if output_dir and error is None)
+        incomplete = [pkg.get("pg_name") for pkg, _, _, error in results if isinstance(error, IncompleteExportError)]
+        dedup = scheduler.registry.saved() if scheduler.registry is not None else None
+        progress.finish((success_count, len(packages), incomplete, dedup))
 
-    def update_pkg_progress(self, percent, message):
-        self.pkg_progress_var.set(percent)
-        self.pkg_status_label.config(text=message)
+    def poll_progress(self, progress):
+        snap = progress.snapshot()
+        total_pkgs = snap["packages_total"]
+        running = snap["running"]
+        self.pkg_progress_var.set(snap["percent"])
+        if progress.finished:
+            self.pkg_status_label.config(text="所有任务完成")
+        else:
+            self.pkg_status_label.config(
+                text=f"正在导出 (已完成 {snap['packages_finished']}/{total_pkgs}，进行中 {len(running)})")
 
-    def update_progress(self, current, total, message, percent):
-        # Use after to ensure thread safety, but pass values directly to avoid lambda capture issues (though here it's fine)
-        # Update the variable instead of configure(value=...)
-        self.root.after(0, lambda m=message, p=percent: self._update_card_ui(m, p))
+        done, total = snap["cards_done"], snap["cards_total"]
+        self.card_progress_var.set(done / total * 100 if total else 0)
+        status = f"{done}/{total} 张 · {snap['rate']:.1f} 张/秒"
+        if snap["eta"] is not None:
+            status += f" · 剩余 {format_eta(snap['eta'])}"
+        self.card_status_label.config(text=status)
+        media_done, media_total = snap["media_done"], snap["media_total"]
+        self.media_progress_var.set(media_done / media_total * 100 if media_total else 0)
+        self.media_status_label.config(text=f"{media_done}/{media_total} 张" if media_total else "")
+        # 每个进行中的卡包一行: 名称、正文与媒体进度和当前处理的卡片
+        self.running_label.config(text="\n".join(
+            f"[{name}] 正文 {current}/{total} · 媒体 {media_current}/{media_total} {message}"
+            for name, current, total, media_current, media_total, message in running
+        ))
 
-    def _update_card_ui(self, message, percent):
-        self.card_status_label.config(text=message)
-        self.card_progress_var.set(percent)
+        if progress.finished:
+            self.export_finished(*progress.result)
+        else:
+            self.root.after(GUI_PROGRESS_INTERVAL_MS, self.poll_progress, progress)
 
-    def export_finished(self, success_count, total):
-        messagebox.showinfo("完成", f"导出完成！成功: {success_count}/{total}")
+    def export_finished(self, success_count, total, incomplete=(), dedup=None):
+        message = f"导出完成！成功: {success_count}/{total}"
+        if dedup and dedup["requests"]:
+            message += f"\n多个卡包共有的卡片复用了 {dedup['requests']} 次，省去约 {dedup['bytes'] / 1024 ** 2:.1f} MB"
+        if incomplete:
+            message += f"\n\n以下卡包有卡片获取失败 (详见 {LOG_FILE})，勾选“继续上次中断的导出”再次导出可补齐:\n" + "\n".join(incomplete)
+        messagebox.showinfo("完成", message)
         self.progress_frame.pack_forget()
         self.main_frame.pack(fill=tk.BOTH, expand=True)
         self.root.geometry("400x800")
@@ -0,0 +1,60 @@
+import threading
+import logging
+from .config import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE
+
+# 全进程共享的 requests.Session，复用 TCP/TLS 连接 (keep-alive)
+# requests 导入较慢，首次创建会话时才导入，程序启动时不需要
+_lock = threading.Lock()
+_session = None
+_pool_connections = HTTP_POOL_CONNECTIONS
+_pool_maxsize = HTTP_POOL_MAXSIZE
+
+
+def _mount_adapters(session):
+    from requests.adapters import HTTPAdapter
+    # pool_block=True: 连接数达到上限时等待空闲连接，而不是临时新建再丢弃
+    adapter = HTTPAdapter(
+        pool_connections=_pool_connections,
+        pool_maxsize=_pool_maxsize,
+        pool_block=True,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def get_session() -> "requests.Session":
+    """返回共享的 HTTP 会话，首次调用时创建。"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import requests
+                session = requests.Session()
+                _mount_adapters(session)
+                _session = session
+    return _session
+
+
+def configure_pool(pool_maxsize: int = None, pool_connections: int = None):
+    """调整每个主机的连接池大小。只会扩大，避免影响其他正在运行的导出任务。"""
+    global _pool_maxsize, _pool_connections
+    with _lock:
+        changed = False
+        if pool_maxsize and pool_maxsize > _pool_maxsize:
+            _pool_maxsize = pool_maxsize
+            changed = True
+        if pool_connections and pool_connections > _pool_connections:
+            _pool_connections = pool_connections
+            changed = True
+        if changed and _session is not None:
+            logging.info(f"扩大 HTTP 连接池: 每主机 {_pool_maxsize} 个连接, {_pool_connections} 个主机池")
+            _mount_adapters(_session)
+
+
+def close_session():
+    """关闭共享会话及其所有连接。"""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import logging
+import threading
+from .config import JOURNAL_FILE
+from .manifest import summarize_card
+
+
+class ExportJournal:
+    """导出进度日志 (JSON Lines)。
+
+    每完成一张卡片或一个资源就追加一行并立即刷新，进程中途退出时
+    已完成的工作不会丢失。导出正常结束后删除。
+    """
+
+    def __init__(self, base_dir):
+        self.path = os.path.join(base_dir, JOURNAL_FILE)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def open(self, header):
+        """打开日志用于追加；新日志会先写入头部 (卡包信息)。"""
+        is_new = not os.path.exists(self.path)
+        self._file = open(self.path, "ab")
+        if not is_new and self._file.tell() > 0:
+            # 上次中断时最后一行可能不完整，先补上换行，避免与新记录粘在一起
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write(b"\n")
+        if is_new:
+            self._write(dict(header, type="header", started_at=int(time.time())))
+
+    def record_card(self, card):
+        """记录一张已完成的卡片 (连同渲染好的片段)，返回该行在日志中的 (偏移量, 长度)。"""
+        return self._write({
+            "type": "card",
+            "card": {k: v for k, v in card.items() if not k.startswith("_")},
+            "md": card.get("_md"),
+            "html": card.get("_html"),
+        })
+
+    def record_asset(self, card_id, url, rel_path):
+        self._write({"type": "asset", "card_id": card_id, "url": url, "path": rel_path})
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n"
+        with self._lock:
+            if self._file is None:
+                return None
+            offset = self._file.tell()
+            self._file.write(line)
+            self._file.flush()
+        return offset, len(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                try:
+                    os.fsync(self._file.fileno())
+                except OSError:
+                    pass
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        """导出完成后删除日志。"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def load_journal(base_dir):
+    """读取日志，返回 (头部, {卡片 id: 精简记录}, {(卡片 id, url): 相对路径})；不存在时返回 None。
+
+    卡片只保留精简记录，`_src`/`offset`/`length` 指向日志中的完整数据。
+    """
+    path = os.path.join(base_dir, JOURNAL_FILE)
+    if not os.path.exists(path):
+        return None
+
+    header, cards, assets = {}, {}, {}
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            line_offset = offset
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 进程中断时最后一行可能不完整
+                continue
+            kind = record.get("type")
+            if kind == "header":
+                header = record
+            elif kind == "card":
+                entry = summarize_card(record["card"])
+                entry.update(_src=path, offset=line_offset, length=len(line))
+                cards[str(entry["id"])] = entry
+            elif kind == "asset":
+                assets[(str(record["card_id"]), record["url"])] = record["path"]
+    return header, cards, assets
+
+
+def find_unfinished_export(output_root, safe_pg_name, pg_id):
+    """查找同一卡包最近一次未完成 (仍有日志) 的导出目录。"""
+    if not os.path.isdir(output_root):
+        return None, None
+
+    best_dir, best = None, None
+    prefix = f"{safe_pg_name}_"
+    for name in os.listdir(output_root):
+        base_dir = os.path.join(output_root, name)
+        if not name.startswith(prefix) or not os.path.isdir(base_dir):
+            continue
+        try:
+            loaded = load_journal(base_dir)
+        except Exception as e:
+            logging.error(f"读取导出日志失败 {base_dir}: {e}")
+            continue
+        if not loaded or loaded[0].get("pg_id") != pg_id:
+            continue
+        if best is None or loaded[0].get("started_at", 0) > best[0].get("started_at", 0):
+            best_dir, best = base_dir, loaded
+    return best_dir, best
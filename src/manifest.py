@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import logging
+from .config import MANIFEST_FILE, CARDS_FILE
+
+# 清单格式版本，结构变化时递增
+MANIFEST_VERSION = 2
+
+# 清单中为每张卡片保留的字段 (完整数据在 cards.jsonl 中)
+SUMMARY_FIELDS = (
+    "id", "title", "created_int", "updated_int", "local_cover", "local_sound", "local_web", "media_pending",
+    # 远程地址用于发现上次下载失败 (有地址但没有本地文件) 的媒体
+    "cover_url", "sound_url", "url",
+)
+
+
+def summarize_card(card):
+    """卡片的精简记录，用于增量对比。"""
+    return {k: card.get(k) for k in SUMMARY_FIELDS}
+
+
+def load_manifest(base_dir):
+    """读取导出目录中的清单，不存在或损坏时返回 None。
+
+    每条卡片记录附带 `_src`/`offset`/`length`，指向 cards.jsonl 中的完整数据。
+    """
+    path = os.path.join(base_dir, MANIFEST_FILE)
+    cards_path = os.path.join(base_dir, CARDS_FILE)
+    if not os.path.exists(path) or not os.path.exists(cards_path):
+        return None
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        for entry in manifest.get("cards", {}).values():
+            entry["_src"] = cards_path
+        return manifest
+    except Exception as e:
+        logging.error(f"读取导出清单失败 {path}: {e}")
+        return None
+
+
+class ManifestWriter:
+    """流式写出 cards.jsonl (完整卡片) 与 manifest.json (精简记录及偏移量)。
+
+    两个文件都先写临时文件，close 时原子替换，读取旧 cards.jsonl 的同时可以安全地写新文件。
+    """
+
+    def __init__(self, base_dir, package):
+        self.path = os.path.join(base_dir, MANIFEST_FILE)
+        self.cards_path = os.path.join(base_dir, CARDS_FILE)
+        self._cards = open(self.cards_path + ".part", "wb")
+        self._manifest = open(self.path + ".tmp", "w", encoding='utf-8')
+        self._first = True
+        header = {
+            "version": MANIFEST_VERSION,
+            "pg_id": package.get("pg_id"),
+            "pg_name": package.get("pg_name"),
+            "exported_at": int(time.time()),
+        }
+        # 手工拼出 {"version": ..., "cards": { ... }}，逐条追加卡片记录
+        self._manifest.write(json.dumps(header, ensure_ascii=False)[:-1] + ', "cards": {')
+
+    def add(self, card):
+        line = json.dumps({k: v for k, v in card.items() if not k.startswith("_")}, ensure_ascii=False).encode('utf-8') + b"\n"
+        offset = self._cards.tell()
+        self._cards.write(line)
+
+        entry = summarize_card(card)
+        entry["offset"] = offset
+        entry["length"] = len(line)
+        sep = "" if self._first else ", "
+        self._first = False
+        self._manifest.write(f"{sep}{json.dumps(str(card['id']))}: {json.dumps(entry, ensure_ascii=False)}")
+
+    def close(self):
+        self._manifest.write("}}")
+        self._cards.close()
+        self._manifest.close()
+        os.replace(self.cards_path + ".part", self.cards_path)
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        """放弃写入并删除临时文件，上次导出的清单保持不变。"""
+        self._cards.close()
+        self._manifest.close()
+        for path in (self.cards_path + ".part", self.path + ".tmp"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def find_previous_export(output_root, safe_pg_name, pg_id):
+    """在 output_root 下查找同一卡包最近一次导出的目录。"""
+    if not os.path.isdir(output_root):
+        return None, None
+
+    best_dir, best_manifest = None, None
+    prefix = f"{safe_pg_name}_"
+    for name in os.listdir(output_root):
+        if not name.startswith(prefix):
+            continue
+        base_dir = os.path.join(output_root, name)
+        if not os.path.isdir(base_dir):
+            continue
+        manifest = load_manifest(base_dir)
+        if not manifest or manifest.get("pg_id") != pg_id:
+            continue
+        if best_manifest is None or manifest.get("exported_at", 0) > best_manifest.get("exported_at", 0):
+            best_dir, best_manifest = base_dir, manifest
+    return best_dir, best_manifest
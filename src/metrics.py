@@ -0,0 +1,284 @@
+"""导出指标：各阶段的调用次数、耗时分布、传输字节数与失败数。
+
+API 请求、文件下载、快照处理和渲染处通过 observe()/timed() 记录到当前线程绑定的
+ExportMetrics；未绑定时 (如登录、获取卡包列表) 不做任何事。导出流水线的各工作线程
+在执行阶段函数期间绑定所属导出任务的 ExportMetrics，多个卡包并行导出时互不混淆。
+"""
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+from collections import deque
+from .config import METRICS_RATE_WINDOW
+
+# 耗时直方图的桶上界 (秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_local = threading.local()
+
+
+class Histogram:
+    """固定桶的耗时直方图，分位数按桶内线性插值估算。"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # 最后一个为 +Inf 桶
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        self.counts[idx] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.bytes = 0
+        self.latency = Histogram()
+
+    def to_dict(self):
+        h = self.latency
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "bytes": self.bytes,
+            "seconds_total": round(h.sum, 6),
+            "p50": round(h.quantile(0.5), 6),
+            "p90": round(h.quantile(0.9), 6),
+            "p99": round(h.quantile(0.99), 6),
+            "max": round(h.max, 6),
+            "buckets": dict(zip([str(b) for b in h.buckets] + ["+Inf"], h.counts)),
+        }
+
+
+class ExportMetrics:
+    """单次导出的指标。线程安全。"""
+
+    def __init__(self, rate_window=METRICS_RATE_WINDOW):
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self.stages = {}
+        self._bytes = 0
+        self.rate_window = rate_window
+        # 最近的 (时间, 已完成卡片数, 累计字节数)，用于计算实时吞吐量
+        self._samples = deque([(self._start, 0, 0)])
+
+    def observe(self, stage, seconds, nbytes=0, ok=True):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.count += 1
+            stats.failures += not ok
+            stats.bytes += nbytes
+            stats.latency.add(seconds)
+            self._bytes += nbytes
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return self._bytes
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self._start
+
+    def progress(self, done, total):
+        """记录已完成卡片数，返回 (每秒卡片数, 每秒字节数, 预计剩余秒数或 None)。"""
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, done, self._bytes))
+            while len(self._samples) > 2 and now - self._samples[0][0] > self.rate_window:
+                self._samples.popleft()
+            t0, done0, bytes0 = self._samples[0]
+            nbytes = self._bytes
+        span = now - t0
+        if span <= 0:
+            return 0.0, 0.0, None
+        cards_rate = (done - done0) / span
+        bytes_rate = (nbytes - bytes0) / span
+        eta = (total - done) / cards_rate if cards_rate > 0 else None
+        return cards_rate, bytes_rate, eta
+
+    def format_progress(self, done, total):
+        """进度文字中的吞吐量与剩余时间，例如 "3.2 张/秒 · 1.50 MB/秒 · 剩余 02:31"。"""
+        cards_rate, bytes_rate, eta = self.progress(done, total)
+        text = f"{cards_rate:.1f} 张/秒 · {bytes_rate / 1024 ** 2:.2f} MB/秒"
+        if eta is not None and done < total:
+            text += f" · 剩余 {format_eta(eta)}"
+        return text
+
+    def report(self, **fields):
+        """生成运行报告 (可 JSON 序列化)，fields 为附加的顶层字段。"""
+        duration = self.elapsed
+        with self._lock:
+            stages = {name: stats.to_dict() for name, stats in sorted(self.stages.items())}
+            nbytes = self._bytes
+        report = dict(fields)
+        cards = report.get("cards", {}).get("exported", 0)
+        report.update({
+            "started_at": round(self.started_at, 3),
+            "finished_at": round(self.started_at + duration, 3),
+            "duration": round(duration, 3),
+            "bytes": nbytes,
+            "cards_per_sec": round(cards / duration, 3) if duration else 0.0,
+            "bytes_per_sec": round(nbytes / duration, 1) if duration else 0.0,
+            "stages": stages,
+        })
+        return report
+
+
+def format_eta(seconds):
+    """把秒数格式化为 mm:ss 或 h:mm:ss。"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+@contextlib.contextmanager
+def bind(metrics):
+    """在当前线程中把指标记录到 metrics。"""
+    previous = getattr(_local, "metrics", None)
+    _local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
+
+def current():
+    return getattr(_local, "metrics", None)
+
+
+def observe(stage, seconds, nbytes=0, ok=True):
+    metrics = current()
+    if metrics is not None:
+        metrics.observe(stage, seconds, nbytes, ok)
+
+
+class _Timing:
+    __slots__ = ("bytes", "ok")
+
+    def __init__(self):
+        self.bytes = 0
+        self.ok = True
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """记录代码块的耗时；可设置 t.bytes 与 t.ok，抛出异常时记为失败。"""
+    t = _Timing()
+    start = time.monotonic()
+    try:
+        yield t
+    except BaseException:
+        t.ok = False
+        raise
+    finally:
+        observe(stage, time.monotonic() - start, t.bytes, t.ok)
+
+
+def _write_atomic(path, text):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def write_json_report(path, report):
+    try:
+        _write_atomic(path, json.dumps(report, ensure_ascii=False, indent=2))
+    except OSError as e:
+        logging.error(f"写入导出报告失败 {path}: {e}")
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{k}="{_label_value(v)}"' for k, v in labels.items()) + "}"
+
+
+def prometheus_text(report):
+    """把运行报告转换为 Prometheus 文本格式。"""
+    base = {"pg_id": report.get("pg_id"), "pg_name": report.get("pg_name")}
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_labels(dict(base, **labels))} {value}")
+
+    cards = report.get("cards", {})
+    metric("llspace_export_cards", "gauge", "Cards in the last export by status.",
+           [("", {"status": status}, n) for status, n in cards.items()])
+    metric("llspace_export_duration_seconds", "gauge", "Duration of the last export.",
+           [("", {}, report["duration"])])
+    metric("llspace_export_bytes", "gauge", "Bytes transferred by the last export.", [("", {}, report["bytes"])])
+    metric("llspace_export_last_run_timestamp_seconds", "gauge", "Finish time of the last export.",
+           [("", {}, report["finished_at"])])
+    metric("llspace_export_stopped", "gauge", "Whether the last export was stopped before finishing.",
+           [("", {}, int(bool(report.get("stopped"))))])
+
+    if "dedup" in report:
+        metric("llspace_export_dedup_saved_requests", "gauge",
+               "Requests saved by reusing cards exported by other packages in the same run.",
+               [("", {}, report["dedup"]["requests"])])
+        metric("llspace_export_dedup_saved_bytes", "gauge",
+               "Bytes saved by reusing cards exported by other packages in the same run.",
+               [("", {}, report["dedup"]["bytes"])])
+
+    stages = report.get("stages", {})
+    metric("llspace_export_stage_failures", "gauge", "Failed operations per stage in the last export.",
+           [("", {"stage": s}, v["failures"]) for s, v in stages.items()])
+    metric("llspace_export_stage_bytes", "gauge", "Bytes transferred per stage in the last export.",
+           [("", {"stage": s}, v["bytes"]) for s, v in stages.items()])
+    samples = []
+    for stage, v in stages.items():
+        cumulative = 0
+        for le, n in v["buckets"].items():
+            cumulative += n
+            samples.append(("_bucket", {"stage": stage, "le": le}, cumulative))
+        samples.append(("_sum", {"stage": stage}, v["seconds_total"]))
+        samples.append(("_count", {"stage": stage}, v["count"]))
+    metric("llspace_export_stage_seconds", "histogram", "Latency per stage in the last export.", samples)
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(directory, report):
+    """写入 node_exporter textfile 目录，每个卡包一个文件 (原子替换，避免被读到半个文件)。"""
+    path = os.path.join(directory, f"llspace_export_{report.get('pg_id')}.prom")
+    try:
+        _write_atomic(path, prometheus_text(report))
+    except OSError as e:
+        logging.error(f"写入 Prometheus 指标失败 {path}: {e}")
@@ -0,0 +1,151 @@
+import queue
+import threading
+import logging
+import contextlib
+
+# 队列结束标记
+_DONE = object()
+
+
+class Stage:
+    """流水线中的一个阶段：一个有界输入队列加若干工作线程。queue_size 为 None 时队列不限长度。"""
+
+    def __init__(self, name, func, workers=1, queue_size=32):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=0 if queue_size is None else max(1, queue_size))
+        self.threads = []
+        self._alive = 0
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """由有界队列串联的多阶段流水线。
+
+    每个阶段的函数接收上一阶段的输出，返回 None 表示丢弃该项。
+    下游队列满时上游会阻塞 (背压)，使内存占用与卡片总数无关。
+    最后一个阶段的输出交给 sink，被丢弃的项交给 on_discard。
+    """
+
+    def __init__(self, stages, sink, on_discard=None, stop_event=None):
+        self.stages = stages
+        self.sink = sink
+        self.on_discard = on_discard or (lambda item: None)
+        self.stop_event = stop_event or threading.Event()
+
+    def start(self):
+        for idx, stage in enumerate(self.stages):
+            stage._alive = stage.workers
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._worker, args=(idx,),
+                    name=f"{stage.name}-{n}", daemon=True
+                )
+                stage.threads.append(t)
+                t.start()
+
+    def put(self, item):
+        """向第一阶段投递一项；队列满时阻塞。停止后返回 False。"""
+        return self._put(self.stages[0].queue, item)
+
+    def close(self):
+        """通知输入结束，并等待所有阶段处理完毕。"""
+        first = self.stages[0]
+        for _ in range(first.workers):
+            first.queue.put(_DONE)
+        for stage in self.stages:
+            for t in stage.threads:
+                t.join()
+
+    def depths(self):
+        """各阶段当前排队数量。"""
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker(self, idx):
+        stage = self.stages[idx]
+        next_stage = self.stages[idx + 1] if idx + 1 < len(self.stages) else None
+
+        try:
+            while True:
+                item = stage.queue.get()
+                if item is _DONE:
+                    break
+                self._process(stage, next_stage, item)
+        finally:
+            # 本阶段最后一个退出的线程负责通知下一阶段 (即使线程意外退出也要通知，否则 close() 会一直等待)
+            with stage._lock:
+                stage._alive -= 1
+                last = stage._alive == 0
+            if last and next_stage is not None:
+                for _ in range(next_stage.workers):
+                    next_stage.queue.put(_DONE)
+
+    def _process(self, stage, next_stage, item):
+        # 已停止：尽快排空队列，不再处理
+        if self.stop_event.is_set():
+            self._discard(item)
+            return
+
+        try:
+            result = stage.func(item)
+        except Exception as e:
+            logging.error(f"流水线阶段 {stage.name} 处理失败: {e}")
+            result = None
+
+        if result is None:
+            self._discard(item)
+        elif next_stage is None:
+            try:
+                self.sink(result)
+            except Exception as e:
+                logging.error(f"流水线输出处理失败: {e}")
+        elif not self._put(next_stage.queue, result):
+            self._discard(result)
+
+    def _discard(self, item):
+        try:
+            self.on_discard(item)
+        except Exception as e:
+            logging.error(f"流水线丢弃项处理失败: {e}")
+
+
+class PriorityGate:
+    """低优先级工作的并发闸门。
+
+    高优先级工作进行中时，最多 limit 个低优先级任务同时执行，其余在 slot() 处等待；
+    调用 open() 后不再限制。
+    """
+
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self._open = False
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @contextlib.contextmanager
+    def slot(self):
+        with self._cond:
+            while not self._open and self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def open(self):
+        with self._cond:
+            self._open = True
+            self._cond.notify_all()
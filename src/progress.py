@@ -0,0 +1,115 @@
+"""导出进度的汇总，供界面按固定频率轮询。
+
+工作线程只给各卡包自己的 PackageProgress 赋值 (不加锁，也不向界面线程投递事件)；
+界面线程定时调用 ExportProgress.snapshot() 读取汇总。每次刷新的开销只与
+同时进行的卡包数有关，与卡片完成的速度无关。
+"""
+import time
+from collections import deque
+from .config import METRICS_RATE_WINDOW
+
+# 卡包状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+INCOMPLETE = "incomplete"
+FAILED = "failed"
+
+
+class PackageProgress:
+    __slots__ = ("name", "state", "current", "total", "message", "media_current", "media_total")
+
+    def __init__(self, name):
+        self.name = name
+        self.state = PENDING
+        self.current = 0
+        self.total = 0
+        self.message = ""
+        # 媒体阶段 (封面、音频、快照) 的进度，排队数在正文阶段结束前还会增加
+        self.media_current = 0
+        self.media_total = 0
+
+    @property
+    def fraction(self):
+        if self.state in (DONE, INCOMPLETE, FAILED):
+            return 1.0
+        return self.current / self.total if self.total else 0.0
+
+
+class ExportProgress:
+    """一次导出 (可含多个卡包) 的进度。
+
+    卡包列表在创建时确定，工作线程只修改对应卡包对象的属性；
+    导出线程结束时设置 result 和 finished。
+    """
+
+    def __init__(self, packages, rate_window=METRICS_RATE_WINDOW):
+        self.order = [pkg.get("pg_id") for pkg in packages]
+        self.packages = {pkg.get("pg_id"): PackageProgress(pkg.get("pg_name", "未知")) for pkg in packages}
+        self.finished = False
+        self.result = None
+        self.rate_window = rate_window
+        # 以下只由轮询线程使用: 最近的 (时间, 已完成卡片数)
+        self._samples = deque()
+
+    # --- 工作线程调用 ---
+
+    def start(self, package):
+        self.packages[package.get("pg_id")].state = RUNNING
+
+    def update(self, package, current, total, message):
+        p = self.packages[package.get("pg_id")]
+        p.current = current
+        p.total = total
+        p.message = message
+
+    def update_media(self, package, current, total, message):
+        p = self.packages[package.get("pg_id")]
+        p.media_current = current
+        p.media_total = total
+        p.message = message
+
+    def done(self, package, error=None):
+        p = self.packages[package.get("pg_id")]
+        if getattr(error, "failed_cards", None):
+            p.state = INCOMPLETE
+        else:
+            p.state = FAILED if error is not None else DONE
+
+    def finish(self, result):
+        self.result = result
+        self.finished = True
+
+    # --- 界面线程调用 ---
+
+    def snapshot(self):
+        """返回汇总字典: 卡包与卡片进度 (正文阶段)、媒体阶段进度、进行中的卡包、吞吐量和预计剩余秒数。"""
+        packages = [self.packages[pg_id] for pg_id in self.order]
+        running = [p for p in packages if p.state == RUNNING]
+        finished = sum(1 for p in packages if p.state in (DONE, INCOMPLETE, FAILED))
+        started = [p for p in packages if p.state != PENDING]
+        cards_done = sum(p.current for p in started)
+        cards_total = sum(p.total for p in started)
+
+        now = time.monotonic()
+        self._samples.append((now, cards_done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.rate_window:
+            self._samples.popleft()
+        t0, done0 = self._samples[0]
+        rate = (cards_done - done0) / (now - t0) if now > t0 else 0.0
+        remaining = sum(max(0, p.total - p.current) for p in running)
+        eta = remaining / rate if rate > 0 and remaining else None
+
+        return {
+            "packages_total": len(packages),
+            "packages_finished": finished,
+            "percent": sum(p.fraction for p in packages) / len(packages) * 100 if packages else 100.0,
+            "cards_done": cards_done,
+            "cards_total": cards_total,
+            "media_done": sum(p.media_current for p in started),
+            "media_total": sum(p.media_total for p in started),
+            "running": [(p.name, p.current, p.total, p.media_current, p.media_total, p.message) for p in running],
+            "rate": rate,
+            "eta": eta,
+        }
+
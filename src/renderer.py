@@ -0,0 +1,360 @@
+import os
+import json
+import math
+import heapq
+import logging
+import tempfile
+from .config import RENDER_SORT_CHUNK, INDEX_PAGE_SIZE, SEARCH_SHARD_SIZE
+
+
+class CardRecord:
+    """渲染阶段使用的紧凑卡片记录：只保存排序键和完整数据在磁盘上的位置。"""
+
+    __slots__ = ("created_int", "index", "source", "offset", "length")
+
+    def __init__(self, created_int, index, source, offset, length):
+        self.created_int = int(created_int or 0)
+        self.index = index
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+    def sort_key(self):
+        # 按创建时间倒序；相同时保持目录顺序
+        return (-self.created_int, self.index)
+
+
+class CardReader:
+    """按记录中的偏移量从磁盘读取完整卡片数据 (导出日志或 cards.jsonl)。"""
+
+    def __init__(self):
+        self._files = {}
+
+    def read(self, record):
+        f = self._files.get(record.source)
+        if f is None:
+            f = self._files[record.source] = open(record.source, "rb")
+        f.seek(record.offset)
+        obj = json.loads(f.read(record.length))
+        if obj.get("type") != "card":
+            return obj
+        # 导出日志中的卡片行附带渲染好的片段
+        card = obj["card"]
+        if obj.get("md"):
+            card["_md"] = obj["md"]
+        if obj.get("html"):
+            card["_html"] = obj["html"]
+        return card
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+class RecordSorter:
+    """CardRecord 排序器。数量超过 chunk_size 时分段排序并写入临时文件，最后多路归并。"""
+
+    def __init__(self, chunk_size=RENDER_SORT_CHUNK):
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+        self._sources = []
+        self._source_ids = {}
+
+    def add(self, record):
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.chunk_size:
+            self._spill()
+
+    def _spill(self):
+        self._buffer.sort(key=CardRecord.sort_key)
+        fd, path = tempfile.mkstemp(prefix="llspace_sort_", suffix=".run")
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            for rec in self._buffer:
+                source_id = self._source_ids.get(rec.source)
+                if source_id is None:
+                    source_id = self._source_ids[rec.source] = len(self._sources)
+                    self._sources.append(rec.source)
+                f.write(f"{-rec.created_int}\t{rec.index}\t{source_id}\t{rec.offset}\t{rec.length}\n")
+        self._runs.append(path)
+        self._buffer = []
+
+    def _read_run(self, path):
+        with open(path, "r", encoding='utf-8') as f:
+            for line in f:
+                neg_created, index, source_id, offset, length = map(int, line.split("\t"))
+                yield (neg_created, index, source_id, offset, length)
+
+    def __iter__(self):
+        if not self._runs:
+            self._buffer.sort(key=CardRecord.sort_key)
+            yield from self._buffer
+            return
+
+        if self._buffer:
+            self._spill()
+        for neg_created, index, source_id, offset, length in heapq.merge(*(self._read_run(p) for p in self._runs)):
+            yield CardRecord(-neg_created, index, self._sources[source_id], offset, length)
+
+    def close(self):
+        for path in self._runs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._runs = []
+        self._buffer = []
+
+
+def _media_links(card):
+    """(封面, 音频, 网页, 网页链接文字)。媒体阶段尚未完成的卡片先使用远程地址，完成后回填为本地路径。"""
+    if card.get('media_pending'):
+        return card.get('cover_url'), card.get('sound_url'), card.get('url'), "查看原网页"
+    return card.get('local_cover'), card.get('local_sound'), card.get('local_web'), "查看快照"
+
+
+def render_markdown_card(card):
+    cover, sound, web, web_label = _media_links(card)
+    parts = [f"## {card['title']}\n\n", f"**日期:** {card['created_date']}\n\n"]
+    if cover:
+        parts.append(f"![封面]({cover})\n\n")
+
+    if sound:
+        parts.append(f"<audio controls src=\"{sound}\"></audio>\n\n")
+
+    parts.append(f"{card['description']}\n\n")
+
+    if web:
+        parts.append(f"[{web_label}]({web})\n\n")
+    parts.append("---\n\n")
+    return "".join(parts)
+
+
+def render_html_card(card):
+    cover, sound, web, web_label = _media_links(card)
+    parts = [f'<div class="card" id="card-{card["id"]}">', f'<h3>{card["title"]}</h3>', f'<div class="meta">{card["created_date"]}</div>']
+    if cover:
+        parts.append(f'<img loading="lazy" src="{cover}">')
+    if sound:
+        parts.append(f'<audio controls preload="none" src="{sound}"></audio>')
+    parts.append(f'<p>{card["description"].replace(chr(10), "<br>")}</p>')
+    if web:
+        parts.append(f'<a href="{web}" target="_blank">{web_label}</a>')
+    parts.append('</div>')
+    return "".join(parts)
+
+
+class _AtomicTextWriter:
+    """写入 `.part` 临时文件，关闭时原子替换目标文件。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path + ".part", "w", encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+        os.replace(self.path + ".part", self.path)
+
+    def abort(self):
+        """放弃写入并删除临时文件，目标文件保持不变。"""
+        self._file.close()
+        try:
+            os.remove(self.path + ".part")
+        except OSError:
+            pass
+
+
+class MarkdownWriter(_AtomicTextWriter):
+    def __init__(self, path, pg_name):
+        super().__init__(path)
+        self._file.write(f"# {pg_name}\n\n")
+
+    def add(self, card):
+        self._file.write(card.get("_md") or render_markdown_card(card))
+
+
+_INDEX_HEAD = """
+        <!DOCTYPE html>
+        <html>
+        <meta charset="utf-8"/>
+        <head><title>{title}</title>
+        <style>
+            body {{ font-family: sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }}
+            .card {{ border: 1px solid #ddd; padding: 15px; margin-bottom: 15px; border-radius: 5px; }}
+            .card img {{ max-width: 200px; display: block; margin-bottom: 10px; }}
+            .meta {{ color: #666; font-size: 0.9em; }}
+            audio {{ display: block; margin-bottom: 10px; width: 100%; }}
+            .nav {{ display: flex; justify-content: space-between; margin: 15px 0; }}
+            #search-box {{ width: 100%; padding: 6px; box-sizing: border-box; }}
+            #search-results {{ padding-left: 20px; }}
+        </style>
+        </head>
+        <body>
+        <h1>{pg_name}</h1>
+        <input id="search-box" type="search" placeholder="搜索标题或日期...">
+        <ul id="search-results"></ul>
+        """
+
+# 离线搜索：首次使用时以 <script> 方式加载分片 (file:// 下也可用)
+_SEARCH_SCRIPT = """
+<script>
+(function () {
+  var SHARDS = %d, entries = [], pending = 0, state = 0;
+  var box = document.getElementById('search-box'), list = document.getElementById('search-results');
+  function pageUrl(p) { return p === 1 ? 'index.html' : 'index_' + p + '.html'; }
+  window.LLSPACE_SEARCH_SHARD = function (items) {
+    entries = entries.concat(items);
+    if (--pending === 0) { state = 2; run(); }
+  };
+  function load() {
+    if (state) return;
+    if (!SHARDS) { state = 2; return; }
+    state = 1; pending = SHARDS;
+    for (var i = 0; i < SHARDS; i++) {
+      var s = document.createElement('script');
+      s.src = 'search/shard_' + ('00' + i).slice(-3) + '.js';
+      document.head.appendChild(s);
+    }
+  }
+  function run() {
+    if (state !== 2) return;
+    var q = box.value.trim().toLowerCase(), n = 0;
+    list.innerHTML = '';
+    if (!q) return;
+    for (var i = 0; i < entries.length && n < 50; i++) {
+      var e = entries[i];
+      if (String(e[1]).toLowerCase().indexOf(q) < 0 && String(e[2]).indexOf(q) < 0) continue;
+      var li = document.createElement('li'), a = document.createElement('a');
+      a.href = pageUrl(e[3]) + '#card-' + e[0];
+      a.textContent = e[2] + '  ' + e[1];
+      li.appendChild(a); list.appendChild(li); n++;
+    }
+  }
+  box.addEventListener('focus', load);
+  box.addEventListener('input', function () { load(); run(); });
+})();
+</script>
+"""
+
+
+def index_page_name(page):
+    """第 page 页 (从 1 开始) 的文件名。"""
+    return "index.html" if page == 1 else f"index_{page}.html"
+
+
+class IndexHtmlWriter:
+    """分页写出索引 HTML，并生成离线搜索用的 JSON 分片 (标题、日期、id、页码)。"""
+
+    def __init__(self, base_dir, pg_name, total, page_size=INDEX_PAGE_SIZE, shard_size=SEARCH_SHARD_SIZE):
+        self.base_dir = base_dir
+        self.pg_name = pg_name
+        self.page_size = max(1, page_size)
+        self.shard_size = max(1, shard_size)
+        self.pages = max(1, math.ceil(total / self.page_size))
+        self.shards = math.ceil(total / self.shard_size)
+        self.search_dir = os.path.join(base_dir, "search")
+        os.makedirs(self.search_dir, exist_ok=True)
+
+        self._count = 0
+        self._page = 0
+        self._page_file = None
+        self._shard = []
+        self._shard_no = 0
+        self._open_page()
+
+    def _open_page(self):
+        self._page += 1
+        title = f"{self.pg_name} 索引" if self._page == 1 else f"{self.pg_name} 索引 ({self._page}/{self.pages})"
+        self._page_file = _AtomicTextWriter(os.path.join(self.base_dir, index_page_name(self._page)))
+        self._page_file._file.write(_INDEX_HEAD.format(title=title, pg_name=self.pg_name))
+        self._page_file._file.write(self._nav())
+
+    def _nav(self):
+        prev_link = f'<a href="{index_page_name(self._page - 1)}">&larr; 上一页</a>' if self._page > 1 else '<span></span>'
+        next_link = f'<a href="{index_page_name(self._page + 1)}">下一页 &rarr;</a>' if self._page < self.pages else '<span></span>'
+        return f'<div class="nav">{prev_link}<span>第 {self._page} / {self.pages} 页</span>{next_link}</div>'
+
+    def _close_page(self):
+        f = self._page_file._file
+        f.write(self._nav())
+        f.write(_SEARCH_SCRIPT % self.shards)
+        f.write("</body></html>")
+        self._page_file.close()
+
+    def _flush_shard(self):
+        path = os.path.join(self.search_dir, f"shard_{self._shard_no:03d}.js")
+        with open(path + ".part", "w", encoding='utf-8') as f:
+            f.write("LLSPACE_SEARCH_SHARD(")
+            json.dump(self._shard, f, ensure_ascii=False, separators=(",", ":"))
+            f.write(");\n")
+        os.replace(path + ".part", path)
+        self._shard_no += 1
+        self._shard = []
+
+    def add(self, card):
+        if self._count and self._count % self.page_size == 0:
+            self._close_page()
+            self._open_page()
+        self._page_file._file.write(card.get("_html") or render_html_card(card))
+        self._count += 1
+
+        self._shard.append([card["id"], card["title"], card["created_date"], self._page])
+        if len(self._shard) >= self.shard_size:
+            self._flush_shard()
+
+    def close(self):
+        self._close_page()
+        if self._shard:
+            self._flush_shard()
+        self._remove_stale()
+
+    def abort(self):
+        """放弃写入当前页；已写完的页和分片都是原子替换的，保留即可。"""
+        self._page_file.abort()
+
+    def _remove_stale(self):
+        # 重新导出后页数/分片变少时，删除多余的旧文件
+        for name in os.listdir(self.base_dir):
+            if name.startswith("index_") and name.endswith(".html"):
+                try:
+                    if int(name[len("index_"):-len(".html")]) > self._page:
+                        os.remove(os.path.join(self.base_dir, name))
+                except ValueError:
+                    pass
+        for name in os.listdir(self.search_dir):
+            if name.startswith("shard_") and name.endswith(".js"):
+                try:
+                    if int(name[len("shard_"):-len(".js")]) >= self._shard_no:
+                        os.remove(os.path.join(self.search_dir, name))
+                except ValueError:
+                    pass
+
+
+def render_export(records, writers):
+    """按顺序逐张读取卡片并交给各输出器，内存中同时只保留一张卡片。返回卡片数。
+
+    中途出错时放弃所有未关闭的输出器 (删除临时文件)，已有的输出文件保持不变。
+    """
+    reader = CardReader()
+    pending = list(writers)
+    count = 0
+    try:
+        for record in records:
+            card = reader.read(record)
+            for writer in writers:
+                writer.add(card)
+            count += 1
+        while pending:
+            pending[0].close()
+            pending.pop(0)
+    finally:
+        reader.close()
+        for writer in pending:
+            try:
+                writer.abort()
+            except Exception as e:
+                logging.error(f"放弃写入输出文件失败 {type(writer).__name__}: {e}")
+    return count
@@ -0,0 +1,136 @@
+import logging
+import itertools
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from .config import PARALLEL_PACKAGES, GLOBAL_REQUEST_BUDGET
+from .exporter import Exporter, IncompleteExportError
+from .dedup import CardRegistry
+
+
+class RequestBudget:
+    """多个导出任务共享的网络请求并发预算。
+
+    每次 HTTP 请求 (API 请求、文件下载、快照页面及其资源) 占用一个名额，见 throttle.request_slot。
+    名额空出时，优先分给当前没有请求在途的任务
+    (保证每个卡包都能推进)，其次分给剩余工作最多的任务。
+    """
+
+    def __init__(self, limit=GLOBAL_REQUEST_BUDGET):
+        self.limit = max(1, limit)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._owner_in_flight = {}
+        self._remaining = {}
+        self._waiting = []
+        self._seq = itertools.count()
+
+    def set_remaining(self, owner, remaining):
+        with self._cond:
+            self._remaining[owner] = remaining
+            self._cond.notify_all()
+
+    def remove(self, owner):
+        with self._cond:
+            self._remaining.pop(owner, None)
+            self._cond.notify_all()
+
+    def _priority(self, ticket):
+        seq, owner = ticket
+        return (self._owner_in_flight.get(owner, 0) > 0, -self._remaining.get(owner, 0), seq)
+
+    @contextlib.contextmanager
+    def slot(self, owner):
+        with self._cond:
+            ticket = (next(self._seq), owner)
+            self._waiting.append(ticket)
+            while self._in_flight >= self.limit or min(self._waiting, key=self._priority) is not ticket:
+                self._cond.wait()
+            self._waiting.remove(ticket)
+            self._in_flight += 1
+            self._owner_in_flight[owner] = self._owner_in_flight.get(owner, 0) + 1
+            # 仍有空余名额时让下一个等待者继续
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._owner_in_flight[owner] -= 1
+                self._cond.notify_all()
+
+
+class ExportScheduler:
+    """并行导出多个卡包，所有卡包共享同一个请求预算。
+
+    on_progress(package, current, total, message, percent) 为各卡包正文阶段的卡片进度，
+    on_media_progress 参数相同，为媒体阶段 (封面、音频、快照) 的进度；
+    on_package_done(package, output_dir, count, error) 在每个卡包结束时调用。
+    """
+
+    def __init__(self, client, packages, on_progress=None, on_package_start=None, on_package_done=None,
+                 on_media_progress=None, max_parallel=PARALLEL_PACKAGES, request_budget=GLOBAL_REQUEST_BUDGET, **exporter_kwargs):
+        self.client = client
+        self.packages = list(packages)
+        self.on_progress = on_progress or (lambda *a: None)
+        self.on_media_progress = on_media_progress or (lambda *a: None)
+        self.on_package_start = on_package_start or (lambda package: None)
+        self.on_package_done = on_package_done or (lambda *a: None)
+        self.max_parallel = max(1, max_parallel)
+        self.budget = RequestBudget(request_budget)
+        # 同一卡片出现在多个卡包中时只获取一次详情、生成一次快照
+        self.registry = CardRegistry(pkg.get("pg_id") for pkg in self.packages) if len(self.packages) > 1 else None
+        self.exporter_kwargs = exporter_kwargs
+        self.stop_event = threading.Event()
+        self._exporters = set()
+        self._lock = threading.Lock()
+
+    def run(self, output_root=None, incremental=False, resume=False):
+        """导出全部卡包，返回 [(卡包, 导出目录, 卡片数, 异常)]，顺序与输入一致。"""
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="package") as pool:
+            futures = [
+                pool.submit(self._export_one, pkg, output_root, incremental, resume)
+                for pkg in self.packages
+            ]
+            return [f.result() for f in futures]
+
+    def stop(self):
+        """停止所有正在进行的导出 (保留导出日志以便续传)，未开始的卡包不再导出。"""
+        self.stop_event.set()
+        with self._lock:
+            for exporter in self._exporters:
+                exporter.stop_event.set()
+
+    def _export_one(self, package, output_root, incremental, resume):
+        exporter = Exporter(
+            self.client,
+            lambda current, total, message, percent: self.on_progress(package, current, total, message, percent),
+            budget=self.budget,
+            registry=self.registry,
+            media_callback=lambda current, total, message, percent: self.on_media_progress(
+                package, current, total, message, percent),
+            **self.exporter_kwargs
+        )
+        # 先登记再检查停止标志：stop() 要么能遍历到这个导出，要么已先设置了标志
+        with self._lock:
+            self._exporters.add(exporter)
+        if self.stop_event.is_set():
+            with self._lock:
+                self._exporters.discard(exporter)
+            return package, None, 0, None
+        self.on_package_start(package)
+        output_dir, count, error = None, 0, None
+        try:
+            output_dir, count = exporter.run(package, output_root, incremental=incremental, resume=resume)
+            logging.info(f"Exported {package.get('pg_name')} to {output_dir}")
+        except IncompleteExportError as e:
+            # 结果已写出，但有卡片缺失
+            output_dir, count, error = e.base_dir, e.exported_count, e
+        except Exception as e:
+            logging.error(f"Export failed for {package.get('pg_name')}: {e}")
+            error = e
+        finally:
+            with self._lock:
+                self._exporters.discard(exporter)
+        self.on_package_done(package, output_dir, count, error)
+        return package, output_dir, count, error
@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import sqlite3
+import logging
+import threading
+from .config import SEARCH_DB_BATCH, SEARCH_DB_BUSY_TIMEOUT
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    rowid INTEGER PRIMARY KEY,
+    pg_id INTEGER NOT NULL,
+    card_id INTEGER NOT NULL,
+    pg_name TEXT,
+    export_dir TEXT,
+    title TEXT,
+    created_date TEXT,
+    created_int INTEGER,
+    description TEXT,
+    card_cat INTEGER,
+    local_cover TEXT,
+    local_sound TEXT,
+    local_web TEXT,
+    run_id INTEGER,
+    UNIQUE (pg_id, card_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5(
+    title, created_date, description,
+    content='cards', content_rowid='rowid', tokenize='{tokenizer}'
+);
+CREATE TRIGGER IF NOT EXISTS cards_ai AFTER INSERT ON cards BEGIN
+    INSERT INTO cards_fts (rowid, title, created_date, description)
+    VALUES (new.rowid, new.title, new.created_date, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_ad AFTER DELETE ON cards BEGIN
+    INSERT INTO cards_fts (cards_fts, rowid, title, created_date, description)
+    VALUES ('delete', old.rowid, old.title, old.created_date, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_au AFTER UPDATE ON cards BEGIN
+    INSERT INTO cards_fts (cards_fts, rowid, title, created_date, description)
+    VALUES ('delete', old.rowid, old.title, old.created_date, old.description);
+    INSERT INTO cards_fts (rowid, title, created_date, description)
+    VALUES (new.rowid, new.title, new.created_date, new.description);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO cards (pg_id, card_id, pg_name, export_dir, title, created_date, created_int,
+                   description, card_cat, local_cover, local_sound, local_web, run_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (pg_id, card_id) DO UPDATE SET
+    pg_name = excluded.pg_name, export_dir = excluded.export_dir, title = excluded.title,
+    created_date = excluded.created_date, created_int = excluded.created_int,
+    description = excluded.description, card_cat = excluded.card_cat,
+    local_cover = excluded.local_cover, local_sound = excluded.local_sound,
+    local_web = excluded.local_web, run_id = excluded.run_id
+"""
+
+
+def _tokenizer():
+    # trigram 分词支持中文子串检索 (SQLite 3.34+)，否则退回 unicode61
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE t USING fts5(a, tokenize='trigram')")
+        return "trigram"
+    except sqlite3.OperationalError:
+        return "unicode61"
+    finally:
+        conn.close()
+
+
+def _connect(path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # timeout 即 busy_timeout：其他连接 (如并行导出的卡包写入全局检索库) 持有写锁时等待而不是立即报错
+    conn = sqlite3.connect(path, timeout=SEARCH_DB_BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SearchDbWriter:
+    """把导出的卡片写入 SQLite FTS5 全文检索库。
+
+    可作为 render_export 的输出器：卡片逐张流入，按批次在事务中写入。
+    结束时删除本卡包中本次未出现的卡片 (已被删除的卡片)。
+    写入失败只记录日志，不影响导出；有批次写入失败时不做删除，避免误删未能更新的卡片。
+    """
+
+    def __init__(self, path, package, export_dir, batch_size=SEARCH_DB_BATCH):
+        self.path = path
+        self.pg_id = package.get("pg_id")
+        self.pg_name = package.get("pg_name")
+        self.export_dir = os.path.abspath(export_dir)
+        self.batch_size = max(1, batch_size)
+        self.run_id = time.time_ns()
+        self._batch = []
+        self._failed = False
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.executescript(_SCHEMA.format(tokenizer=_tokenizer()))
+
+    def add(self, card):
+        row = (
+            self.pg_id, card["id"], self.pg_name, self.export_dir,
+            card.get("title"), card.get("created_date"), card.get("created_int"),
+            card.get("description"), card.get("card_cat"),
+            card.get("local_cover"), card.get("local_sound"), card.get("local_web"),
+            self.run_id,
+        )
+        with self._lock:
+            self._batch.append(row)
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        # 调用方需持有 self._lock
+        if not self._batch:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany(_UPSERT, self._batch)
+        except sqlite3.Error as e:
+            self._failed = True
+            logging.error(f"写入全文检索库失败 {self.path} ({len(self._batch)} 张卡片): {e}")
+        self._batch = []
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush()
+                if not self._failed:
+                    with self._conn:
+                        self._conn.execute(
+                            "DELETE FROM cards WHERE pg_id = ? AND run_id != ?", (self.pg_id, self.run_id)
+                        )
+            except sqlite3.Error as e:
+                logging.error(f"写入全文检索库失败 {self.path}: {e}")
+            finally:
+                self._conn.close()
+
+    def abort(self):
+        """放弃未写入的批次并关闭连接；导出不完整，不删除旧卡片。"""
+        with self._lock:
+            self._batch = []
+            self._conn.close()
+
+
+def search(db_path, query, limit=20, pg_id=None):
+    """在检索库中查询，按相关度返回结果列表 (标题权重更高)。
+
+    trigram 分词的索引只能匹配至少 3 个字符的查询；1~2 个字符的查询 (如两个汉字的词) 退回
+    LIKE 逐行扫描标题和正文，结果按标题命中和日期排序而非相关度，卡片很多时明显变慢。
+    """
+    query = query.strip()
+    if not query or not os.path.exists(db_path):
+        return []
+
+    conn = sqlite3.connect(db_path, timeout=SEARCH_DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    try:
+        fields = (
+            "c.pg_id, c.pg_name, c.card_id, c.title, c.created_date, c.card_cat, "
+            "c.export_dir, c.local_cover, c.local_sound, c.local_web"
+        )
+        pg_filter = " AND c.pg_id = ?" if pg_id is not None else ""
+        pg_args = (pg_id,) if pg_id is not None else ()
+
+        tokenizer_sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'cards_fts'"
+        ).fetchone()
+        trigram = tokenizer_sql is not None and "trigram" in tokenizer_sql[0]
+
+        if trigram and len(query) < 3:
+            # trigram 无法匹配少于 3 个字符的查询，退回 LIKE 全表扫描 (见文档字符串)
+            like = f"%{query}%"
+            rows = conn.execute(
+                f"SELECT {fields}, substr(c.description, 1, 80) AS snippet FROM cards c "
+                f"WHERE (c.title LIKE ? OR c.description LIKE ?){pg_filter} "
+                f"ORDER BY (c.title LIKE ?) DESC, c.created_int DESC LIMIT ?",
+                (like, like, *pg_args, like, limit)
+            ).fetchall()
+        else:
+            match = '"' + query.replace('"', '""') + '"'
+            rows = conn.execute(
+                f"SELECT {fields}, snippet(cards_fts, 2, '[', ']', '…', 16) AS snippet "
+                f"FROM cards_fts JOIN cards c ON c.rowid = cards_fts.rowid "
+                f"WHERE cards_fts MATCH ?{pg_filter} "
+                f"ORDER BY bm25(cards_fts, 10.0, 2.0, 1.0) LIMIT ?",
+                (match, *pg_args, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    """命令行查询: python -m src.search_db <数据库> <关键词> [条数]"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print("用法: python -m src.search_db <search.sqlite3> <关键词> [条数]")
+        return 2
+    limit = int(argv[2]) if len(argv) > 2 else 20
+    start = time.perf_counter()
+    hits = search(argv[0], argv[1], limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    for hit in hits:
+        print(f"[{hit['created_date']}] {hit['title']}  ({hit['pg_name']})")
+        print(f"    {hit['snippet']}")
+        if hit['local_web']:
+            print(f"    {os.path.join(hit['export_dir'], hit['local_web'])}")
+    print(f"共 {len(hits)} 条结果，用时 {elapsed:.1f} ms")
+    if len(argv[1].strip()) < 3:
+        print("提示: 少于 3 个字符的关键词不使用全文索引，逐行扫描且不按相关度排序")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import os
+import json
+import logging
+from .config import SESSION_FILE
+
+
+def load_session(path=SESSION_FILE):
+    """读取缓存的会话，返回 {"user": ..., "packages": [...]}；不存在或损坏时返回 None。"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        logging.error(f"读取会话缓存失败 {path}: {e}")
+        return None
+    if not data.get("user", {}).get("authentication_token"):
+        return None
+    return data
+
+
+def save_session(user_info, packages, path=SESSION_FILE):
+    """保存登录信息和卡包列表 (先写临时文件再替换)。"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding='utf-8') as f:
+        json.dump({
+            "user": user_info,
+            "packages": packages
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def clear_session(path=SESSION_FILE):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def restore_client(client, path=SESSION_FILE):
+    """用缓存的 token 恢复客户端登录状态，返回缓存的会话数据 (无缓存时返回 None)。"""
+    data = load_session(path)
+    if data is None:
+        return None
+    client.token = data["user"]["authentication_token"]
+    client.user_info = data["user"]
+    return data
@@ -0,0 +1,115 @@
+"""网页快照的 HTML 解析与重写。
+
+解析和序列化是 CPU 密集型工作，会长时间占用 GIL，因此放到独立的进程池中执行。
+进程间只传递字节串和资源列表：工作进程解析页面，把需要下载的资源链接替换为占位符后
+序列化为模板；主进程下载资源后只需在模板中做字节替换。
+"""
+import os
+import re
+import html
+import uuid
+import logging
+import threading
+from urllib.parse import urljoin, urlparse
+from .config import SNAPSHOT_PARSER, SNAPSHOT_PARSE_PROCESSES
+
+# 需要本地化的资源: (标签, 属性, 筛选条件, 默认扩展名)
+RESOURCE_TARGETS = (
+    ("img", "src", {}, ".jpg"),
+    ("link", "href", {"rel": "stylesheet"}, ".css"),
+    ("script", "src", {}, ".js"),
+)
+
+_PLACEHOLDER = re.compile(rb"llspace-[0-9a-f]{32}-\d+-")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def parser_name(preferred=SNAPSHOT_PARSER):
+    """返回实际使用的解析器: 指定 "lxml" 或 "auto" 且已安装 lxml 时用 lxml，否则用 html.parser。"""
+    if preferred in ("auto", "lxml"):
+        try:
+            import lxml  # noqa: F401
+            return "lxml"
+        except ImportError:
+            if preferred == "lxml":
+                logging.warning("未安装 lxml，快照解析退回 html.parser")
+    return "html.parser"
+
+
+def parse_snapshot(content, base_url, parser=None):
+    """解析页面并收集资源引用 (在工作进程中执行)。
+
+    返回 (模板字节串, 引用列表)。引用列表中每项为 (占位符, 绝对 URL, 默认扩展名, 原属性值)，
+    同一 URL 被多处引用时会出现多项。
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, parser or parser_name())
+    # 占位符带随机串，避免与页面原有内容冲突
+    nonce = uuid.uuid4().hex
+    refs = []
+    for name, attr, attrs, default_ext in RESOURCE_TARGETS:
+        for tag in soup.find_all(name, attrs=attrs):
+            src = tag.get(attr)
+            if not src:
+                continue
+            abs_url = urljoin(base_url, src.strip())
+            if urlparse(abs_url).scheme not in ("http", "https"):
+                continue
+            placeholder = f"llspace-{nonce}-{len(refs)}-"
+            refs.append((placeholder, abs_url, default_ext, src))
+            tag[attr] = placeholder
+    return str(soup).encode("utf-8"), refs
+
+
+def fill_snapshot(template, refs, local_paths):
+    """把模板中的占位符替换为本地路径；下载失败 (不在 local_paths 中) 的恢复为原链接。"""
+    values = {}
+    for placeholder, abs_url, _, original in refs:
+        local = local_paths.get(abs_url)
+        values[placeholder.encode("ascii")] = (local or html.escape(original, quote=True)).encode("utf-8")
+    return _PLACEHOLDER.sub(lambda m: values.get(m.group(0), m.group(0)), template)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 进程池相关模块导入较慢，首次解析快照时才导入
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn：导出时进程内有大量线程，fork 不安全
+            _pool = ProcessPoolExecutor(
+                max_workers=SNAPSHOT_PARSE_PROCESSES or _default_processes(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _default_processes():
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def parse_snapshot_async(content, base_url):
+    """在进程池中解析页面，返回 (模板字节串, 引用列表)。SNAPSHOT_PARSE_PROCESSES 为负数时在当前线程解析。"""
+    parser = parser_name()
+    if SNAPSHOT_PARSE_PROCESSES < 0:
+        return parse_snapshot(content, base_url, parser)
+    from concurrent.futures.process import BrokenProcessPool
+    try:
+        return _get_pool().submit(parse_snapshot, content, base_url, parser).result()
+    except BrokenProcessPool as e:
+        # 工作进程意外退出：重建进程池，本页在当前线程解析
+        logging.error(f"快照解析进程异常，改为在当前进程解析: {e}")
+        shutdown_pool()
+        return parse_snapshot(content, base_url, parser)
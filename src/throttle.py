@@ -0,0 +1,112 @@
+import time
+import random
+import logging
+import threading
+import contextlib
+from .config import (
+    API_RATE_LIMIT, API_RATE_BURST, API_BACKOFF_BASE, API_BACKOFF_MAX,
+    API_CONCURRENCY_INITIAL, API_CONCURRENCY_MIN, API_CONCURRENCY_MAX, API_LATENCY_TARGET,
+)
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个请求，允许 burst 个突发。"""
+
+    def __init__(self, rate=API_RATE_LIMIT, burst=API_RATE_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发上限。
+
+    请求成功且延迟低于目标时加性增加 (每轮约 +1)；
+    遇到限流、服务端错误、超时或延迟过高时减半，并在一个冷却期内不再重复减半。
+    """
+
+    def __init__(self, initial=API_CONCURRENCY_INITIAL, minimum=API_CONCURRENCY_MIN,
+                 maximum=API_CONCURRENCY_MAX, latency_target=API_LATENCY_TARGET):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+
+    @contextlib.contextmanager
+    def slot(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self, latency):
+        with self._cond:
+            if latency > self.latency_target:
+                self._decrease("延迟过高")
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def on_overload(self, reason):
+        with self._cond:
+            self._decrease(reason)
+
+    def _decrease(self, reason):
+        # 调用方需持有 self._cond；一个冷却期内 (约一次请求往返) 只减半一次
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        old = self.limit
+        self.limit = max(self.minimum, self.limit / 2)
+        logging.info(f"API 并发上限 {old:.1f} -> {self.limit:.1f} ({reason})")
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def bind_request_slot(slot):
+    """在当前线程中为每次网络请求附加一个名额 (如多卡包共享的请求预算)，slot() 返回上下文管理器。"""
+    previous = getattr(_local, "slot", None)
+    _local.slot = slot
+    try:
+        yield
+    finally:
+        _local.slot = previous
+
+
+def request_slot():
+    """包住单次 HTTP 请求：占用当前线程绑定的名额，未绑定时不限制。"""
+    slot = getattr(_local, "slot", None)
+    return slot() if slot is not None else contextlib.nullcontext()
+
+
+def backoff_delay(attempt, base=API_BACKOFF_BASE, cap=API_BACKOFF_MAX):
+    """第 attempt 次重试 (从 0 开始) 前的等待时间：指数退避加全抖动。"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -1,10 +1,14 @@
 import hashlib
 import time
 import re
-import requests
 import logging
 import os
-from .config import SECRET_KEY, CLIENT_VERSION, PLATFORM
+import json
+import shutil
+from .config import SECRET_KEY, CLIENT_VERSION, PLATFORM, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_TIMEOUT
+from .http_pool import get_session
+from .throttle import request_slot
+from . import metrics
 
 def md5(s: str) -> str:
     """计算字符串的 MD5 哈希值。"""
@@ -39,13 +43,146 @@ def safe_filename(s: str) -> str:
     """清理字符串以用作安全的文件名。"""
     return re.sub(r'[\\/*?:"<>|]', "_", s)
 
-def download_file(url: str, dest_path: str):
-    """从 URL 下载文件到目标路径。"""
+class DownloadResult:
+    """download_file 的结果。status 为 downloaded / resumed / skipped / failed，
+    bytes 为本次实际传输的字节数，size 为文件完整大小。失败时布尔值为 False。"""
+
+    __slots__ = ("status", "bytes", "size", "etag", "error")
+
+    def __init__(self, status, bytes=0, size=None, etag=None, error=None):
+        self.status = status
+        self.bytes = bytes
+        self.size = size
+        self.etag = etag
+        self.error = error
+
+    def __bool__(self):
+        return self.status != "failed"
+
+    def __repr__(self):
+        return f"DownloadResult({self.status}, bytes={self.bytes}, size={self.size})"
+
+
+def link_file(src: str, dest_path: str) -> None:
+    """把 src 放到 dest_path (优先硬链接，跨文件系统或不支持时复制)。失败时抛出 OSError。"""
+    if os.path.exists(dest_path) and os.path.samefile(src, dest_path):
+        return
+    tmp_path = dest_path + ".part"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    # 原子替换，中断时目标要么是旧文件要么是完整的新文件
+    os.replace(tmp_path, dest_path)
+
+
+def _load_part_meta(meta_path):
     try:
-        resp = requests.get(url, stream=True, timeout=10)
-        resp.raise_for_status()
-        with open(dest_path, 'wb') as f:
-            for chunk in resp.iter_content(chunk_size=8192):
-                f.write(chunk)
+        with open(meta_path, "r", encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remove_quietly(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _total_size(resp):
+    """完整文件大小：206 响应取 Content-Range 中的总长，否则取 Content-Length。"""
+    content_range = resp.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = resp.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _is_encoded(resp):
+    return resp.headers.get("Content-Encoding", "identity").lower() not in ("", "identity")
+
+
+def download_file(url: str, dest_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                  etag: str = None, timeout=DOWNLOAD_TIMEOUT) -> DownloadResult:
+    """从 URL 下载文件到目标路径，返回 DownloadResult。
+
+    - 先写入 `.part` 临时文件，大小校验通过后再原子替换，中断时不会留下看似完整的文件；
+    - 失败时保留 `.part` 及其校验信息，下次用 HTTP Range 续传 (服务器内容变化时重新下载)；
+    - 目标文件已存在且与服务器的 Content-Length (及给定的 ETag) 一致时跳过。
+    """
+    start = time.monotonic()
+    with request_slot():
+        result = _download(url, dest_path, chunk_size, etag, timeout)
+    metrics.observe("download", time.monotonic() - start, result.bytes, bool(result))
+    return result
+
+
+def _download(url, dest_path, chunk_size, etag, timeout):
+    tmp_path = dest_path + ".part"
+    meta_path = tmp_path + ".json"
+    session = get_session()
+
+    try:
+        if os.path.exists(dest_path):
+            with session.head(url, allow_redirects=True, timeout=timeout) as head:
+                if head.ok and not _is_encoded(head):
+                    remote_size = _total_size(head)
+                    remote_etag = head.headers.get("ETag")
+                    if (remote_size is not None and remote_size == os.path.getsize(dest_path)
+                            and (etag is None or etag == remote_etag)):
+                        return DownloadResult("skipped", 0, remote_size, remote_etag)
+
+        headers = {}
+        offset = os.path.getsize(tmp_path) if os.path.exists(tmp_path) else 0
+        meta = _load_part_meta(meta_path) if offset else {}
+        validator = meta.get("etag") or meta.get("last_modified")
+        if offset and validator and meta.get("url") == url:
+            headers["Range"] = f"bytes={offset}-"
+            # 内容已变化时服务器会返回完整的 200 响应
+            headers["If-Range"] = validator
+        else:
+            offset = 0
+
+        with session.get(url, stream=True, headers=headers, timeout=timeout) as resp:
+            if resp.status_code == 416:
+                # 续传起点越界：临时文件有问题，下次从头下载
+                _remove_quietly(tmp_path, meta_path)
+                resp.raise_for_status()
+            resp.raise_for_status()
+
+            resumed = resp.status_code == 206 and offset > 0
+            if not resumed:
+                offset = 0
+            # 压缩传输时 Content-Length 是压缩后的大小，无法用于校验
+            total = None if _is_encoded(resp) else _total_size(resp)
+            remote_etag = resp.headers.get("ETag")
+            with open(meta_path, "w", encoding='utf-8') as f:
+                json.dump({
+                    "url": url,
+                    "etag": remote_etag,
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "size": total,
+                }, f)
+
+            received = 0
+            with open(tmp_path, "ab" if resumed else "wb") as f:
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    received += len(chunk)
+
+        size = offset + received
+        if total is not None and size != total:
+            raise IOError(f"文件不完整 ({size}/{total} 字节)")
+        os.replace(tmp_path, dest_path)
+        _remove_quietly(meta_path)
+        return DownloadResult("resumed" if resumed else "downloaded", received, size, remote_etag)
     except Exception as e:
         logging.error(f"下载失败 {url}: {e}")
+        # 保留 .part 供下次续传
+        return DownloadResult("failed", error=e)
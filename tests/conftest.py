@@ -0,0 +1,40 @@
+import argparse
+
+import pytest
+
+from benchmarks.mock_server import add_arguments, start_server
+
+
+def _start(cards=10, packages=1):
+    """启动无延迟、无错误的模拟服务器 (benchmarks/mock_server.py)，返回 (server, 地址)。"""
+    ap = argparse.ArgumentParser()
+    add_arguments(ap)
+    args = ap.parse_args(["--latency", "0", "--jitter", "0", "--cover-bytes", "4096", "--audio-bytes", "65536",
+                          "--page-images", "1", "--image-bytes", "1024"])
+    args.packages, args.cards = packages, cards
+    return start_server(args)
+
+
+@pytest.fixture(scope="session")
+def mock_server():
+    """测试共用的模拟服务器地址 (不修改其状态的测试使用)。"""
+    server, base_url = _start()
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def start_mock_server():
+    """启动独立的模拟服务器，返回 (server, 地址)；测试可修改 server.RequestHandlerClass.state。"""
+    servers = []
+
+    def start(**kwargs):
+        server, base_url = _start(**kwargs)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,47 @@
+import time
+import threading
+
+from src import asset_store
+from src.asset_store import AssetStore
+
+
+def test_same_url_is_never_downloaded_concurrently(tmp_path, monkeypatch):
+    lock = threading.Lock()
+    state = {"calls": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def fake_download(url, path, chunk_size=None):
+        with lock:
+            state["calls"] += 1
+            first = state["calls"] == 1
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        time.sleep(0.05)
+        with lock:
+            state["in_flight"] -= 1
+        if first:
+            # 第一次下载失败，等待中的线程和新到的线程都会重试
+            return False
+        with open(path, "wb") as f:
+            f.write(b"data")
+        return True
+
+    monkeypatch.setattr(asset_store, "download_file", fake_download)
+    store = AssetStore(str(tmp_path))
+    results = []
+
+    def fetch():
+        results.append(store.fetch("http://example.com/a.png"))
+
+    threads = []
+    for _ in range(8):
+        t = threading.Thread(target=fetch)
+        t.start()
+        threads.append(t)
+        time.sleep(0.01)
+    for t in threads:
+        t.join(5)
+
+    assert state["max_in_flight"] == 1
+    assert results.count(None) == 1
+    assert len({r for r in results if r}) == 1
+    assert store._url_locks == {}
@@ -0,0 +1,56 @@
+import json
+import urllib.request
+
+from src.utils import download_file
+
+
+def fetch(url):
+    with urllib.request.urlopen(url) as resp:
+        return resp.read(), resp.headers["ETag"]
+
+
+def write_part(dest, data, url, etag):
+    with open(dest + ".part", "wb") as f:
+        f.write(data)
+    with open(dest + ".part.json", "w", encoding="utf-8") as f:
+        json.dump({"url": url, "etag": etag, "last_modified": None, "size": None}, f)
+
+
+def test_resumes_from_part_file(tmp_path, mock_server):
+    url = f"{mock_server}/media/1.m4a"
+    body, etag = fetch(url)
+    dest = str(tmp_path / "1.m4a")
+    half = len(body) // 2
+    write_part(dest, body[:half], url, etag)
+
+    result = download_file(url, dest)
+
+    assert result.status == "resumed"
+    assert result.bytes == len(body) - half
+    with open(dest, "rb") as f:
+        assert f.read() == body
+    assert not (tmp_path / "1.m4a.part").exists()
+    assert not (tmp_path / "1.m4a.part.json").exists()
+
+
+def test_restarts_when_remote_content_changed(tmp_path, mock_server):
+    url = f"{mock_server}/media/2.m4a"
+    body, _ = fetch(url)
+    dest = str(tmp_path / "2.m4a")
+    write_part(dest, b"x" * 100, url, '"stale"')
+
+    result = download_file(url, dest)
+
+    assert result.status == "downloaded"
+    assert result.bytes == len(body)
+    with open(dest, "rb") as f:
+        assert f.read() == body
+
+
+def test_skips_complete_file(tmp_path, mock_server):
+    url = f"{mock_server}/assets/3.jpg"
+    body, _ = fetch(url)
+    dest = tmp_path / "3.jpg"
+    dest.write_bytes(body)
+
+    assert download_file(url, str(dest)).status == "skipped"
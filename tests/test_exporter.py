@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import zipfile
+import threading
+
+import pytest
+
+from src import api_client
+from src.api_client import LLSpaceClient, TransportError
+from src.asset_store import AssetStore
+from src.card_cache import CardCache
+from src.config import JOURNAL_FILE, SEARCH_DB_FILE
+from src.exporter import Exporter, IncompleteExportError
+from src.journal import load_journal
+from src.manifest import load_manifest
+
+PACKAGE = {"pg_id": 1, "pg_name": "测试卡包"}
+
+
+class FakeClient:
+    """目录与详情在内存中生成，封面从模拟服务器下载。"""
+
+    def __init__(self, base_url, count=10):
+        self.base_url = base_url
+        self.titles = {i: f"卡片 {i}" for i in range(count)}
+        self.failing = set()
+        # 正常获取详情的卡片 id (不含增量导出的抽查)
+        self.fetched = []
+        self._lock = threading.Lock()
+
+    def get_directory(self, pg_id, use_cache=True):
+        return [{"id": i, "data": {"title": t, "created_int": 1000 + i}} for i, t in self.titles.items()]
+
+    def get_card_detail(self, card_id, pg_id, created_int=None, use_cache=True):
+        if use_cache:
+            with self._lock:
+                self.fetched.append(card_id)
+        if card_id in self.failing:
+            raise TransportError("连接失败")
+        return {
+            "title": self.titles[card_id],
+            "created_int": 1000 + card_id,
+            "description": f"第 {card_id} 张卡片的正文",
+            "cover_url": f"{self.base_url}/assets/{card_id}.jpg",
+        }
+
+
+def make_exporter(client, tmp_path, media_callback=None):
+    return Exporter(client, lambda *args: None, max_workers=2, asset_store=AssetStore(str(tmp_path / "assets")),
+                    media_callback=media_callback)
+
+
+def export(client, tmp_path, **kwargs):
+    """导出 PACKAGE，返回 (导出目录, 卡片数)。"""
+    return make_exporter(client, tmp_path).run(PACKAGE, str(tmp_path / "out"), **kwargs)
+
+
+def cards_of(base_dir):
+    return load_manifest(base_dir)["cards"]
+
+
+def test_resume_requeues_media_pending_cards_without_refetching(tmp_path, mock_server):
+    client = FakeClient(mock_server)
+
+    def stop_after_two(done, *args):
+        if done >= 2:
+            exporter.stop_event.set()
+
+    exporter = make_exporter(client, tmp_path, media_callback=stop_after_two)
+    base_dir, _ = exporter.run(PACKAGE, str(tmp_path / "out"))
+
+    _, journaled, _ = load_journal(base_dir)
+    pending = {card_id for card_id, card in journaled.items() if card["media_pending"]}
+    assert pending, "第一次导出应在媒体阶段中止"
+
+    client.fetched.clear()
+    resumed_dir, count = export(client, tmp_path, resume=True)
+
+    assert resumed_dir == base_dir
+    assert count == len(client.titles)
+    # 日志中已完成正文的卡片不再获取详情，只补下载媒体
+    assert {str(card_id) for card_id in client.fetched}.isdisjoint(journaled)
+    cards = cards_of(base_dir)
+    assert all(not card["media_pending"] and card["local_cover"] for card in cards.values())
+    assert all(os.path.exists(os.path.join(base_dir, card["local_cover"])) for card in cards.values())
+    assert not os.path.exists(os.path.join(base_dir, JOURNAL_FILE))
+
+
+def test_incremental_refetches_changed_cards_only(tmp_path, mock_server):
+    client = FakeClient(mock_server)
+    base_dir, _ = export(client, tmp_path)
+
+    client.fetched.clear()
+    client.titles[3] = "卡片 3 (已修改)"
+    del client.titles[7]
+    new_dir, count = export(client, tmp_path, incremental=True)
+
+    assert new_dir == base_dir
+    assert client.fetched == [3]
+    assert count == 9
+    cards = cards_of(base_dir)
+    assert "7" not in cards
+    assert cards["3"]["title"] == "卡片 3 (已修改)"
+
+
+def test_incremental_keeps_previous_card_when_refetch_fails(tmp_path, mock_server):
+    client = FakeClient(mock_server)
+    base_dir, _ = export(client, tmp_path)
+
+    client.titles[5] = "卡片 5 (已修改)"
+    client.failing.add(5)
+    with pytest.raises(IncompleteExportError) as excinfo:
+        export(client, tmp_path, incremental=True)
+
+    assert excinfo.value.exported_count == len(client.titles)
+    # 重新获取失败的卡片沿用上次的版本，不会从导出结果中消失
+    assert cards_of(base_dir)["5"]["title"] == "卡片 5"
+
+
+def test_export_reads_current_directory_despite_cache(tmp_path, monkeypatch, start_mock_server):
+    server, base_url = start_mock_server(cards=5)
+    monkeypatch.setattr(api_client, "API_BASE_URL", base_url)
+    client = LLSpaceClient(cache=CardCache(str(tmp_path / "cards.sqlite3")))
+    assert client.login("test", "test")[0]
+    package = client.get_packages()[0]
+    out = str(tmp_path / "out")
+
+    base_dir, count = make_exporter(client, tmp_path).run(package, out)
+    assert count == 5
+
+    # 目录缓存仍在有效期内时卡包新增了卡片
+    server.RequestHandlerClass.state.cards = 8
+    new_dir, count = make_exporter(client, tmp_path).run(package, out, incremental=True)
+    assert new_dir == base_dir
+    assert count == 8
+    assert len(load_manifest(base_dir)["cards"]) == 8
+
+
+def test_incremental_retries_failed_media_download(tmp_path, mock_server, monkeypatch):
+    client = FakeClient(mock_server)
+    failed_url = f"{mock_server}/assets/2.jpg"
+    link = AssetStore.link
+
+    def fail_once(self, url, *args, **kwargs):
+        if url == failed_url and not failures:
+            failures.append(url)
+            return None
+        return link(self, url, *args, **kwargs)
+
+    failures = []
+    monkeypatch.setattr(AssetStore, "link", fail_once)
+    base_dir, _ = export(client, tmp_path)
+    assert failures and cards_of(base_dir)["2"]["local_cover"] is None
+
+    client.fetched.clear()
+    export(client, tmp_path, incremental=True)
+
+    # 下载失败的封面在增量导出时补下载，无需重新获取详情
+    assert client.fetched == []
+    assert cards_of(base_dir)["2"]["local_cover"] == "images/cover_2.jpg"
+    assert os.path.exists(os.path.join(base_dir, "images", "cover_2.jpg"))
+
+
+def test_archive_search_db_points_at_archive(tmp_path, mock_server, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    exporter = Exporter(FakeClient(mock_server), lambda *args: None, max_workers=2,
+                        asset_store=AssetStore(str(tmp_path / "assets")), archive_format="zip")
+    archive_path, _ = exporter.run(PACKAGE, str(tmp_path / "out"))
+
+    with zipfile.ZipFile(archive_path) as zf:
+        name = next(n for n in zf.namelist() if n.endswith("/" + SEARCH_DB_FILE))
+        db_path = zf.extract(name, str(tmp_path / "extracted"))
+    with sqlite3.connect(db_path) as conn:
+        export_dirs = {row[0] for row in conn.execute("SELECT export_dir FROM cards")}
+    assert export_dirs == {os.path.abspath(archive_path)}
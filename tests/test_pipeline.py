@@ -0,0 +1,60 @@
+import threading
+
+from src.pipeline import Pipeline, Stage
+
+
+def run_pipeline(stages, sink, on_discard=None, items=range(10), timeout=5):
+    """投递 items 并关闭流水线；close() 超时未返回时判定为挂起。"""
+    pipeline = Pipeline(stages, sink, on_discard=on_discard)
+    pipeline.start()
+    for item in items:
+        pipeline.put(item)
+    closer = threading.Thread(target=pipeline.close, daemon=True)
+    closer.start()
+    closer.join(timeout)
+    assert not closer.is_alive(), "Pipeline.close() 未返回"
+
+
+def test_all_items_reach_sink():
+    out = []
+    lock = threading.Lock()
+
+    def sink(item):
+        with lock:
+            out.append(item)
+
+    run_pipeline([Stage("a", lambda x: x * 2, 3), Stage("b", lambda x: x + 1, 2)], sink)
+    assert sorted(out) == [x * 2 + 1 for x in range(10)]
+
+
+def test_raising_sink_does_not_hang_close():
+    seen = []
+
+    def sink(item):
+        seen.append(item)
+        raise OSError("disk full")
+
+    run_pipeline([Stage("a", lambda x: x, 2)], sink)
+    # 出错后同一线程继续处理后续各项
+    assert sorted(seen) == list(range(10))
+
+
+def test_raising_on_discard_does_not_hang_close():
+    def on_discard(item):
+        raise BrokenPipeError()
+
+    run_pipeline([Stage("a", lambda x: None, 2), Stage("b", lambda x: x)], lambda item: None, on_discard)
+
+
+def test_failing_stage_discards_item():
+    discarded = []
+
+    def func(x):
+        if x % 2:
+            raise ValueError(x)
+        return x
+
+    out = []
+    run_pipeline([Stage("a", func, 2)], out.append, discarded.append)
+    assert sorted(out) == [0, 2, 4, 6, 8]
+    assert sorted(discarded) == [1, 3, 5, 7, 9]
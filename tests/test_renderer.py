@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from src.manifest import ManifestWriter
+from src.renderer import CardRecord, IndexHtmlWriter, MarkdownWriter, render_export
+from src.search_db import SearchDbWriter
+
+PACKAGE = {"pg_id": 1, "pg_name": "卡包"}
+
+
+def write_cards(path, count):
+    """写出 cards.jsonl 格式的卡片，返回对应的记录。"""
+    records = []
+    with open(path, "wb") as f:
+        for i in range(count):
+            line = json.dumps({"id": i, "title": f"卡片 {i}", "created_date": "2024-01-01",
+                               "created_int": i, "description": ""}, ensure_ascii=False).encode("utf-8") + b"\n"
+            records.append(CardRecord(i, i, str(path), f.tell(), len(line)))
+            f.write(line)
+    return records
+
+
+class FailingWriter:
+    def __init__(self, fail_at):
+        self.fail_at = fail_at
+        self.added = 0
+        self.aborted = False
+
+    def add(self, card):
+        self.added += 1
+        if self.added == self.fail_at:
+            raise OSError("磁盘已满")
+
+    def close(self):
+        pass
+
+    def abort(self):
+        self.aborted = True
+
+
+def test_failed_render_aborts_writers_and_keeps_old_files(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    (out / "index.html").write_text("旧索引", encoding="utf-8")
+    records = write_cards(tmp_path / "source.jsonl", 5)
+
+    failing = FailingWriter(fail_at=3)
+    writers = [
+        MarkdownWriter(str(out / "卡包.md"), "卡包"),
+        IndexHtmlWriter(str(out), "卡包", total=5),
+        ManifestWriter(str(out), PACKAGE),
+        SearchDbWriter(str(out / "search.sqlite3"), PACKAGE, str(out)),
+        failing,
+    ]
+    with pytest.raises(OSError):
+        render_export(records, writers)
+
+    assert failing.aborted
+    # 临时文件全部删除，已有的输出文件保持不变
+    leftovers = [p.name for p in out.rglob("*") if p.name.endswith((".part", ".tmp"))]
+    assert leftovers == []
+    assert (out / "index.html").read_text(encoding="utf-8") == "旧索引"
+    assert not (out / "卡包.md").exists()
+    assert writers[0]._file.closed
+    assert writers[1]._page_file._file.closed
+    assert writers[2]._cards.closed and writers[2]._manifest.closed
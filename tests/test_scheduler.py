@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+import requests
+
+from src import api_client
+from src.api_client import LLSpaceClient
+from src.asset_store import AssetStore
+from src.exporter import Exporter
+from src.scheduler import ExportScheduler, RequestBudget
+
+
+def test_budget_caps_all_http_requests(tmp_path, monkeypatch, start_mock_server):
+    _, base_url = start_mock_server(cards=6, packages=3)
+    monkeypatch.setattr(api_client, "API_BASE_URL", base_url)
+    client = LLSpaceClient()
+    assert client.login("test", "test")[0]
+
+    lock = threading.Lock()
+    state = {"in_flight": 0, "max": 0}
+    send = requests.Session.request
+
+    def counting_request(self, *args, **kwargs):
+        with lock:
+            state["in_flight"] += 1
+            state["max"] = max(state["max"], state["in_flight"])
+        try:
+            return send(self, *args, **kwargs)
+        finally:
+            with lock:
+                state["in_flight"] -= 1
+
+    monkeypatch.setattr(requests.Session, "request", counting_request)
+    scheduler = ExportScheduler(client, client.get_packages(), request_budget=2,
+                                asset_store=AssetStore(str(tmp_path / "assets")))
+    results = scheduler.run(str(tmp_path / "out"))
+
+    assert [count for _, _, count, error in results] == [6, 6, 6]
+    # API 请求、封面/音频下载、快照页面及其资源都占用预算
+    assert state["max"] <= 2
+
+
+def test_failed_export_returns_its_budget_share(tmp_path):
+    class BrokenClient:
+        def get_directory(self, pg_id, use_cache=True):
+            raise RuntimeError("目录获取失败")
+
+    budget = RequestBudget(4)
+    exporter = Exporter(BrokenClient(), lambda *args: None, budget=budget,
+                        asset_store=AssetStore(str(tmp_path / "assets")))
+    budget.set_remaining(exporter, 100)
+    with pytest.raises(RuntimeError):
+        exporter.run({"pg_id": 1, "pg_name": "卡包"}, str(tmp_path / "out"))
+    assert exporter not in budget._remaining
@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+
+from src import search_db
+from src.search_db import SearchDbWriter, search
+
+PACKAGE = {"pg_id": 1, "pg_name": "卡包"}
+
+
+def card(card_id, title, description=""):
+    return {"id": card_id, "title": title, "created_date": "2024-01-01", "created_int": card_id,
+            "description": description}
+
+
+def write(path, export_dir, cards, **kwargs):
+    writer = SearchDbWriter(path, PACKAGE, export_dir, **kwargs)
+    for c in cards:
+        writer.add(c)
+    writer.close()
+
+
+def titles(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(row[0] for row in conn.execute("SELECT title FROM cards"))
+
+
+def test_waits_for_other_writer(tmp_path):
+    path = str(tmp_path / "search.sqlite3")
+    write(path, tmp_path, [card(1, "第一张")])
+
+    blocker = sqlite3.connect(path, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(0.3, blocker.rollback)
+    timer.start()
+    try:
+        write(path, tmp_path, [card(1, "第一张"), card(2, "第二张")], batch_size=1)
+    finally:
+        timer.join()
+        blocker.close()
+    assert titles(path) == ["第一张", "第二张"]
+
+
+def test_failed_flush_is_logged_and_keeps_old_cards(tmp_path, monkeypatch):
+    path = str(tmp_path / "search.sqlite3")
+    write(path, tmp_path, [card(1, "第一张"), card(2, "第二张")])
+
+    monkeypatch.setattr(search_db, "SEARCH_DB_BUSY_TIMEOUT", 0.05)
+    writer = SearchDbWriter(path, PACKAGE, tmp_path, batch_size=1)
+    blocker = sqlite3.connect(path)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        # 写锁被占用，批次写入失败但不抛出
+        writer.add(card(1, "第一张"))
+    finally:
+        blocker.rollback()
+        blocker.close()
+    writer.close()
+    # 有批次写入失败时不删除本次未写入的卡片
+    assert titles(path) == ["第一张", "第二张"]
+
+
+def test_short_query_falls_back_to_like(tmp_path):
+    path = str(tmp_path / "search.sqlite3")
+    write(path, tmp_path, [card(1, "春天的花", "樱花开了"), card(2, "夏天", "西瓜")])
+    assert [hit["card_id"] for hit in search(path, "樱花")] == [1]
+    assert [hit["card_id"] for hit in search(path, "樱花开了")] == [1]